@@ -26,8 +26,10 @@ except Exception:
     tk = _DummyTkModule()
 
 # 让后续代码使用常见库（保留 analyzer 原本会用到的）
+import hashlib
 import os
 import sys
+import threading
 from io import BytesIO
 import pandas as pd
 import numpy as np
@@ -49,12 +51,48 @@ except ImportError as e:
     print("将继续使用基础功能")
     HAS_CUSTOM_MODULES = False
 
+from data_loader import (COLUMNAR_EXTENSIONS, DATE_COLUMNS, NUMERIC_COLUMNS, TEXT_COLUMNS, column_filter,
+                         compact_dtypes, iter_chunks, progress_printer, read_columnar, read_csv_once, read_xlsx)
+from disk_cache import DEFAULT_MAX_MB, FrameCache, file_hash
+from distinct_sketch import DEFAULT_ERROR, GroupedSketch, error_table, precision_for_error, register_codes
+from excel_export import export_sheet_files, open_workbook, write_sheet
+from incremental import SalesState
+from sku_panel import SkuMonthPanel, build_profit_comparison, column_pct_change, detect_sales_drops
+from unsold_index import LastSaleIndex
+from pipeline import run_task_graph, speedup
+from profiling import StageProfiler, count_rows
+from rules import CATEGORY_RULES, RULE_THRESHOLDS, UNSOLD_RULES, apply_rules
+from query_backend import open_backend
+from streaming import SalesPartials
+
 warnings.filterwarnings('ignore')
 
 # 设置中文字体
 plt.rcParams['font.sans-serif'] = ['SimHei']
 plt.rcParams['axes.unicode_minus'] = False
 
+# 分析模块及其依赖（声明顺序即串行执行顺序）
+ANALYSIS_DEPENDENCIES = {
+    'run_category_analysis': [],
+    'run_sales_plan_analysis': [],
+    'run_unsold_analysis': [],
+    'run_profit_analysis': [],
+    'run_monthly_comparison': [],
+    'run_visualization': ['run_category_analysis', 'run_monthly_comparison'],
+}
+
+# 各分析模块读取的原始字段（加载时只读取所选模块用到的列）
+ANALYSIS_COLUMNS = {
+    'run_category_analysis': ['SKU编码', '小分类', '销售金额', '利润', '销售个数'],
+    'run_sales_plan_analysis': ['SKU编码', '商品名称', '小分类', '销售金额', '销售计划', '销售个数'],
+    'run_unsold_analysis': ['SKU编码', '商品名称', '小分类', '在库数量', '在库金额'],
+    'run_profit_analysis': ['SKU编码', '商品名称', '销售金额', '利润', '销售个数', '订单数'],
+    'run_monthly_comparison': ['SKU编码', '商品名称', '销售金额', '利润', '销售个数', '订单数'],
+    'run_visualization': [],
+}
+# 预处理和字段检查始终需要的字段（过滤条件、年月的来源）
+BASE_COLUMNS = ['销售金额', 'SKU编码', '小分类', '日期', 'Year of 日期', 'Month of 日期']
+
 class MonthlySalesAnalyzer:
     def __init__(self):
         """
@@ -67,6 +105,21 @@ class MonthlySalesAnalyzer:
         self.analysis_results = {}
         self.visualizer = None
         self.chart_images = {}
+        self._sku_panel = None
+        self._sku_panel_source = None
+        self._sku_panel_lock = threading.Lock()
+        self._last_sale_index = None
+        self._last_sale_index_source = None
+        self._last_sale_index_frame = None
+        self._distinct_source = None
+        self._distinct_sketches = {}
+        self._distinct_codes = None
+        self._distinct_errors = {}
+        self.query_backend = None
+        self.analysis_dependencies = {name: list(deps) for name, deps in ANALYSIS_DEPENDENCIES.items()}
+        self.extra_analysis_tasks = {}
+        self.analysis_columns = {name: list(columns) for name, columns in ANALYSIS_COLUMNS.items()}
+        self.analysis_timings = {}
 
         # 加载配置
         if HAS_CUSTOM_MODULES:
@@ -88,10 +141,41 @@ class MonthlySalesAnalyzer:
                 'unsold_months_threshold': 3,  # 滞销产品判定阈值（月）
                 'low_profit_threshold': 0.05,  # 低利润阈值（5%）
                 'sales_drop_threshold': 0.3,  # 销售下降阈值（30%）
-                'top_n_products': 20
+                'top_n_products': 20,
+                'streaming_threshold_mb': 1024,  # 超过该大小的文件使用流式分析
+                'streaming_chunksize': 500000,
+                'compact_dtypes': False,  # 预处理后转换为紧凑类型（category / int32）
+                'compact_float32': False,  # 紧凑模式下金额字段是否降为 float32
+                'parallel_analysis': False,  # 按依赖关系并行执行分析模块
+                'analysis_workers': None,  # 并行线程数，None 表示按 CPU 核数
+                'profile_memory': False,  # 记录各阶段的 Python 内存峰值（tracemalloc，有额外开销）
+                'profile_output': None,  # 性能记录 JSON 输出路径，None 表示不导出
+                'excel_export_mode': 'auto',  # auto / pandas / streaming（constant_memory 逐行写入）
+                'excel_streaming_rows': 200000,  # auto 模式下任一结果表超过该行数时使用流式导出
+                'excel_split_large': None,  # 'files' / 'zip'：超大结果表并行写入单独的文件
+                'approx_distinct': False,  # 去重SKU数使用 HyperLogLog 近似（可跨数据块合并）
+                'approx_distinct_error': 0.01,  # 近似去重的相对标准误差上限
+                'approx_distinct_validate': False,  # 同时计算精确值，在报告中给出实际误差
+                'disk_cache': False,  # 按文件内容哈希把预处理结果缓存到磁盘（Arrow IPC，内存映射读取；会写出完整副本，需显式开启）
+                'disk_cache_dir': None,  # 缓存目录，None 表示默认目录（环境变量 SALES_CACHE_DIR 或 ~/.sales_cache）
+                'disk_cache_max_mb': 2048,  # 缓存目录容量上限，超过时按最近使用时间淘汰
+                'prune_columns': True,  # 只读取所选分析模块用到的字段（CSV usecols / Parquet 列投影 / xlsx 只解码所需列）
+                'xlsx_sheet': 0,  # xlsx 读取的工作表（名称或从 0 开始的序号）
+                'xlsx_engine': 'auto',  # xlsx 读取引擎: stream（流式 XML 解析）/ calamine（需要 python-calamine）/ auto
+                'analysis_backend': 'pandas',  # pandas（全量读入内存）/ duckdb（直接在文件上执行多线程聚合查询）
+                'backend_threads': None,  # 查询后端线程数，None 表示按 CPU 核数
+                'backend_memory_limit': None,  # 查询后端内存上限（例如 '4GB'），超过时溢出到临时目录
+                'backend_temp_dir': None  # 查询后端溢出目录，None 表示引擎默认目录
             }
             print("ℹ️  使用默认配置")
 
+        # 建议规则的阈值（配置中未设置的使用默认值）
+        self.report_config = {**RULE_THRESHOLDS, **self.report_config}
+
+        # 各阶段性能记录
+        self.profiler = StageProfiler(label='analyzer',
+                                      trace_memory=self.report_config.get('profile_memory', False))
+
     def select_file(self):
         """
         使用弹窗选择CSV文件
@@ -102,6 +186,7 @@ class MonthlySalesAnalyzer:
         file_types = [
             ("CSV files", "*.csv"),
             ("Excel files", "*.xlsx"),
+            ("Parquet/Feather files", "*.parquet *.feather"),
             ("All files", "*.*")
         ]
 
@@ -121,9 +206,29 @@ class MonthlySalesAnalyzer:
             print("❌ 未选择文件，程序退出")
             return False
 
-    def load_data(self):
+    def required_columns(self, modules=None):
+        """
+        所选分析模块（方法名列表，None 表示全部）需要读取的原始字段
+
+        关闭 prune_columns，或有模块没有声明字段时返回 None（读取全部字段）
+        """
+        if not self.report_config.get('prune_columns', True):
+            return None
+        names = list(self.analysis_dependencies) if modules is None else list(modules)
+        columns = list(BASE_COLUMNS)
+        for name in names:
+            declared = self.analysis_columns.get(name)
+            if declared is None:
+                return None
+            columns += declared
+        return list(dict.fromkeys(columns))
+
+    def load_data(self, columns=None):
         """
         加载数据文件
+
+        columns: 只读取指定字段（文件中没有的字段自动忽略），None 表示全部字段；
+        CSV 按 usecols 跳过其余列，Parquet/Feather 按列投影，xlsx 流式解析工作表 xlsx_sheet，只解码所需列
         """
         if not self.file_path:
             print("❌ 文件路径为空")
@@ -138,26 +243,38 @@ class MonthlySalesAnalyzer:
 
             # 根据文件类型选择加载方式
             if self.file_path.endswith('.csv'):
-                encodings = ['utf-8-sig', 'gbk', 'gb2312', 'utf-8']
-                for encoding in encodings:
-                    try:
-                        self.raw_df = pd.read_csv(self.file_path, encoding=encoding, low_memory=False)
-                        self.df = self.raw_df.copy()
-                        print(f"✅ CSV数据加载成功！使用编码: {encoding}")
-                        break
-                    except UnicodeDecodeError:
-                        continue
-                else:
+                try:
+                    # 按字节样本探测编码，文件只解析一次
+                    self.raw_df, load_info = read_csv_once(self.file_path, low_memory=False,
+                                                           usecols=column_filter(columns))
+                    self.df = self.raw_df
+                    print(f"✅ CSV数据加载成功！使用编码: {load_info['encoding']} "
+                          f"(采样 {load_info['sampled_bytes'] / 1024:.0f} KB)")
+                    print("💡 提示: 运行 python data_loader.py convert <文件> 转换为 Parquet，后续加载更快")
+                except UnicodeError:
                     print("❌ 无法解码CSV文件，请检查文件编码")
                     return False
             elif self.file_path.endswith('.xlsx'):
                 try:
-                    self.raw_df = pd.read_excel(self.file_path)
-                    self.df = self.raw_df.copy()
-                    print("✅ Excel数据加载成功！")
+                    sheet = self.report_config.get('xlsx_sheet', 0)
+                    # 编码 / 名称 / 分类按文本读取（同 CSV），数值形式的 SKU编码 不会与文本混在一列
+                    self.raw_df = read_xlsx(self.file_path, columns=columns, sheet_name=sheet,
+                                            progress=progress_printer(), text_columns=TEXT_COLUMNS,
+                                            engine=self.report_config.get('xlsx_engine', 'auto'))
+                    self.df = self.raw_df
+                    print(f"✅ Excel数据加载成功！工作表: {sheet}")
                 except Exception as e:
                     print(f"❌ Excel文件加载失败: {e}")
                     return False
+            elif self.file_path.endswith(COLUMNAR_EXTENSIONS):
+                try:
+                    # 列式文件已带类型，按需投影列，不做额外拷贝
+                    self.raw_df = read_columnar(self.file_path, columns=columns)
+                    self.df = self.raw_df
+                    print("✅ 列式数据加载成功！")
+                except Exception as e:
+                    print(f"❌ 列式文件加载失败: {e}")
+                    return False
             else:
                 print("❌ 不支持的文件格式")
                 return False
@@ -171,26 +288,90 @@ class MonthlySalesAnalyzer:
             print(f"❌ 数据加载失败: {e}")
             return False
 
-    def preprocess_data(self):
+    def load_preprocessed(self, modules=None):
+        """
+        加载并预处理数据（只读取 modules 用到的字段，见 required_columns）
+
+        开启 disk_cache 时按文件内容哈希查找磁盘缓存，命中则直接内存映射打开预处理结果，
+        跳过解析和清洗；未命中时正常加载、预处理后写入缓存
+        """
+        columns = self.required_columns(modules)
+        cache, key = None, None
+        if self.report_config.get('disk_cache', False) and self.file_path and os.path.exists(self.file_path):
+            cache = FrameCache(self.report_config.get('disk_cache_dir'),
+                               self.report_config.get('disk_cache_max_mb', DEFAULT_MAX_MB))
+            # 紧凑类型转换的结果不同，分别缓存
+            variant = 'analyzer'
+            if self.report_config.get('compact_dtypes', False):
+                variant += '_compact_f32' if self.report_config.get('compact_float32', False) else '_compact'
+            if self.file_path.endswith('.xlsx') and self.report_config.get('xlsx_sheet', 0) != 0:
+                # 不同工作表的内容不同，分别缓存
+                sheet = str(self.report_config['xlsx_sheet']).encode('utf-8')
+                variant += '_sheet' + hashlib.sha1(sheet).hexdigest()[:8]
+            if columns is not None:
+                # 读取的字段不同，分别缓存
+                variant += '_cols' + hashlib.sha1('|'.join(sorted(columns)).encode('utf-8')).hexdigest()[:8]
+            with self.profiler.stage('disk_cache_lookup') as stage:
+                key = cache.key(file_hash(self.file_path), variant)
+                df, _ = cache.get(key)
+                stage['rows_out'] = None if df is None else len(df)
+            if df is not None:
+                self.raw_df, self.df = None, df
+                print(f"⚡ 命中预处理缓存: {len(df)} 行 ({cache.cache_dir})")
+                return True
+
+        with self.profiler.stage('load_data') as stage:
+            loaded = self.load_data(columns)
+            stage['rows_out'] = len(self.df) if loaded else None
+        if not loaded:
+            return False
+        self.preprocess_data()
+
+        if cache is not None:
+            try:
+                size_mb = cache.put(key, self.df, source=os.path.abspath(self.file_path))
+                print(f"💾 预处理结果已缓存 ({size_mb} MB)")
+            except Exception as e:
+                print(f"⚠️ 写入预处理缓存失败: {e}")
+        return True
+
+    def preprocess_data(self, compact=None):
         """
         数据预处理
+
+        compact: 是否转换为紧凑类型，默认读取 report_config['compact_dtypes']
+        """
+        with self.profiler.stage('preprocess', rows_in=len(self.df)) as stage:
+            self.df = self._preprocess_frame(self.df)
+
+            if compact is None:
+                compact = self.report_config.get('compact_dtypes', False)
+            if compact:
+                self.df, memory = compact_dtypes(self.df, float32=self.report_config.get('compact_float32', False))
+                print(f"🗜️ 紧凑类型转换: {memory['before_mb']} MB -> {memory['after_mb']} MB "
+                      f"(节省 {memory['saved_pct']}%)")
+            stage['rows_out'] = len(self.df)
+        return self.df
+
+    def _preprocess_frame(self, df, verbose=True):
         """
-        df_clean = self.df.copy()
+        清洗单个 DataFrame（全量数据或流式模式下的一个数据块）
+        """
+        # 浅拷贝：替换列不会影响 raw_df，也不复制数据
+        df_clean = df.copy(deep=False)
 
-        print("🔄 正在预处理数据...")
-        print(f"   原始数据行数: {len(df_clean)}")
+        if verbose:
+            print("🔄 正在预处理数据...")
+            print(f"   原始数据行数: {len(df_clean)}")
 
-        # 处理日期字段
-        date_columns = ['日期', 'sku首次销售时间_分区域', 'sku首次入库时间_分区域']
-        for col in date_columns:
-            if col in df_clean.columns:
+        # 处理日期字段（已是日期类型的列跳过）
+        for col in DATE_COLUMNS:
+            if col in df_clean.columns and not pd.api.types.is_datetime64_any_dtype(df_clean[col]):
                 df_clean[col] = pd.to_datetime(df_clean[col], errors='coerce')
 
-        # 处理数值字段
-        numeric_columns = ['销售金额', '利润', '利润率', '销售个数', '在库数量', '在库金额',
-                           '平台费用', '头程费用', '后程费用', '广告费', '商品成本', '销售计划']
-        for col in numeric_columns:
-            if col in df_clean.columns:
+        # 处理数值字段（已是数值类型的列跳过）
+        for col in NUMERIC_COLUMNS:
+            if col in df_clean.columns and not pd.api.types.is_numeric_dtype(df_clean[col]):
                 df_clean[col] = pd.to_numeric(df_clean[col], errors='coerce')
 
         # 过滤无效数据
@@ -204,7 +385,8 @@ class MonthlySalesAnalyzer:
         if required_columns:
             df_clean = df_clean.dropna(subset=required_columns, how='any')
             final_count = len(df_clean)
-            print(f"✅ 数据清洗完成，过滤掉 {initial_count - final_count} 条无效记录")
+            if verbose:
+                print(f"✅ 数据清洗完成，过滤掉 {initial_count - final_count} 条无效记录")
 
         # 提取年月信息用于月度分析
         if '日期' in df_clean.columns:
@@ -215,11 +397,113 @@ class MonthlySalesAnalyzer:
         else:
             current_month = datetime.now().strftime("%Y-%m")
             df_clean['年月'] = current_month
-            print("   ⚠️ 未找到日期字段，使用当前月份")
+            if verbose:
+                print("   ⚠️ 未找到日期字段，使用当前月份")
 
-        self.df = df_clean
         return df_clean
 
+    def should_stream(self):
+        """
+        文件是否需要流式分析（超过 streaming_threshold_mb；xlsx 按压缩后的文件大小计算）
+        """
+        if not self.file_path or not os.path.exists(self.file_path):
+            return False
+        threshold_mb = self.report_config.get('streaming_threshold_mb', 1024)
+        return os.path.getsize(self.file_path) > threshold_mb * 1024 * 1024
+
+    def run_streaming_analysis(self, chunksize=None, modules=None):
+        """
+        流式分析模式：分块读取文件，只保留 SKU×月份 粒度的可合并部分聚合，
+        然后在聚合结果上执行所有分析模块，峰值内存与明细行数无关
+
+        modules: 只执行指定的分析模块（同 run_all_analysis）
+        """
+        chunksize = chunksize or self.report_config.get('streaming_chunksize', 500000)
+        print(f"🌊 流式分析模式，每块 {chunksize} 行...")
+
+        approx = self.report_config.get('approx_distinct', False)
+        partials = SalesPartials(sketch_precision=precision_for_error(
+            self.report_config.get('approx_distinct_error', DEFAULT_ERROR)) if approx else None)
+        try:
+            with self.profiler.stage('streaming_aggregate') as stage:
+                for chunk in iter_chunks(self.file_path, chunksize=chunksize, columns=self.required_columns(modules),
+                                         sheet_name=self.report_config.get('xlsx_sheet', 0)):
+                    partials.add_chunk(self._preprocess_frame(chunk, verbose=False))
+                    print(f"   已处理 {partials.chunks} 块, 累计 {partials.rows} 行")
+                self.df = partials.to_frame()
+                stage.update(rows_in=partials.rows, rows_out=len(self.df))
+            # 分块时累积的去重草图直接用于各模块的近似去重SKU数
+            self._reset_distinct_sketches(partials.sketches)
+        except Exception as e:
+            print(f"❌ 流式读取失败: {e}")
+            return None
+
+        print(f"✅ 聚合完成: {partials.rows} 行明细 -> {len(self.df)} 行 SKU×月份 聚合")
+        return self.run_all_analysis(modules=modules)
+
+    def run_backend_analysis(self, backend=None, modules=None):
+        """
+        查询后端模式：由 query_backend 中的引擎直接在文件上执行聚合查询，
+        self.df 为 SKU×月份 粒度的聚合（同流式模式），各分析模块的聚合步骤改由后端执行
+
+        backend: 后端名称，默认读取 report_config['analysis_backend']
+        modules: 只执行指定的分析模块（同 run_all_analysis）
+        """
+        backend = backend or self.report_config.get('analysis_backend', 'pandas')
+        print(f"🦆 查询后端模式: {backend}")
+        try:
+            with self.profiler.stage(f'{backend}_aggregate') as stage:
+                self.query_backend = open_backend(backend, self.file_path,
+                                                  threads=self.report_config.get('backend_threads'),
+                                                  memory_limit=self.report_config.get('backend_memory_limit'),
+                                                  temp_dir=self.report_config.get('backend_temp_dir'))
+                self.df = self.query_backend.grain()
+                stage.update(rows_in=self.query_backend.raw_rows, rows_out=len(self.df))
+        except Exception as e:
+            print(f"❌ 查询后端执行失败: {e}")
+            return None
+
+        print(f"✅ 聚合完成: {self.query_backend.raw_rows} 行明细（有效 {self.query_backend.rows} 行）"
+              f" -> {len(self.df)} 行 SKU×月份 聚合")
+        return self.run_all_analysis(modules=modules)
+
+    def _backend(self):
+        """self.df 来自查询后端时返回该后端，否则返回 None（使用 pandas 聚合）"""
+        backend = self.query_backend
+        return backend if backend is not None and backend.frame is self.df else None
+
+    def run_incremental_analysis(self, state_dir, new_files=(), replace=False, run_analysis=True, modules=None):
+        """
+        增量模式：只把新文件聚合后合并进持久化的 SKU×月份 状态，再从状态生成所有分析结果
+
+        replace: 新文件中的月份已在状态中时覆盖这些月份（否则报错）
+        run_analysis: 为 False 时只更新状态，返回 SalesState
+        """
+        try:
+            state = SalesState.load(state_dir)
+            if new_files:
+                with self.profiler.stage('incremental_fold') as stage:
+                    info = state.fold_files(new_files, self._preprocess_frame, replace=replace,
+                                            chunksize=self.report_config.get('streaming_chunksize', 500000))
+                    state.save()
+                    stage.update(rows_in=info['rows'], rows_out=len(state.partials.result()))
+                print(f"✅ 已合并 {len(new_files)} 个文件: 月份 {info['months']}, {info['rows']} 行明细"
+                      + (f"（覆盖月份 {info['replaced']}）" if info['replaced'] else ""))
+        except Exception as e:
+            print(f"❌ 增量合并失败: {e}")
+            return None
+
+        if state.empty:
+            print(f"❌ 状态目录中没有数据: {state_dir}")
+            return None
+        months = state.months()
+        print(f"📦 增量状态: {len(months)} 个月 ({months[0]} ~ {months[-1]}), 累计 {state.partials.rows} 行明细")
+        if not run_analysis:
+            return state
+
+        self.df = state.to_frame()
+        return self.run_all_analysis(modules=modules)
+
     def check_required_columns(self):
         """
         检查必要的列是否存在
@@ -233,6 +517,91 @@ class MonthlySalesAnalyzer:
             return False
         return True
 
+    def get_sku_panel(self):
+        """
+        SKU × 月份 面板（按当前 self.df 缓存，利润分析和月度对比共用）
+        """
+        with self._sku_panel_lock:
+            if self._sku_panel is None or self._sku_panel_source is not self.df:
+                backend = self._backend()
+                self._sku_panel = SkuMonthPanel.from_frame(
+                    self.df if backend is None else backend.sku_month_totals())
+                self._sku_panel_source = self.df
+            return self._sku_panel
+
+    def get_last_sale_index(self):
+        """
+        SKU 最后销售月份索引（按当前 self.df 缓存，任意截止月份的滞销查询共用）
+        """
+        return self._last_sale_source()[0]
+
+    def _last_sale_source(self):
+        """(索引, 构建索引的数据)：查询后端模式下为后端返回的 SKU×月份 组合及每个SKU第一次出现的明细字段"""
+        with self._sku_panel_lock:
+            if self._last_sale_index is None or self._last_sale_index_source is not self.df:
+                backend = self._backend()
+                frame = self.df if backend is None else backend.first_sale_rows()
+                self._last_sale_index = LastSaleIndex.from_frame(frame)
+                self._last_sale_index_frame = frame
+                self._last_sale_index_source = self.df
+            return self._last_sale_index, self._last_sale_index_frame
+
+    def _reset_distinct_sketches(self, sketches=None):
+        self._distinct_source = self.df
+        self._distinct_sketches = dict(sketches or {})
+        self._distinct_codes = None
+        self._distinct_errors = {}
+
+    def sku_counts(self, by):
+        """
+        按维度统计去重SKU数
+
+        report_config['approx_distinct'] 为 True 时使用 HyperLogLog 草图近似（同一份数据的哈希只计算一次，
+        流式模式直接使用分块累积的草图），误差说明写入 analysis_results['distinct_count_error']
+        """
+        if not self.report_config.get('approx_distinct', False):
+            return self.df.groupby(by, observed=True)['SKU编码'].nunique()
+
+        with self._sku_panel_lock:
+            if self._distinct_source is not self.df:
+                self._reset_distinct_sketches()
+            sketch = self._distinct_sketches.get(by)
+            if sketch is None:
+                precision = precision_for_error(self.report_config.get('approx_distinct_error', DEFAULT_ERROR))
+                if self._distinct_codes is None:
+                    self._distinct_codes = register_codes(self.df['SKU编码'], precision)
+                sketch = GroupedSketch.from_values(self.df[by], self.df['SKU编码'], precision,
+                                                   codes=self._distinct_codes)
+                self._distinct_sketches[by] = sketch
+            estimate = sketch.estimate().rename_axis(by)
+
+            exact = None
+            if self.report_config.get('approx_distinct_validate', False):
+                exact = self.df.groupby(by, observed=True)['SKU编码'].nunique()
+            self._distinct_errors[by] = error_table(by, estimate, sketch.precision, exact)
+            self.analysis_results['distinct_count_error'] = pd.concat(self._distinct_errors.values(),
+                                                                      ignore_index=True)
+        return estimate
+
+    def _aggregate_with_skus(self, by, spec):
+        """按维度聚合 spec 中的字段，并附加去重SKU数列（SKU编码）"""
+        backend = self._backend()
+        if backend is not None:
+            # 查询后端直接按明细精确去重
+            return backend.group_totals(by, list(spec), count_skus=True)
+        if not self.report_config.get('approx_distinct', False):
+            return self.df.groupby(by, observed=True).agg({**spec, 'SKU编码': 'nunique'})
+        result = self.df.groupby(by, observed=True).agg(spec)
+        result['SKU编码'] = self.sku_counts(by).reindex(result.index).to_numpy()
+        return result
+
+    def _aggregate_sums(self, by, columns):
+        """按维度对 columns 求和（查询后端模式下由后端执行）"""
+        backend = self._backend()
+        if backend is not None:
+            return backend.group_totals(by, columns)
+        return self.df.groupby(by, observed=True).agg({col: 'sum' for col in columns})
+
     def run_category_analysis(self):
         """
         1. 小分类收入和利润分析
@@ -243,11 +612,10 @@ class MonthlySalesAnalyzer:
             print("❌ 缺少小分类字段")
             return None
 
-        category_analysis = self.df.groupby('小分类').agg({
+        category_analysis = self._aggregate_with_skus('小分类', {
             '销售金额': 'sum',
             '利润': 'sum',
-            '销售个数': 'sum',
-            'SKU编码': 'nunique'
+            '销售个数': 'sum'
         }).round(2)
 
         # 计算利润率
@@ -257,27 +625,10 @@ class MonthlySalesAnalyzer:
         # 按销售额排序
         category_analysis = category_analysis.sort_values('销售金额', ascending=False)
 
-        # 生成改进建议
-        suggestions = []
-        for category, row in category_analysis.iterrows():
-            suggestion = f"{category}: "
-
-            if row.get('利润率', 0) < 5:
-                suggestion += "利润率过低，建议优化成本或调整定价；"
-            elif row.get('利润率', 0) > 20:
-                suggestion += "利润率良好，可考虑加大推广；"
-
-            if row.get('销售金额', 0) < category_analysis['销售金额'].quantile(0.25):
-                suggestion += "销售额偏低，需要重点关注；"
-            elif row.get('销售金额', 0) > category_analysis['销售金额'].quantile(0.75):
-                suggestion += "销售额表现优秀，可总结经验；"
-
-            if 'SKU编码' in row and row['SKU编码'] < 3:
-                suggestion += "SKU数量较少，考虑丰富产品线；"
-
-            suggestions.append(suggestion)
-
-        category_analysis['改进建议'] = suggestions
+        # 生成改进建议（规则见 rules.CATEGORY_RULES，阈值取自 report_config）
+        category_analysis['改进建议'] = apply_rules(
+            category_analysis, CATEGORY_RULES, self.report_config,
+            prefix=category_analysis.index.astype(str) + ": ")
 
         self.analysis_results['category_analysis'] = category_analysis
         return category_analysis
@@ -293,21 +644,17 @@ class MonthlySalesAnalyzer:
             return None
 
         # 按小分类分析计划完成情况
-        plan_analysis = self.df.groupby('小分类').agg({
+        plan_analysis = self._aggregate_with_skus('小分类', {
             '销售金额': 'sum',
-            '销售计划': 'sum',
-            'SKU编码': 'nunique'
+            '销售计划': 'sum'
         }).round(2)
 
         # 计算完成率
         plan_analysis['完成率'] = (plan_analysis['销售金额'] / plan_analysis['销售计划'] * 100).round(2)
 
         # 识别需要关注的SKU
-        sku_analysis = self.df.groupby(['SKU编码', '商品名称', '小分类']).agg({
-            '销售金额': 'sum',
-            '销售计划': 'sum',
-            '销售个数': 'sum'
-        }).round(2)
+        sku_analysis = self._aggregate_sums(['SKU编码', '商品名称', '小分类'],
+                                            ['销售金额', '销售计划', '销售个数']).round(2)
 
         sku_analysis['完成率'] = (sku_analysis['销售金额'] / sku_analysis['销售计划'] * 100).round(2)
 
@@ -326,9 +673,11 @@ class MonthlySalesAnalyzer:
         self.analysis_results['sales_plan_analysis'] = results
         return results
 
-    def run_unsold_analysis(self):
+    def run_unsold_analysis(self, as_of=None):
         """
         3. 滞销产品分析
+
+        as_of: 截止月份（默认为数据中的最新月份），查询该月及之前最近N个月没有销售的SKU
         """
         print("📦 执行滞销产品分析...")
 
@@ -337,72 +686,35 @@ class MonthlySalesAnalyzer:
             print("❌ 无法确定月份信息")
             return None
 
-        months = sorted(self.df['年月'].unique())
-        print(f"   数据包含月份: {months}")
+        index, source = self._last_sale_source()
+        print(f"   数据包含月份: {index.months}")
 
         # 确定滞销阈值（最近N个月）
         unsold_threshold = self.report_config.get('unsold_months_threshold', 3)
-        recent_months = months[-unsold_threshold:] if len(months) >= unsold_threshold else months
+        recent_months = index.recent_months(as_of, unsold_threshold)
 
         print(f"   检查最近 {len(recent_months)} 个月的销售情况: {recent_months}")
 
-        # 找出所有SKU
-        all_skus = self.df['SKU编码'].unique()
-
-        # 找出在最近几个月有销售的SKU
-        recent_sales = self.df[self.df['年月'].isin(recent_months)]
-        sold_skus = recent_sales['SKU编码'].unique()
-
-        # 找出滞销SKU（在最近几个月没有销售）
-        unsold_skus = list(set(all_skus) - set(sold_skus))
-
-        print(f"   总SKU数量: {len(all_skus)}, 近期销售SKU: {len(sold_skus)}, 滞销SKU: {len(unsold_skus)}")
-
-        # 获取滞销SKU的详细信息
-        unsold_details = self.df[self.df['SKU编码'].isin(unsold_skus)][
-            ['SKU编码', '商品名称', '小分类', '在库数量', '在库金额']
-        ].drop_duplicates('SKU编码')
-
-        # 计算最后一次销售时间
-        last_sales = self.df.groupby('SKU编码')['年月'].max().reset_index()
-        last_sales.columns = ['SKU编码', '最后销售月份']
-
-        unsold_details = unsold_details.merge(last_sales, on='SKU编码', how='left')
-
-        # 计算滞销月数
-        current_month = months[-1] if months else datetime.now().strftime("%Y-%m")
-        unsold_details['滞销月数'] = unsold_details['最后销售月份'].apply(
-            lambda x: len(months) - months.index(x) - 1 if x in months else len(months)
-        )
+        # 滞销SKU、最后销售月份和滞销月数都由索引按整数月份序号直接计算
+        unsold_details, query = index.unsold_details(source, as_of, unsold_threshold)
+        print(f"   总SKU数量: {query['total_skus']}, 近期销售SKU: {query['sold_skus']}, "
+              f"滞销SKU: {len(query['codes'])}")
 
         # 按滞销月数排序
         unsold_details = unsold_details.sort_values(['滞销月数', '在库金额'], ascending=[False, False])
 
-        # 生成维护建议
-        maintenance_suggestions = []
-        for _, row in unsold_details.iterrows():
-            suggestion = f"{row['SKU编码']}({row['商品名称']}): "
-
-            if row['滞销月数'] >= 6:
-                suggestion += "长期滞销，建议清仓处理；"
-            elif row['滞销月数'] >= 3:
-                suggestion += "滞销时间较长，需要促销活动；"
-            else:
-                suggestion += "近期滞销，需要关注销售趋势；"
-
-            if row.get('在库金额', 0) > 10000:
-                suggestion += "库存金额较高，优先处理；"
-
-            maintenance_suggestions.append(suggestion)
-
-        unsold_details['维护建议'] = maintenance_suggestions
+        # 生成维护建议（规则见 rules.UNSOLD_RULES，阈值取自 report_config）
+        unsold_details['维护建议'] = apply_rules(
+            unsold_details, UNSOLD_RULES, self.report_config,
+            prefix=unsold_details['SKU编码'].astype(str) + "(" + unsold_details['商品名称'].astype(str) + "): ")
 
         self.analysis_results['unsold_analysis'] = {
             'unsold_products': unsold_details,
             'analysis_period': recent_months,
-            'total_skus': len(all_skus),
-            'sold_skus': len(sold_skus),
-            'unsold_skus': len(unsold_skus)
+            'as_of': recent_months[-1] if recent_months else None,
+            'total_skus': query['total_skus'],
+            'sold_skus': query['sold_skus'],
+            'unsold_skus': len(query['codes'])
         }
 
         return unsold_details
@@ -419,11 +731,8 @@ class MonthlySalesAnalyzer:
             return None
 
         # 按SKU和月份分析利润
-        monthly_profit = self.df.groupby(['SKU编码', '商品名称', '年月']).agg({
-            '销售金额': 'sum',
-            '利润': 'sum',
-            '销售个数': 'sum'
-        }).round(2)
+        monthly_profit = self._aggregate_sums(['SKU编码', '商品名称', '年月'],
+                                              ['销售金额', '利润', '销售个数']).round(2)
 
         # 计算利润率
         monthly_profit['利润率'] = (monthly_profit['利润'] / monthly_profit['销售金额'] * 100).round(2)
@@ -438,52 +747,15 @@ class MonthlySalesAnalyzer:
             (monthly_profit['销售金额'] > 0)
             ]
 
-        # 月份对比分析
+        # 月份对比分析（基于 SKU × 月份 面板的数组运算）
         months = sorted(monthly_profit['年月'].unique())
         if len(months) >= 2:
-            # 计算月度变化
-            profit_comparison = []
-
-            for sku in monthly_profit['SKU编码'].unique():
-                sku_data = monthly_profit[monthly_profit['SKU编码'] == sku]
-                if len(sku_data) >= 2:
-                    # 按月份排序
-                    sku_data = sku_data.sort_values('年月')
-
-                    # 计算月度变化
-                    current_month = sku_data.iloc[-1]
-                    previous_month = sku_data.iloc[-2] if len(sku_data) > 1 else None
-
-                    if previous_month is not None:
-                        profit_change = current_month['利润'] - previous_month['利润']
-                        profit_change_pct = (profit_change / previous_month['利润'] * 100) if previous_month[
-                                                                                                  '利润'] != 0 else 0
-
-                        sales_change = current_month['销售金额'] - previous_month['销售金额']
-                        sales_change_pct = (sales_change / previous_month['销售金额'] * 100) if previous_month[
-                                                                                                    '销售金额'] != 0 else 0
-
-                        profit_comparison.append({
-                            'SKU编码': sku,
-                            '商品名称': current_month['商品名称'],
-                            '当前月份': current_month['年月'],
-                            '上月月份': previous_month['年月'],
-                            '当前利润': current_month['利润'],
-                            '上月利润': previous_month['利润'],
-                            '利润变化': profit_change,
-                            '利润变化率%': round(profit_change_pct, 2),
-                            '当前销售额': current_month['销售金额'],
-                            '上月销售额': previous_month['销售金额'],
-                            '销售额变化': sales_change,
-                            '销售额变化率%': round(sales_change_pct, 2)
-                        })
-
-            profit_comparison_df = pd.DataFrame(profit_comparison)
+            profit_comparison_df = build_profit_comparison(self.get_sku_panel())
 
             # 找出利润下降明显的SKU
             significant_drop = profit_comparison_df[
                 (profit_comparison_df['利润变化率%'] < -30) |
-                (profit_comparison_df['利润'] < 0)
+                (profit_comparison_df['当前利润'] < 0)
                 ].sort_values('利润变化率%')
 
         else:
@@ -510,59 +782,23 @@ class MonthlySalesAnalyzer:
             print("❌ 无法进行月度对比分析")
             return None
 
-        # 月度汇总数据
-        monthly_summary = self.df.groupby('年月').agg({
-            '销售金额': 'sum',
-            '利润': 'sum',
-            '销售个数': 'sum',
-            'SKU编码': 'nunique',
-            '订单数': 'sum' if '订单数' in self.df.columns else ('销售金额', 'count')
-        }).round(2)
+        panel = self.get_sku_panel()
+
+        # 月度汇总数据（面板按列求和，订单数缺失时为记录数）
+        monthly_summary = panel.monthly_totals().round(2)
 
         # 计算平均订单金额等指标
-        if '订单数' in monthly_summary.columns:
-            monthly_summary['平均订单金额'] = (monthly_summary['销售金额'] / monthly_summary['订单数']).round(2)
+        monthly_summary['平均订单金额'] = (monthly_summary['销售金额'] / monthly_summary['订单数']).round(2)
         monthly_summary['平均利润率'] = (monthly_summary['利润'] / monthly_summary['销售金额'] * 100).round(2)
 
         # 计算环比增长率
-        monthly_summary = monthly_summary.sort_index()
         for column in ['销售金额', '利润', '销售个数']:
             if column in monthly_summary.columns:
-                monthly_summary[f'{column}_环比%'] = monthly_summary[column].pct_change() * 100
-                monthly_summary[f'{column}_环比%'] = monthly_summary[f'{column}_环比%'].round(2)
+                monthly_summary[f'{column}_环比%'] = column_pct_change(monthly_summary[column])
 
-        # 识别下降明显的SKU
+        # 识别下降明显的SKU（最近两个有销售记录的月份对比）
         sales_drop_threshold = self.report_config.get('sales_drop_threshold', 0.3) * 100
-
-        # 按SKU分析月度销售变化
-        sku_monthly = self.df.groupby(['SKU编码', '商品名称', '年月']).agg({
-            '销售金额': 'sum',
-            '销售个数': 'sum'
-        }).reset_index()
-
-        # 计算SKU的月度环比
-        sku_comparison = []
-        for sku in sku_monthly['SKU编码'].unique():
-            sku_data = sku_monthly[sku_monthly['SKU编码'] == sku].sort_values('年月')
-            if len(sku_data) >= 2:
-                current = sku_data.iloc[-1]
-                previous = sku_data.iloc[-2]
-
-                sales_change_pct = ((current['销售金额'] - previous['销售金额']) / previous['销售金额'] * 100) if \
-                previous['销售金额'] > 0 else -100
-
-                if sales_change_pct <= -sales_drop_threshold:
-                    sku_comparison.append({
-                        'SKU编码': sku,
-                        '商品名称': current['商品名称'],
-                        '当前月份': current['年月'],
-                        '当前销售额': current['销售金额'],
-                        '上月销售额': previous['销售金额'],
-                        '销售额下降%': round(sales_change_pct, 2),
-                        '下降程度': '严重' if sales_change_pct <= -50 else '明显'
-                    })
-
-        significant_drop_skus = pd.DataFrame(sku_comparison).sort_values('销售额下降%')
+        significant_drop_skus = detect_sales_drops(panel, sales_drop_threshold)
 
         results = {
             'monthly_summary': monthly_summary,
@@ -643,9 +879,24 @@ class MonthlySalesAnalyzer:
         except Exception as e:
             print(f"创建销售看板失败: {e}")
 
-    def run_all_analysis(self):
+    def register_analysis(self, name, func, depends_on=None, columns=None):
+        """
+        注册额外的分析任务（如深度分析），depends_on 为空时在所有已有模块之后执行
+
+        columns: 该任务读取的原始字段，None 表示未声明（加载时读取全部字段）
+        """
+        if depends_on is None:
+            depends_on = list(self.analysis_dependencies) + list(self.extra_analysis_tasks)
+        self.extra_analysis_tasks[name] = func
+        self.analysis_dependencies[name] = list(depends_on)
+        self.analysis_columns[name] = None if columns is None else list(columns)
+
+    def run_all_analysis(self, parallel=None, max_workers=None, modules=None):
         """
         执行所有分析模块
+
+        parallel: 是否按依赖关系并行执行，默认读取 report_config['parallel_analysis']
+        modules: 只执行指定的模块（方法名列表，如 ['run_category_analysis']），None 表示全部
         """
         print("🚀 开始执行销售数据分析...")
 
@@ -653,27 +904,38 @@ class MonthlySalesAnalyzer:
             print("❌ 缺少必要字段，无法进行分析")
             return None
 
-        # 定义分析模块执行顺序
-        analysis_modules = [
-            self.run_category_analysis,
-            self.run_sales_plan_analysis,
-            self.run_unsold_analysis,
-            self.run_profit_analysis,
-            self.run_monthly_comparison,
-        ]
-
-        # 执行分析模块
-        for module in analysis_modules:
-            try:
-                module()
-                print(f"   ✅ {module.__name__} 完成")
-            except Exception as e:
-                print(f"⚠️  {module.__name__} 执行失败: {e}")
+        if parallel is None:
+            parallel = self.report_config.get('parallel_analysis', False)
+        if parallel:
+            max_workers = max_workers or self.report_config.get('analysis_workers') or os.cpu_count()
+        else:
+            max_workers = 1
+
+        tasks = {name: getattr(self, name) for name in ANALYSIS_DEPENDENCIES}
+        tasks.update(self.extra_analysis_tasks)
+        if modules is not None:
+            tasks = {name: func for name, func in tasks.items() if name in modules}
+        # 每个模块记录为一个阶段，输出行数取该模块写入的结果（run_xxx -> analysis_results['xxx']）
+        rows_in = len(self.df)
+        tasks = {name: self.profiler.wrap(
+            name, func, rows_in=rows_in,
+            rows_out=lambda key=name[len('run_'):]: count_rows(self.analysis_results.get(key)))
+            for name, func in tasks.items()}
+
+        def report(name, info):
+            if info['ok']:
+                print(f"   ✅ {name} 完成 ({info['seconds']:.2f}s)")
+            else:
+                print(f"⚠️  {name} 执行失败: {info['error']}")
 
-        # 执行可视化分析
-        self.run_visualization()
+        # 执行分析模块（可视化在月度对比之后，注册的深度分析在最后）
+        timings, wall_seconds = run_task_graph(tasks, self.analysis_dependencies,
+                                               max_workers=max_workers, on_done=report)
+        self.analysis_timings = {'modules': timings, 'wall_seconds': wall_seconds,
+                                 'speedup': speedup(timings, wall_seconds), 'workers': max_workers}
 
-        print("✅ 所有分析模块执行完成！")
+        print(f"✅ 所有分析模块执行完成！总耗时 {wall_seconds:.2f}s"
+              + (f"，并行加速 {self.analysis_timings['speedup']:.2f}x" if max_workers > 1 else ""))
         return self.analysis_results
 
     def generate_report(self):
@@ -732,96 +994,154 @@ class MonthlySalesAnalyzer:
 
         return self.analysis_results
 
-    def export_to_excel(self):
+    def collect_export_sheets(self):
+        """
+        按导出顺序收集 [(工作表名, 结果表)]
+        """
+        sheets = []
+
+        # 3. 小分类分析
+        if 'category_analysis' in self.analysis_results:
+            sheets.append(('小分类分析', self.analysis_results['category_analysis']))
+
+        # 4. 销售计划分析
+        if 'sales_plan_analysis' in self.analysis_results:
+            results = self.analysis_results['sales_plan_analysis']
+            if 'category_plan' in results:
+                sheets.append(('销售计划完成情况', results['category_plan']))
+            if 'focus_skus' in results:
+                sheets.append(('需关注SKU', results['focus_skus']))
+
+        # 5. 滞销产品分析
+        if 'unsold_analysis' in self.analysis_results:
+            results = self.analysis_results['unsold_analysis']
+            if 'unsold_products' in results:
+                sheets.append(('滞销产品分析', results['unsold_products']))
+
+        # 6. 利润分析
+        if 'profit_analysis' in self.analysis_results:
+            results = self.analysis_results['profit_analysis']
+            if 'monthly_profit' in results:
+                sheets.append(('月度利润分析', results['monthly_profit']))
+            if 'significant_drop' in results:
+                sheets.append(('利润下降SKU', results['significant_drop']))
+
+        # 7. 月度对比
+        if 'monthly_comparison' in self.analysis_results:
+            results = self.analysis_results['monthly_comparison']
+            if 'monthly_summary' in results:
+                sheets.append(('月度对比', results['monthly_summary']))
+            if 'significant_drop_skus' in results:
+                sheets.append(('销售下降SKU', results['significant_drop_skus']))
+
+        # 近似去重SKU数的误差说明
+        if 'distinct_count_error' in self.analysis_results:
+            sheets.append(('去重计数误差', self.analysis_results['distinct_count_error']))
+
+        # 深度分析的趋势预测（见 enhanced_analyzer.analyze_trends）
+        trends = self.analysis_results.get('trends') or {}
+        if 'category_trends' in trends:
+            sheets.append(('品类趋势预测', trends['category_trends']))
+        if 'sku_trends' in trends:
+            sheets.append(('SKU趋势预测', trends['sku_trends']))
+
+        return sheets
+
+    def _write_summary_sheet(self, workbook, external_files=()):
+        """
+        1. 报告摘要（列出单独导出的大结果表文件）
+        """
+        summary_sheet = workbook.add_worksheet('报告摘要')
+        summary_sheet.set_column('A:A', 25)
+        summary_sheet.set_column('B:B', 20)
+
+        title_format = workbook.add_format({
+            'bold': True, 'font_size': 16, 'align': 'center', 'valign': 'vcenter'
+        })
+        summary_sheet.merge_range('A1:B1', f'销售分析报告 - {self.analysis_date}', title_format)
+
+        for row, path in enumerate(external_files, start=2):
+            summary_sheet.write_row(row, 0, ['单独导出的结果表', os.path.basename(path)])
+
+    def _write_dashboard_sheet(self, workbook):
+        """
+        8. 销售看板
+        """
+        if 'sales_dashboard' in self.chart_images:
+            dashboard_sheet = workbook.add_worksheet('销售看板')
+            dashboard_sheet.insert_image('A1', 'sales_dashboard',
+                                         {'image_data': self.chart_images['sales_dashboard']})
+
+    def export_to_excel(self, output_path=None):
         """
         导出分析结果到Excel
+
+        output_path: 指定输出路径时不弹出保存对话框（批处理 / 基准测试）
         """
         if not self.analysis_results:
             print("没有分析结果可导出")
             return None
 
-        # 确保reports目录存在
-        reports_dir = "reports"
-        if not os.path.exists(reports_dir):
-            os.makedirs(reports_dir)
-            print(f"创建目录: {reports_dir}")
+        if output_path is None:
+            # 确保reports目录存在
+            reports_dir = "reports"
+            if not os.path.exists(reports_dir):
+                os.makedirs(reports_dir)
+                print(f"创建目录: {reports_dir}")
 
-        root = tk.Tk()
-        root.withdraw()
+            root = tk.Tk()
+            root.withdraw()
 
-        # 修改这一行，使用绝对路径
-        default_filename = os.path.join(reports_dir, f"销售分析报告_{self.analysis_date}.xlsx")
+            # 修改这一行，使用绝对路径
+            default_filename = os.path.join(reports_dir, f"销售分析报告_{self.analysis_date}.xlsx")
 
-        output_path = filedialog.asksaveasfilename(
-            title="保存分析报告",
-            defaultextension=".xlsx",
-            filetypes=[("Excel files", "*.xlsx"), ("All files", "*.*")],
-            initialdir=reports_dir,  # 设置初始目录为reports_dir
-            initialfile=os.path.basename(default_filename)  # 只提供文件名，不包含路径
-        )
+            output_path = filedialog.asksaveasfilename(
+                title="保存分析报告",
+                defaultextension=".xlsx",
+                filetypes=[("Excel files", "*.xlsx"), ("All files", "*.*")],
+                initialdir=reports_dir,  # 设置初始目录为reports_dir
+                initialfile=os.path.basename(default_filename)  # 只提供文件名，不包含路径
+            )
 
-        root.destroy()
+            root.destroy()
 
         if not output_path:
             print("未选择保存位置")
             return None
 
-        try:
-            with pd.ExcelWriter(output_path, engine='xlsxwriter') as writer:
-                workbook = writer.book
-
-                # 1. 报告摘要
-                summary_sheet = workbook.add_worksheet('报告摘要')
-                summary_sheet.set_column('A:A', 25)
-                summary_sheet.set_column('B:B', 20)
-
-                title_format = workbook.add_format({
-                    'bold': True, 'font_size': 16, 'align': 'center', 'valign': 'vcenter'
-                })
-                summary_sheet.merge_range('A1:B1', f'销售分析报告 - {self.analysis_date}', title_format)
-
-
-                # 3. 小分类分析
-                if 'category_analysis' in self.analysis_results:
-                    self.analysis_results['category_analysis'].to_excel(
-                        writer, sheet_name='小分类分析')
-
-                # 4. 销售计划分析
-                if 'sales_plan_analysis' in self.analysis_results:
-                    results = self.analysis_results['sales_plan_analysis']
-                    if 'category_plan' in results:
-                        results['category_plan'].to_excel(writer, sheet_name='销售计划完成情况', startrow=0)
-                    if 'focus_skus' in results:
-                        results['focus_skus'].to_excel(writer, sheet_name='需关注SKU')
-
-                # 5. 滞销产品分析
-                if 'unsold_analysis' in self.analysis_results:
-                    results = self.analysis_results['unsold_analysis']
-                    if 'unsold_products' in results:
-                        results['unsold_products'].to_excel(writer, sheet_name='滞销产品分析')
-
-                # 6. 利润分析
-                if 'profit_analysis' in self.analysis_results:
-                    results = self.analysis_results['profit_analysis']
-                    if 'monthly_profit' in results:
-                        results['monthly_profit'].to_excel(writer, sheet_name='月度利润分析')
-                    if 'significant_drop' in results:
-                        results['significant_drop'].to_excel(writer, sheet_name='利润下降SKU')
-
-                # 7. 月度对比
-                if 'monthly_comparison' in self.analysis_results:
-                    results = self.analysis_results['monthly_comparison']
-                    if 'monthly_summary' in results:
-                        results['monthly_summary'].to_excel(writer, sheet_name='月度对比')
-                    if 'significant_drop_skus' in results:
-                        results['significant_drop_skus'].to_excel(writer, sheet_name='销售下降SKU')
-
-                # 8. 销售看板
-                if 'sales_dashboard' in self.chart_images:
-                    dashboard_sheet = workbook.add_worksheet('销售看板')
-                    dashboard_sheet.insert_image('A1', 'sales_dashboard',
-                                                 {'image_data': self.chart_images['sales_dashboard']})
+        sheets = self.collect_export_sheets()
+        large_rows = self.report_config.get('excel_streaming_rows', 200000)
+        mode = self.report_config.get('excel_export_mode', 'auto')
+        streaming = mode == 'streaming' or (
+            mode == 'auto' and any(len(frame) > large_rows for _, frame in sheets))
+        split = self.report_config.get('excel_split_large')
 
+        try:
+            with self.profiler.stage('export_excel', rows_in=sum(len(frame) for _, frame in sheets)):
+                # 超大结果表并行写入单独的文件（或 zip），主报告只保留其余结果表
+                external_files = []
+                if split in ('files', 'zip'):
+                    large = [(name, frame) for name, frame in sheets if len(frame) > large_rows]
+                    sheets = [(name, frame) for name, frame in sheets if len(frame) <= large_rows]
+                    external_files = export_sheet_files(large, output_path, bundle=split == 'zip',
+                                                        max_workers=self.report_config.get('analysis_workers'))
+
+                if streaming:
+                    # 流式导出：constant_memory 逐行写入，超过单表行数上限自动拆分工作表
+                    with open_workbook(output_path) as workbook:
+                        self._write_summary_sheet(workbook, external_files)
+                        for name, frame in sheets:
+                            write_sheet(workbook, name, frame)
+                        self._write_dashboard_sheet(workbook)
+                else:
+                    with pd.ExcelWriter(output_path, engine='xlsxwriter') as writer:
+                        self._write_summary_sheet(writer.book, external_files)
+                        for name, frame in sheets:
+                            frame.to_excel(writer, sheet_name=name)
+                        self._write_dashboard_sheet(writer.book)
+
+            for path in external_files:
+                print(f"📁 大结果表已单独导出到: {path}")
             print(f"📁 分析结果已导出到: {output_path}")
             return output_path
 
@@ -845,24 +1165,37 @@ def main():
     if not analyzer.select_file():
         return
 
-    # 加载数据
-    if not analyzer.load_data():
-        return
-
-    # 数据预处理
-    analyzer.preprocess_data()
+    if analyzer.report_config.get('analysis_backend', 'pandas') != 'pandas':
+        # 查询后端：由引擎直接在文件上聚合
+        analyzer.run_backend_analysis()
+    elif analyzer.should_stream():
+        # 大文件：分块流式聚合后分析
+        analyzer.run_streaming_analysis()
+    else:
+        # 加载并预处理数据（命中磁盘缓存时直接打开预处理结果）
+        if not analyzer.load_preprocessed():
+            return
 
-    # 执行所有分析
-    analyzer.run_all_analysis()
+        # 执行所有分析
+        analyzer.run_all_analysis()
 
     # 生成报告
-    analyzer.generate_report()
+    with analyzer.profiler.stage('generate_report'):
+        analyzer.generate_report()
 
     # 导出到Excel（只调用一次）
     output_path = analyzer.export_to_excel()
 
     print("\n🎉 分析完成！")
 
+    # 性能记录
+    analyzer.profiler.print_summary()
+    profile_output = analyzer.report_config.get('profile_output')
+    if profile_output:
+        analyzer.profiler.to_json(profile_output)
+        print(f"⏱️ 性能记录已导出到: {profile_output}")
+    analyzer.profiler.close()
+
     # 询问是否打开结果文件
     if output_path:
         root = tk.Tk()
@@ -888,4 +1221,8 @@ def main():
 
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        # 带参数运行时使用无界面批量模式（见 batch.py）
+        from batch import main as batch_main
+        sys.exit(batch_main(sys.argv[1:]))
     main()
\ No newline at end of file
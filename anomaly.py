@@ -0,0 +1,172 @@
+"""
+分组异常检测
+
+按 小分类 或 SKU 分组计算稳健统计量：每个指标按 (分组编号, 取值) 整体排序，
+各分组的分位数、中位数直接按位置取出，偏差再整体排序一次得到 MAD，不逐组循环。
+月度突变用 SKU × 月份 面板上的滚动 z 分数（前 window 个月的均值 / 标准差，累积和计算）。
+
+检测结果只保存命中行的位置数组和每组的阈值表，不修改、不复制输入数据；
+需要明细时用 anomaly_details() 按位置取出。
+"""
+import numpy as np
+import pandas as pd
+
+MAD_SCALE = 1.4826  # 正态分布下 MAD -> 标准差
+MEAN_AD_SCALE = 1.2533  # MAD 为 0 时改用平均绝对偏差
+
+
+def group_codes(df, by):
+    """分组编号和分组取值（by 为 None 或不在数据中时全部为一组，分组值缺失的行编号为 -1）"""
+    if by is None or by not in df.columns:
+        return np.zeros(len(df), dtype=np.intp), pd.Index(['全部'])
+    codes, labels = pd.factorize(df[by])
+    return codes.astype(np.intp, copy=False), pd.Index(labels, name=by)
+
+
+def _group_order(codes, values):
+    """按 (分组, 取值) 排序的位置：先按取值排序，再按分组编号稳定排序（比 lexsort 快约一倍）"""
+    by_value = np.argsort(values)
+    return by_value[np.argsort(codes[by_value], kind='stable')]
+
+
+def _sorted_groups(codes, n_groups, values):
+    """按 (分组, 取值) 排序，返回 (排序后的行位置, 排序后的取值, 每组起点, 每组个数)；缺失值不参与"""
+    valid = np.flatnonzero((codes >= 0) & ~np.isnan(values))
+    order = valid[_group_order(codes[valid], values[valid])]
+    counts = np.bincount(codes[order], minlength=n_groups)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    return order, values[order], starts, counts
+
+
+def _quantiles_sorted(sorted_values, starts, counts, quantiles):
+    """已按分组排序的数据的各组分位数（线性插值，同 pandas quantile），空分组为 NaN"""
+    out = np.full((len(counts), len(quantiles)), np.nan)
+    nonempty = np.flatnonzero(counts > 0)
+    for j, q in enumerate(quantiles):
+        pos = q * (counts[nonempty] - 1)
+        lo = np.floor(pos).astype(np.intp)
+        hi = np.ceil(pos).astype(np.intp)
+        low = sorted_values[starts[nonempty] + lo]
+        high = sorted_values[starts[nonempty] + hi]
+        out[nonempty, j] = low + (high - low) * (pos - lo)
+    return out
+
+
+def robust_stats(codes, labels, values):
+    """
+    每组的稳健统计量: 记录数, Q1, 中位数, Q3, MAD, 平均绝对偏差
+
+    values: float64 数组（缺失值为 NaN）
+    """
+    n_groups = len(labels)
+    _, sorted_values, starts, counts = _sorted_groups(codes, n_groups, values)
+    q1, median, q3 = _quantiles_sorted(sorted_values, starts, counts, [0.25, 0.5, 0.75]).T
+
+    # 偏差在每组内不再有序，重新排序一次求 MAD
+    group_of_sorted = np.repeat(np.arange(n_groups), counts)
+    deviation = np.abs(sorted_values - median[group_of_sorted])
+    mean_ad = np.bincount(group_of_sorted, weights=deviation, minlength=n_groups) / np.maximum(counts, 1)
+    deviation_order = _group_order(group_of_sorted, deviation)
+    mad = _quantiles_sorted(deviation[deviation_order], starts, counts, [0.5])[:, 0]
+
+    stats = pd.DataFrame({'记录数': counts, 'Q1': q1, '中位数': median, 'Q3': q3,
+                          'MAD': mad, '平均绝对偏差': mean_ad}, index=labels)
+    stats.loc[counts == 0, '平均绝对偏差'] = np.nan
+    return stats
+
+
+def iqr_outliers(codes, stats, values, k=1.5, side='both', min_group_size=5):
+    """
+    IQR 异常：超出所在分组 [Q1 - k·IQR, Q3 + k·IQR] 的行
+
+    side: 'both' / 'upper' / 'lower'
+    返回 (行位置数组, 每组阈值表)
+    """
+    iqr = stats['Q3'].to_numpy() - stats['Q1'].to_numpy()
+    lower = stats['Q1'].to_numpy() - k * iqr
+    upper = stats['Q3'].to_numpy() + k * iqr
+    eligible = stats['记录数'].to_numpy() >= min_group_size
+    if side == 'upper':
+        lower = np.full_like(lower, -np.inf)
+    elif side == 'lower':
+        upper = np.full_like(upper, np.inf)
+
+    group = np.maximum(codes, 0)
+    with np.errstate(invalid='ignore'):
+        hit = (codes >= 0) & eligible[group] & ((values < lower[group]) | (values > upper[group]))
+    bounds = pd.DataFrame({'记录数': stats['记录数'], '下限': lower, '上限': upper}, index=stats.index)
+    return np.flatnonzero(hit), bounds
+
+
+def mad_outliers(codes, stats, values, threshold=3.5, min_group_size=5):
+    """
+    MAD 异常：稳健 z 分数 |x - 中位数| / (1.4826·MAD) 超过阈值的行
+    （MAD 为 0 的分组改用 1.2533·平均绝对偏差，两者都为 0 的分组不检测）
+
+    返回 (行位置数组, 每行的稳健 z 分数)
+    """
+    scale = MAD_SCALE * stats['MAD'].to_numpy()
+    scale = np.where(scale > 0, scale, MEAN_AD_SCALE * stats['平均绝对偏差'].to_numpy())
+    eligible = (stats['记录数'].to_numpy() >= min_group_size) & (scale > 0)
+
+    group = np.maximum(codes, 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = (values - stats['中位数'].to_numpy()[group]) / scale[group]
+        hit = (codes >= 0) & eligible[group] & (np.abs(z) > threshold)
+    rows = np.flatnonzero(hit)
+    return rows, z[rows]
+
+
+def rolling_zscores(matrix, window=3):
+    """
+    滚动 z 分数：每一列与其前 window 列的均值、样本标准差比较（按行独立）
+
+    matrix: [实体, 月份] 矩阵；返回同形状矩阵，前 window 列和标准差为 0 的位置为 NaN
+    """
+    matrix = np.asarray(matrix, dtype=np.float64)
+    n_rows, n_cols = matrix.shape
+    z = np.full((n_rows, n_cols), np.nan)
+    if window < 2 or n_cols <= window:
+        return z
+
+    # 前缀和：C[:, k] 为前 k 列之和，窗口和 = C[:, t] - C[:, t - window]
+    zeros = np.zeros((n_rows, 1))
+    c1 = np.concatenate([zeros, np.cumsum(matrix, axis=1)], axis=1)
+    c2 = np.concatenate([zeros, np.cumsum(matrix * matrix, axis=1)], axis=1)
+    s1 = c1[:, window:n_cols] - c1[:, :n_cols - window]
+    s2 = c2[:, window:n_cols] - c2[:, :n_cols - window]
+    mean = s1 / window
+    var = np.maximum(s2 - s1 * mean, 0) / (window - 1)
+    std = np.sqrt(var)
+    # 前缀和相减有舍入误差，极小的标准差视为 0
+    std[std <= 1e-9 * np.maximum(np.abs(mean), 1)] = np.nan
+    z[:, window:] = (matrix[:, window:] - mean) / std
+    return z
+
+
+def rolling_outliers(matrix, window=3, threshold=3.0):
+    """滚动 z 分数超过阈值的位置，返回 (行号数组, 列号数组, z 分数数组)"""
+    z = rolling_zscores(matrix, window)
+    with np.errstate(invalid='ignore'):
+        rows, cols = np.nonzero(np.abs(z) > threshold)
+    return rows, cols, z[rows, cols]
+
+
+def anomaly_details(df, anomaly, columns=None):
+    """
+    按需展开一项检测结果的明细
+
+    行级结果（rows 为 df 的行位置）取出 columns 字段，默认 SKU编码 / 商品名称 / 小分类；
+    月度突变结果（rows / columns 为面板的 SKU / 月份位置）给出 SKU编码 和 年月。
+    两者都附加检测时保存的指标值（values）
+    """
+    if 'labels' in anomaly:
+        skus, months = anomaly['labels']
+        details = pd.DataFrame({'SKU编码': skus.take(anomaly['rows']),
+                                '年月': np.asarray(months, dtype=object)[anomaly['columns']]})
+    else:
+        columns = ['SKU编码', '商品名称', '小分类'] if columns is None else columns
+        details = df[[col for col in columns if col in df.columns]].iloc[anomaly['rows']].reset_index(drop=True)
+    for name, values in anomaly.get('values', {}).items():
+        details[name] = values
+    return details
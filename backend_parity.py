@@ -0,0 +1,211 @@
+"""
+各分析路径与 pandas 路径的一致性检查
+
+生成带缺失值的合成数据，按月份拆成两个文件（前几个月 / 最后一个月），另写一份按同样顺序拼接的完整文件。
+完整文件用 pandas 路径（全量读入 + 预处理）执行五个核心分析模块作为基准，再分别用
+- 查询后端（duckdb）在完整文件上执行
+- 流式模式按小块读取完整文件
+- 增量模式依次合并两个文件；再用最后一个月的文件覆盖一次（replace）
+逐个结果表比较（数值允许舍入误差，行顺序、索引、列和建议文本必须一致，含滞销清单明细），并给出各路径的耗时。
+不一致时退出码为 1。test_backend_parity.py 用较小的数据量在 pytest 中执行同样的检查。
+
+用法:
+    python backend_parity.py [行数] [--backend duckdb] [--format csv|parquet|feather]
+        [--paths backend,streaming,incremental] [--chunksize N]
+        [--missing-rate R] [--skus N] [--seed N]
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+from analyzer import MonthlySalesAnalyzer
+from synthetic_data import generate_sales, parse_rows
+
+CORE_MODULES = ['run_category_analysis', 'run_sales_plan_analysis', 'run_unsold_analysis',
+                'run_profit_analysis', 'run_monthly_comparison']
+ATOL = 0.02  # 金额和百分比都保留两位小数，求和顺序不同时末位可能相差 0.01
+PATHS = ['backend', 'streaming', 'incremental', 'incremental_replace']
+
+
+def _analyzer(path):
+    analyzer = MonthlySalesAnalyzer()
+    analyzer.report_config = {**analyzer.report_config, 'disk_cache': False, 'approx_distinct': False}
+    analyzer.file_path = path
+    return analyzer
+
+
+def run_pandas(path):
+    analyzer = _analyzer(path)
+    if not analyzer.load_data():
+        raise RuntimeError("数据加载失败")
+    analyzer.preprocess_data()
+    analyzer.run_all_analysis(modules=CORE_MODULES)
+    return analyzer.analysis_results
+
+
+def run_backend(path, backend):
+    analyzer = _analyzer(path)
+    if analyzer.run_backend_analysis(backend, modules=CORE_MODULES) is None:
+        raise RuntimeError(f"{backend} 后端执行失败")
+    return analyzer.analysis_results
+
+
+def run_streaming(path, chunksize):
+    analyzer = _analyzer(path)
+    if analyzer.run_streaming_analysis(chunksize, modules=CORE_MODULES) is None:
+        raise RuntimeError("流式分析失败")
+    return analyzer.analysis_results
+
+
+def run_incremental(path, parts, state_dir, chunksize, replace=False):
+    """依次把 parts 合并进新的状态目录（replace 时再用最后一个文件覆盖一次），然后从状态执行分析"""
+    analyzer = _analyzer(path)
+    analyzer.report_config['streaming_chunksize'] = chunksize
+    for part in parts:
+        if analyzer.run_incremental_analysis(state_dir, [part], run_analysis=False) is None:
+            raise RuntimeError(f"增量合并失败: {part}")
+    if replace and analyzer.run_incremental_analysis(state_dir, parts[-1:], replace=True, run_analysis=False) is None:
+        raise RuntimeError(f"增量覆盖失败: {parts[-1]}")
+    if analyzer.run_incremental_analysis(state_dir, modules=CORE_MODULES) is None:
+        raise RuntimeError("增量分析失败")
+    return analyzer.analysis_results
+
+
+def _write_frame(df, path):
+    if path.endswith('.parquet'):
+        df.to_parquet(path, index=False)
+    elif path.endswith('.feather'):
+        df.reset_index(drop=True).to_feather(path)
+    else:
+        df.to_csv(path, index=False)
+    return path
+
+
+def write_split(directory, fmt, n_rows, **params):
+    """
+    生成合成数据，写出按月份拆分的两个文件和按同样顺序拼接的完整文件
+
+    返回 (完整文件路径, [拆分文件路径])；日期缺失或无法解析的行归入第一个文件
+    """
+    df = generate_sales(n_rows, **params)
+    month = pd.to_datetime(df['日期'], errors='coerce').dt.strftime('%Y-%m')
+    last = (month == month.max()).to_numpy()
+    parts = [df[~last], df[last]]
+    paths = [_write_frame(part, os.path.join(directory, f'part{i + 1}.{fmt}')) for i, part in enumerate(parts)]
+    return _write_frame(pd.concat(parts, ignore_index=True), os.path.join(directory, f'sales.{fmt}')), paths
+
+
+def flatten(results, prefix=''):
+    """结果 dict 展开为 {路径: 值}"""
+    items = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            items.update(flatten(value, name + '.'))
+        else:
+            items[name] = value
+    return items
+
+
+def compare(expected, actual):
+    """逐项比较两组分析结果，返回 [(名称, 是否一致, 说明)]"""
+    expected, actual = flatten(expected), flatten(actual)
+    rows = []
+    for name in sorted(set(expected) | set(actual)):
+        if name not in expected or name not in actual:
+            rows.append((name, False, "只在一条路径中存在"))
+            continue
+        left, right = expected[name], actual[name]
+        try:
+            if isinstance(left, pd.DataFrame):
+                pd.testing.assert_frame_equal(left, right, check_dtype=False, check_index_type=False,
+                                              check_column_type=False, check_exact=False, rtol=0, atol=ATOL)
+                rows.append((name, True, f"{len(left)} 行"))
+            else:
+                if left != right:
+                    raise AssertionError(f"{left!r} != {right!r}")
+                rows.append((name, True, repr(left)[:40]))
+        except AssertionError as e:
+            rows.append((name, False, str(e).strip().splitlines()[0][:120]))
+    return rows
+
+
+def run_paths(n_rows=200_000, backend='duckdb', fmt='csv', missing_rate=0.01, n_skus=None, seed=0,
+              paths=None, chunksize=None):
+    """
+    在同一份合成数据上执行 pandas 基准和 paths 中的各条路径
+
+    chunksize: 流式 / 增量模式每块行数，默认约为行数的 1/7（保证分成多块）
+    返回 (基准结果, {路径: 结果}, {路径: 耗时})
+    """
+    paths = paths or PATHS
+    chunksize = chunksize or max(1, n_rows // 7)
+    with tempfile.TemporaryDirectory() as tmp:
+        full, parts = write_split(tmp, fmt, n_rows, n_skus=n_skus, missing_rate=missing_rate, seed=seed)
+        runners = {
+            'pandas': lambda: run_pandas(full),
+            'backend': lambda: run_backend(full, backend),
+            'streaming': lambda: run_streaming(full, chunksize),
+            'incremental': lambda: run_incremental(full, parts, os.path.join(tmp, 'state'), chunksize),
+            'incremental_replace': lambda: run_incremental(full, parts, os.path.join(tmp, 'state_replace'),
+                                                           chunksize, replace=True),
+        }
+        results, timings = {}, {}
+        with contextlib.redirect_stdout(io.StringIO()):
+            for name in ['pandas'] + list(paths):
+                start = time.perf_counter()
+                results[name] = runners[name]()
+                timings[name] = time.perf_counter() - start
+    expected = results.pop('pandas')
+    return expected, results, timings
+
+
+def check(n_rows=200_000, backend='duckdb', fmt='csv', missing_rate=0.01, n_skus=None, seed=0,
+          paths=None, chunksize=None):
+    expected, results, timings = run_paths(n_rows, backend, fmt, missing_rate, n_skus, seed, paths, chunksize)
+    failed = []
+    for path, actual in results.items():
+        print(f"🔍 {path} vs pandas")
+        rows = compare(expected, actual)
+        for name, ok, detail in rows:
+            if not ok:
+                print(f"   ❌ {name}: {detail}")
+        bad = [name for name, ok, _ in rows if not ok]
+        failed += [f"{path}:{name}" for name in bad]
+        if not bad:
+            print(f"   ✅ {len(rows)} 项结果全部一致")
+    print("⏱️ " + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in timings.items())
+          + f" ({n_rows} 行 {fmt}, 缺失率 {missing_rate})")
+    if failed:
+        print(f"❌ {len(failed)} 项不一致: {failed}")
+    return not failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="各分析路径与 pandas 路径的一致性检查")
+    parser.add_argument('rows', nargs='?', default='200k', help="行数，如 200000 / 200k / 1m")
+    parser.add_argument('--backend', default='duckdb')
+    parser.add_argument('--format', dest='fmt', choices=['csv', 'parquet', 'feather'], default='csv')
+    parser.add_argument('--paths', default=','.join(PATHS), help=f"逗号分隔，可选: {','.join(PATHS)}")
+    parser.add_argument('--chunksize', type=int, default=None, help="流式 / 增量模式每块行数")
+    parser.add_argument('--missing-rate', type=float, default=0.01)
+    parser.add_argument('--skus', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    paths = [name.strip() for name in args.paths.split(',') if name.strip()]
+    unknown = sorted(set(paths) - set(PATHS))
+    if unknown:
+        parser.error(f"未知的路径: {unknown}")
+    ok = check(parse_rows(args.rows), args.backend, args.fmt, args.missing_rate, args.skus, args.seed,
+               paths, args.chunksize)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
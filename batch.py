@@ -0,0 +1,243 @@
+"""
+无界面批量分析
+
+不弹出任何对话框：按路径或通配符收集输入文件，在进程池中并行分析，
+每个文件生成自己的 Excel 报告和日志，最后生成一份汇总表。
+
+用法:
+    python batch.py <文件或通配符 ...> -o <输出目录> [--config 配置.json]
+        [--modules category,sales_plan,unsold_products,profit_analysis,monthly_comparison,visualization,deep_analysis]
+        [--workers N] [--backend pandas|duckdb] [--sheet 工作表名称或序号]
+
+也可以直接运行 python analyzer.py <文件或通配符 ...> -o <输出目录>（参数相同）
+"""
+import argparse
+import contextlib
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+# 服务器上没有图形界面，图表用非交互后端生成
+os.environ.setdefault('MPLBACKEND', 'Agg')
+
+import pandas as pd
+
+SUPPORTED_EXTENSIONS = ('.csv', '.xlsx', '.parquet', '.feather')
+
+# 命令行模块名 -> 分析方法（与 report_config 中 analysis_modules 的键一致）
+MODULE_METHODS = {
+    'category': 'run_category_analysis',
+    'sales_plan': 'run_sales_plan_analysis',
+    'unsold_products': 'run_unsold_analysis',
+    'profit_analysis': 'run_profit_analysis',
+    'monthly_comparison': 'run_monthly_comparison',
+    'visualization': 'run_visualization',
+    'deep_analysis': 'run_deep_analysis',
+}
+
+
+def expand_inputs(patterns):
+    """展开路径 / 通配符 / 目录（包含子目录），返回去重排序后的数据文件列表"""
+    paths = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            pattern = os.path.join(pattern, '**', '*')
+        matches = glob.glob(pattern, recursive=True) if glob.has_magic(pattern) else [pattern]
+        paths.update(path for path in matches if path.endswith(SUPPORTED_EXTENSIONS) and os.path.isfile(path))
+    return sorted(paths)
+
+
+def report_names(paths):
+    """
+    每个输入文件的报告名
+
+    文件名重复时依次加上所在目录名（例如按区域分目录的同名文件）和扩展名
+    """
+    def candidates(path):
+        folder = os.path.basename(os.path.dirname(os.path.abspath(path)))
+        stem, ext = os.path.splitext(os.path.basename(path))
+        return [stem, f"{folder}_{stem}", f"{folder}_{stem}_{ext.lstrip('.')}"]
+
+    options = [candidates(path) for path in paths]
+    names = [option[0] for option in options]
+    for level in (1, 2):
+        names = [option[level] if names.count(name) > 1 else name for name, option in zip(names, options)]
+    return names
+
+
+def load_config(path):
+    """读取 JSON 配置（覆盖 report_config 中的同名项）"""
+    if not path:
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _summary_row(analyzer):
+    """单个文件的汇总指标"""
+    df = analyzer.df
+    row = {'行数': len(df)}
+    if '销售金额' in df.columns:
+        row['总销售额'] = round(float(df['销售金额'].sum()), 2)
+    if '利润' in df.columns:
+        row['总利润'] = round(float(df['利润'].sum()), 2)
+        if row.get('总销售额'):
+            row['利润率%'] = round(row['总利润'] / row['总销售额'] * 100, 2)
+    if 'SKU编码' in df.columns:
+        row['SKU数'] = int(df['SKU编码'].nunique())
+    if '年月' in df.columns:
+        months = df['年月'].dropna().astype(str)
+        row['月份范围'] = f"{months.min()} ~ {months.max()}" if len(months) else ''
+    unsold = analyzer.analysis_results.get('unsold_analysis')
+    if unsold:
+        row['滞销SKU数'] = unsold.get('unsold_skus')
+    return row
+
+
+def analyze_file(path, report_path, config=None, modules=None):
+    """
+    分析单个文件并导出报告（在子进程中执行，分析过程的输出写入 <报告名>.log）
+
+    返回汇总信息 dict
+    """
+    from analyzer import MonthlySalesAnalyzer
+    from enhanced_analyzer import enhance_analyzer
+
+    start = time.perf_counter()
+    summary = {'文件': path, '报告': None, '状态': '失败', '错误': None}
+    log_path = os.path.splitext(report_path)[0] + '.log'
+
+    with open(log_path, 'w', encoding='utf-8') as log, contextlib.redirect_stdout(log):
+        try:
+            analyzer = MonthlySalesAnalyzer()
+            # 每个文件独占一个进程，模块内不再开线程池 / 进程池
+            analyzer.report_config = {**analyzer.report_config, 'analysis_workers': 1, **(config or {})}
+            analyzer.file_path = path
+
+            methods = None if modules is None else [MODULE_METHODS[name] for name in modules]
+            if analyzer.report_config.get('analysis_backend', 'pandas') != 'pandas':
+                if methods is None or 'run_deep_analysis' in methods:
+                    print("ℹ️ 查询后端模式下不执行深度分析")
+                results = analyzer.run_backend_analysis(modules=methods)
+            elif analyzer.should_stream():
+                if methods is None or 'run_deep_analysis' in methods:
+                    print("ℹ️ 流式模式下不执行深度分析")
+                results = analyzer.run_streaming_analysis(modules=methods)
+            else:
+                # 先注册深度分析，加载时一并读取它用到的字段
+                if methods is None or 'run_deep_analysis' in methods:
+                    enhance_analyzer(analyzer)
+                if not analyzer.load_preprocessed(methods):
+                    raise RuntimeError("数据加载失败")
+                results = analyzer.run_all_analysis(modules=methods)
+
+            if results is None:
+                raise RuntimeError("分析未完成（缺少必要字段或读取失败），详见日志")
+
+            summary['报告'] = analyzer.export_to_excel(output_path=report_path)
+            if summary['报告'] is None:
+                raise RuntimeError("报告导出失败，详见日志")
+            summary.update(_summary_row(analyzer))
+            summary['状态'] = '成功'
+        except Exception as e:
+            print(f"❌ {e}")
+            summary['错误'] = str(e)
+
+    summary['耗时(s)'] = round(time.perf_counter() - start, 2)
+    return summary
+
+
+def run_batch(paths, output_dir, config=None, modules=None, max_workers=None):
+    """
+    并行分析多个文件，返回汇总表（每个文件一行）并写入 <输出目录>/批量汇总_<时间>.xlsx
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    report_paths = [os.path.join(output_dir, f"{name}_销售分析报告.xlsx") for name in report_names(paths)]
+    max_workers = min(max_workers or os.cpu_count() or 1, len(paths))
+    print(f"🚀 批量分析 {len(paths)} 个文件，{max_workers} 个进程...")
+
+    rows = []
+    if max_workers == 1:
+        for i, (path, report_path) in enumerate(zip(paths, report_paths), start=1):
+            rows.append(analyze_file(path, report_path, config, modules))
+            _print_progress(rows[-1], i, len(paths))
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = [pool.submit(analyze_file, path, report_path, config, modules)
+                       for path, report_path in zip(paths, report_paths)]
+            for i, future in enumerate(as_completed(futures), start=1):
+                rows.append(future.result())
+                _print_progress(rows[-1], i, len(paths))
+
+    order = {path: i for i, path in enumerate(paths)}
+    summary = pd.DataFrame(sorted(rows, key=lambda row: order[row['文件']]))
+
+    summary_path = os.path.join(output_dir, f"批量汇总_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx")
+    with pd.ExcelWriter(summary_path, engine='xlsxwriter') as writer:
+        summary.to_excel(writer, sheet_name='文件汇总', index=False)
+        # 各文件的 SKU 可能重叠，SKU数不做合计
+        succeeded = summary[summary['状态'] == '成功']
+        totals = succeeded[[col for col in ['行数', '总销售额', '总利润'] if col in succeeded.columns]].sum()
+        if totals.get('总销售额'):
+            totals['利润率%'] = round(totals.get('总利润', 0) / totals['总销售额'] * 100, 2)
+        totals['文件数'] = len(succeeded)
+        totals.rename('合计').to_frame().to_excel(writer, sheet_name='总计')
+
+    failed = int((summary['状态'] != '成功').sum())
+    print(f"🎉 完成: 成功 {len(summary) - failed} 个, 失败 {failed} 个")
+    print(f"📁 汇总表: {summary_path}")
+    return summary
+
+
+def _print_progress(row, done, total):
+    name = os.path.basename(row['文件'])
+    if row['状态'] == '成功':
+        print(f"   ✅ [{done}/{total}] {name} ({row['耗时(s)']}s)")
+    else:
+        print(f"   ⚠️ [{done}/{total}] {name} 失败: {row['错误']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="无界面批量销售数据分析")
+    parser.add_argument('inputs', nargs='+', help="数据文件、目录或通配符（如 'data/**/*.csv'）")
+    parser.add_argument('-o', '--output-dir', default='reports')
+    parser.add_argument('--config', help="JSON 配置文件，覆盖 report_config 中的同名项")
+    parser.add_argument('--modules', help=f"逗号分隔的模块列表，可选: {','.join(MODULE_METHODS)}")
+    parser.add_argument('--workers', type=int, default=None, help="进程数，默认 CPU 核数")
+    parser.add_argument('--backend', choices=['pandas', 'duckdb'], default=None,
+                        help="聚合后端（覆盖配置中的 analysis_backend）")
+    parser.add_argument('--sheet', default=None,
+                        help="xlsx 读取的工作表名称或从 0 开始的序号（覆盖配置中的 xlsx_sheet）")
+    parser.add_argument('--disk-cache', action='store_true',
+                        help="把预处理结果缓存到磁盘（SALES_CACHE_DIR 或 ~/.sales_cache），重复分析同一文件时跳过解析")
+    args = parser.parse_args(argv)
+
+    modules = None
+    if args.modules:
+        modules = [name.strip() for name in args.modules.split(',') if name.strip()]
+        unknown = [name for name in modules if name not in MODULE_METHODS]
+        if unknown:
+            parser.error(f"未知的模块: {unknown}，可选: {list(MODULE_METHODS)}")
+
+    paths = expand_inputs(args.inputs)
+    if not paths:
+        print("❌ 没有找到数据文件")
+        return 1
+
+    config = load_config(args.config)
+    if args.backend:
+        config = {**config, 'analysis_backend': args.backend}
+    if args.disk_cache:
+        config = {**config, 'disk_cache': True}
+    if args.sheet is not None:
+        config = {**config, 'xlsx_sheet': int(args.sheet) if args.sheet.isdigit() else args.sheet}
+    summary = run_batch(paths, args.output_dir, config, modules, args.workers)
+    return 0 if (summary['状态'] == '成功').all() else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
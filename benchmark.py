@@ -0,0 +1,285 @@
+"""
+性能基准测试
+
+用法:
+    python benchmark.py profit_comparison|sku_panel [行数 ...]
+    python benchmark.py encoding [文件大小MB]
+    python benchmark.py suite [10k 1m 10m] [--format csv|parquet] [--save-baseline] [--tolerance 0.2]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from data_loader import read_csv_once
+from profiling import StageProfiler, compare_profiles
+from sku_panel import SkuMonthPanel, build_profit_comparison, detect_sales_drops
+from synthetic_data import parse_rows, write_sales
+
+# 基准结果与机器相关，请在同一台机器上对比
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+SUITE_SIZES = ('10k', '1m', '10m')
+
+
+def make_monthly_profit(n_rows, n_months=12, seed=0):
+    """生成 SKU × 月份 粒度的利润明细（与 run_profit_analysis 中的 monthly_profit 结构一致）"""
+    rng = np.random.default_rng(seed)
+    n_skus = max(1, n_rows // n_months)
+    sku_codes = np.array([f"SKU{i:07d}" for i in range(n_skus)])
+    months = np.array([f"2024-{m:02d}" for m in range(1, n_months + 1)])
+
+    sku_idx = rng.integers(0, n_skus, n_rows)
+    month_idx = rng.integers(0, n_months, n_rows)
+    sales = rng.gamma(2.0, 500.0, n_rows).round(2)
+
+    df = pd.DataFrame({
+        'SKU编码': sku_codes[sku_idx],
+        '商品名称': np.char.add('商品', sku_idx.astype(str)),
+        '年月': months[month_idx],
+        '销售金额': sales,
+        '利润': (sales * rng.normal(0.15, 0.1, n_rows)).round(2),
+        '销售个数': rng.integers(1, 50, n_rows),
+    })
+    return df.groupby(['SKU编码', '商品名称', '年月'], as_index=False).sum()
+
+
+def _time_call(func, *args, repeat=3):
+    """取多次执行的最短耗时（秒）"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _panel_profit_comparison(monthly_profit):
+    return build_profit_comparison(SkuMonthPanel.from_frame(monthly_profit))
+
+
+def _panel_all_comparisons(monthly_profit):
+    panel = SkuMonthPanel.from_frame(monthly_profit)
+    build_profit_comparison(panel)
+    detect_sales_drops(panel, 30)
+    panel.monthly_totals()
+
+
+def bench_profit_comparison(sizes=(50_000, 100_000, 200_000, 400_000, 800_000), func=_panel_profit_comparison):
+    """
+    测试向量化月度对比（含构建面板）的耗时随行数的变化
+
+    每行耗时（µs/行）基本不变即说明是线性复杂度
+    """
+    print(f"📏 {func.__name__} 线性扩展测试")
+    print(f"{'行数':>10} {'SKU数':>10} {'耗时(s)':>10} {'µs/行':>8}")
+
+    per_row = []
+    for n_rows in sizes:
+        monthly_profit = make_monthly_profit(n_rows)
+        elapsed = _time_call(func, monthly_profit)
+        per_row.append(elapsed / len(monthly_profit) * 1e6)
+        print(f"{len(monthly_profit):>10} {monthly_profit['SKU编码'].nunique():>10} "
+              f"{elapsed:>10.3f} {per_row[-1]:>8.2f}")
+
+    growth = per_row[-1] / per_row[0] if per_row[0] > 0 else float('nan')
+    print(f"   最大/最小规模的单行耗时比: {growth:.2f}（接近 1 表示线性扩展）")
+    return per_row
+
+
+def write_gbk_csv(path, size_mb, seed=0):
+    """
+    生成指定大小的 GBK 编码销售明细 CSV
+
+    表头和前半部分为纯 ASCII，中文出现在文件后半部分，
+    这是逐个尝试编码时最慢的情况（解析到一半才发现解码失败）
+    """
+    rng = np.random.default_rng(seed)
+    names = np.array(['蓝牙耳机', '保温杯', '数据线', '收纳盒', '台灯', '雨伞', '背包', '水杯'])
+    rows_per_batch = 50_000
+    with open(path, 'w', encoding='gbk', newline='') as f:
+        f.write('sku,name,category,date,sales,profit,units\n')
+        target = size_mb * 1024 * 1024
+        while f.tell() < target:
+            idx = rng.integers(0, len(names), rows_per_batch)
+            product = names[idx] if f.tell() > target // 2 else np.array(['item'] * rows_per_batch)
+            df = pd.DataFrame({
+                'SKU编码': rng.integers(0, 100_000, rows_per_batch),
+                '商品名称': product,
+                '小分类': product,
+                '日期': '2024-01-15',
+                '销售金额': rng.gamma(2.0, 100.0, rows_per_batch).round(2),
+                '利润': rng.normal(20, 10, rows_per_batch).round(2),
+                '销售个数': rng.integers(1, 10, rows_per_batch),
+            })
+            df.to_csv(f, header=False, index=False)
+
+
+def _legacy_read_csv(path):
+    """原实现：依次尝试多种编码，每次失败都要重新解析"""
+    for encoding in ['utf-8-sig', 'gbk', 'gb2312', 'utf-8']:
+        try:
+            return pd.read_csv(path, encoding=encoding, low_memory=False), encoding
+        except UnicodeDecodeError:
+            continue
+
+
+def bench_encoding(size_mb=200):
+    """对比逐个编码尝试与字节采样探测的 CSV 加载耗时"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'sales_gbk.csv')
+        write_gbk_csv(path, size_mb)
+        print(f"🧪 GBK 测试文件: {os.path.getsize(path) / 1024 / 1024:.0f} MB")
+
+        start = time.perf_counter()
+        _, legacy_encoding = _legacy_read_csv(path)
+        legacy = time.perf_counter() - start
+        print(f"   逐个尝试编码: {legacy:.2f}s (最终编码 {legacy_encoding})")
+
+        start = time.perf_counter()
+        _, info = read_csv_once(path, low_memory=False)
+        sniffed = time.perf_counter() - start
+        print(f"   采样探测编码: {sniffed:.2f}s (编码 {info['encoding']}, "
+              f"采样 {info['sampled_bytes'] / 1024:.0f} KB, 重新解析: {info['retried']})")
+        print(f"   加速比: {legacy / sniffed:.2f}x")
+    return legacy, sniffed
+
+
+def run_pipeline(path, output_dir, label=None):
+    """
+    在一个数据文件上执行完整的分析流程，返回各阶段的 StageProfiler
+
+    阶段: 加载、预处理、各 run_* 模块（含可视化）、深度分析、Excel 导出
+    """
+    from analyzer import MonthlySalesAnalyzer
+    from enhanced_analyzer import enhance_analyzer
+
+    # 分析过程的输出不打印到终端
+    with contextlib.redirect_stdout(io.StringIO()):
+        analyzer = MonthlySalesAnalyzer()
+        analyzer.profiler = profiler = StageProfiler(label=label)
+        analyzer.file_path = path
+
+        with profiler.stage('load_data') as stage:
+            if not analyzer.load_data():
+                raise RuntimeError(f"数据加载失败: {path}")
+            stage['rows_out'] = len(analyzer.df)
+        analyzer.preprocess_data()
+        enhance_analyzer(analyzer)
+        analyzer.run_all_analysis(parallel=False)
+        analyzer.export_to_excel(output_path=os.path.join(output_dir, 'report.xlsx'))
+    return profiler
+
+
+def find_regressions(results, baseline, tolerance=0.2, min_seconds=0.05):
+    """
+    与基准结果对比，返回耗时超过 基准×(1+tolerance) 且增加超过 min_seconds 的阶段
+
+    results / baseline: {规模: StageProfiler.to_dict()}
+    """
+    regressions = []
+    for label, profile in results.items():
+        if label not in baseline:
+            continue
+        table = compare_profiles(profile, baseline[label]).dropna()
+        slower = table[(table['ratio'] > 1 + tolerance) & (table['delta_seconds'] > min_seconds)]
+        regressions += [(label, stage, float(row['baseline_seconds']), float(row['current_seconds']),
+                         float(row['ratio'])) for stage, row in slower.iterrows()]
+    return regressions
+
+
+def bench_suite(sizes=SUITE_SIZES, fmt='csv', baseline_path=BASELINE_PATH, save_baseline=False,
+                tolerance=0.2, seed=0):
+    """
+    在 10k / 1M / 10M 行合成数据上执行完整分析流程并计时，与基准结果对比标记性能回退
+
+    返回 (各规模的阶段记录, 回退列表)
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            n_rows = parse_rows(size)
+            label = str(size)
+            path = os.path.join(tmp, f'sales_{label}.{fmt}')
+            print(f"🧪 生成 {n_rows} 行合成数据 ({fmt})...")
+            write_sales(path, n_rows, seed=seed)
+
+            print(f"⏳ 执行分析流程 ({label})...")
+            profiler = run_pipeline(path, tmp, label=label)
+            results[label] = profiler.to_dict()
+            os.remove(path)
+
+    walls = {label: pd.DataFrame(profile['stages']).set_index('stage')['wall_seconds']
+             for label, profile in results.items()}
+    print("\n📊 各阶段耗时 (s):")
+    print(pd.DataFrame(walls).round(3).to_string())
+
+    baseline = {}
+    if os.path.exists(baseline_path):
+        with open(baseline_path, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    regressions = find_regressions(results, baseline, tolerance)
+    if baseline:
+        if regressions:
+            print(f"\n⚠️ 性能回退（超过基准 {tolerance:.0%}）:")
+            for label, stage, before, after, ratio in regressions:
+                print(f"   {label} {stage}: {before:.3f}s -> {after:.3f}s ({ratio:.2f}x)")
+        else:
+            print("\n✅ 与基准相比没有性能回退")
+    else:
+        print(f"\nℹ️ 没有基准结果: {baseline_path}")
+
+    if save_baseline:
+        baseline.update(results)
+        with open(baseline_path, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, ensure_ascii=False, indent=2)
+        print(f"💾 基准结果已保存: {baseline_path}")
+    return results, regressions
+
+
+def run_suite_cli(argv):
+    parser = argparse.ArgumentParser(prog='benchmark.py suite', description="完整分析流程基准测试")
+    parser.add_argument('sizes', nargs='*', default=list(SUITE_SIZES))
+    parser.add_argument('--format', dest='fmt', choices=['csv', 'parquet', 'feather'], default='csv')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    _, regressions = bench_suite(args.sizes, args.fmt, args.baseline, args.save_baseline, args.tolerance)
+    sys.exit(1 if regressions else 0)
+
+
+def run_encoding_cli(argv):
+    parser = argparse.ArgumentParser(prog='benchmark.py encoding', description="CSV 编码探测基准测试")
+    parser.add_argument('size_mb', nargs='?', type=float, default=200, help="测试文件大小（MB）")
+    args = parser.parse_args(argv)
+    bench_encoding(args.size_mb)
+
+
+BENCHMARKS = {
+    'profit_comparison': bench_profit_comparison,
+    'sku_panel': lambda *args: bench_profit_comparison(*args, func=_panel_all_comparisons),
+    'encoding': bench_encoding,
+}
+
+
+if __name__ == "__main__":
+    name = sys.argv[1] if len(sys.argv) > 1 else 'profit_comparison'
+    if name == 'suite':
+        run_suite_cli(sys.argv[2:])
+    if name == 'encoding':
+        run_encoding_cli(sys.argv[2:])
+        sys.exit(0)
+    sizes = [int(x) for x in sys.argv[2:]]
+    if name not in BENCHMARKS:
+        print(f"❌ 未知的基准测试: {name}，可选: {list(BENCHMARKS)}")
+        sys.exit(1)
+    BENCHMARKS[name](*([sizes] if sizes else []))
@@ -0,0 +1,120 @@
+"""
+图表数据准备
+
+仪表板把数据交给 Plotly / st.dataframe 之前先在服务端压缩：
+- 直方图预先分箱，只传每个箱的汇总值
+- 折线序列超过点数上限时用 LTTB（Largest-Triangle-Three-Buckets）降采样，保留形状特征
+- 表格按页截取，只传当前页
+并估算每个图表 / 表格发送到浏览器的数据量。
+"""
+import numpy as np
+import pandas as pd
+
+MAX_LINE_POINTS = 1000
+MAX_HISTOGRAM_BINS = 50
+TABLE_PAGE_SIZE = 500
+MAX_BAR_CATEGORIES = 30
+
+
+def lttb_indices(x, y, threshold=MAX_LINE_POINTS):
+    """
+    LTTB 降采样，返回保留点的位置（含首尾点）
+
+    x 需要单调递增且可转换为数值（日期按时间戳计算）
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(pd.to_numeric(pd.Series(x)) if not np.issubdtype(np.asarray(x).dtype, np.number)
+                   else x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # 中间 n-2 个点分为 threshold-2 个桶，每个桶保留与前一个选中点、下一个桶均值组成的三角形面积最大的点
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.intp)
+    selected = np.empty(threshold, dtype=np.intp)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = end, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x, avg_y = x[next_start:next_end].mean(), y[next_start:next_end].mean()
+        area = np.abs((x[previous] - avg_x) * (y[start:end] - y[previous])
+                      - (x[previous] - x[start:end]) * (avg_y - y[previous]))
+        previous = start + int(np.nanargmax(area)) if np.isfinite(area).any() else start
+        selected[i + 1] = previous
+    return selected
+
+
+def downsample_line(frame, columns, max_points=MAX_LINE_POINTS):
+    """
+    按列降采样折线数据（x 为 frame 的索引）
+
+    返回 {列名: Series}，每一列独立选点
+    """
+    x = frame.index
+    if not isinstance(x, (pd.DatetimeIndex, pd.RangeIndex)) and not pd.api.types.is_numeric_dtype(x):
+        # 月份等文本索引按位置降采样
+        x = np.arange(len(frame))
+    series = {}
+    for col in columns:
+        values = frame[col]
+        series[col] = values.iloc[lttb_indices(x, values.fillna(0).to_numpy(), max_points)]
+    return series
+
+
+def histogram_bins(values, weights=None, max_bins=MAX_HISTOGRAM_BINS):
+    """
+    预先分箱的直方图数据：取值为整数且种类不多时每个取值一箱，否则等宽分箱
+
+    weights: 每个值的权重（例如在库金额），为 None 时统计个数
+    返回 DataFrame: 区间, 起点, 终点, 值
+    """
+    values = pd.Series(values).reset_index(drop=True)
+    weights = None if weights is None else pd.Series(weights).reset_index(drop=True)
+    valid = values.notna().to_numpy()
+    numbers = values[valid].to_numpy(dtype=np.float64)
+    w = None if weights is None else weights[valid].fillna(0).to_numpy(dtype=np.float64)
+    if not len(numbers):
+        return pd.DataFrame(columns=['区间', '起点', '终点', '值'])
+
+    low, high = numbers.min(), numbers.max()
+    if np.all(numbers == np.round(numbers)) and high - low < max_bins:
+        edges = np.arange(low, high + 2) - 0.5
+        labels = [str(int(v)) for v in np.arange(low, high + 1)]
+    else:
+        edges = np.histogram_bin_edges(numbers, bins=max_bins)
+        labels = [f"{a:,.4g}~{b:,.4g}" for a, b in zip(edges[:-1], edges[1:])]
+    totals, _ = np.histogram(numbers, bins=edges, weights=w)
+    return pd.DataFrame({'区间': labels, '起点': edges[:-1], '终点': edges[1:], '值': totals})
+
+
+def top_categories(counts, max_categories=MAX_BAR_CATEGORIES, other_label='其他'):
+    """条形图只保留数值最大的若干类，其余合并为"其他"（counts 为 Series）"""
+    counts = counts.sort_values(ascending=False)
+    if len(counts) <= max_categories:
+        return counts
+    head = counts.iloc[:max_categories - 1]
+    return pd.concat([head, pd.Series({other_label: counts.iloc[max_categories - 1:].sum()})])
+
+
+def page_count(n_rows, page_size=TABLE_PAGE_SIZE):
+    return max(1, -(-n_rows // page_size))
+
+
+def table_page(frame, page=1, page_size=TABLE_PAGE_SIZE):
+    """取表格的第 page 页（从 1 开始）"""
+    page = min(max(int(page), 1), page_count(len(frame), page_size))
+    return frame.iloc[(page - 1) * page_size:page * page_size]
+
+
+def payload_kb(obj):
+    """估算发送到浏览器的数据量（KB）：Plotly 图表按 JSON 长度，表格按 Arrow 序列化大小"""
+    if hasattr(obj, 'to_plotly_json'):
+        return round(len(obj.to_json().encode('utf-8')) / 1024, 1)
+    if isinstance(obj, pd.DataFrame):
+        try:
+            import pyarrow as pa
+            return round(pa.Table.from_pandas(obj, preserve_index=True).nbytes / 1024, 1)
+        except Exception:
+            return round(float(obj.memory_usage(deep=True).sum()) / 1024, 1)
+    return 0.0
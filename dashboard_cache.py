@@ -0,0 +1,151 @@
+"""
+仪表板缓存
+
+按上传文件的内容哈希 + 筛选条件缓存预处理结果和分析结果，
+LRU 淘汰并限制总内存，切回之前的筛选条件时无需重新计算。
+分析结果按模块惰性计算、逐项缓存，只有被选中的视图用到的模块才会执行。
+"""
+import hashlib
+from collections import OrderedDict
+from collections.abc import Mapping
+
+import pandas as pd
+
+DEFAULT_BUDGET_MB = 1024
+DEFAULT_MAX_ENTRIES = 64
+
+
+def content_hash(uploaded_file):
+    """上传文件内容的 SHA-1（不移动文件指针）"""
+    if hasattr(uploaded_file, 'getbuffer'):
+        return hashlib.sha1(uploaded_file.getbuffer()).hexdigest()
+
+    position = uploaded_file.tell()
+    uploaded_file.seek(0)
+    digest = hashlib.sha1()
+    for block in iter(lambda: uploaded_file.read(1024 * 1024), b''):
+        digest.update(block)
+    uploaded_file.seek(position)
+    return digest.hexdigest()
+
+
+def estimate_size_mb(value):
+    """估算缓存值占用的内存（MB），递归统计 dict/list 中的 DataFrame/Series"""
+    if hasattr(value, 'memory_mb'):
+        return value.memory_mb()
+    if isinstance(value, pd.DataFrame):
+        return float(value.memory_usage(deep=True).sum()) / 1024 / 1024
+    if isinstance(value, pd.Series):
+        return float(value.memory_usage(deep=True)) / 1024 / 1024
+    if isinstance(value, dict):
+        return sum(estimate_size_mb(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(estimate_size_mb(v) for v in value)
+    return 0.0
+
+
+class LRUCache:
+    """带内存预算的 LRU 缓存"""
+
+    def __init__(self, budget_mb=DEFAULT_BUDGET_MB, max_entries=DEFAULT_MAX_ENTRIES):
+        self.budget_mb = budget_mb
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (value, size_mb)
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def size_mb(self):
+        return sum(size for _, size in self._entries.values())
+
+    def get(self, key, default=None):
+        if key not in self._entries:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return self._entries[key][0]
+
+    def put(self, key, value, size_mb=None):
+        """写入缓存；单个值超过预算时不缓存"""
+        size_mb = estimate_size_mb(value) if size_mb is None else size_mb
+        if size_mb > self.budget_mb:
+            return value
+
+        self._entries.pop(key, None)
+        self._entries[key] = (value, size_mb)
+        self._evict()
+        return value
+
+    def get_or_compute(self, key, compute):
+        """命中则返回缓存值，否则调用 compute() 计算并缓存"""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = self.put(key, compute())
+        return value
+
+    def _evict(self):
+        # 保留最近写入的一项，从最久未使用的开始淘汰
+        while len(self._entries) > 1 and (len(self._entries) > self.max_entries or self.size_mb > self.budget_mb):
+            self._entries.popitem(last=False)
+
+    def stats(self):
+        return {'entries': len(self._entries), 'size_mb': round(self.size_mb, 1),
+                'budget_mb': self.budget_mb, 'hits': self.hits, 'misses': self.misses}
+
+
+_MISSING = object()
+
+
+class LazyResults(Mapping):
+    """
+    按需计算的分析结果
+
+    第一次访问某一项时调用 compute(key) 并以 prefix + (key,) + key_suffix(key) 写入缓存，
+    compute 返回 None 表示该项不适用（视为不存在）；
+    key_suffix 返回该项自己依赖的设置，其他项不会因为这些设置变化而重新计算
+    """
+
+    def __init__(self, keys, compute, cache=None, prefix=(), key_suffix=None):
+        self.keys_available = list(keys)
+        self.compute = compute
+        self.cache = cache
+        self.prefix = tuple(prefix)
+        self.key_suffix = key_suffix
+        self._values = {}
+
+    def cache_key(self, key):
+        return self.prefix + (key,) + (tuple(self.key_suffix(key)) if self.key_suffix else ())
+
+    def _load(self, key):
+        if key not in self._values:
+            if self.cache is None:
+                self._values[key] = self.compute(key)
+            else:
+                self._values[key] = self.cache.get_or_compute(self.cache_key(key), lambda: self.compute(key))
+        return self._values[key]
+
+    def __getitem__(self, key):
+        if key not in self.keys_available or self._load(key) is None:
+            raise KeyError(key)
+        return self._values[key]
+
+    def __contains__(self, key):
+        return key in self.keys_available and self._load(key) is not None
+
+    def __iter__(self):
+        return (key for key in self.keys_available if key in self)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    @property
+    def loaded(self):
+        """本次已经取用过的项"""
+        return list(self._values)
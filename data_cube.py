@@ -0,0 +1,223 @@
+"""
+销售数据立方体
+
+上传时一次性把明细按 (日期/月份, 小分类, SKU编码) 粒度预聚合，
+仪表板的日期、小分类筛选只作用在立方体单元上（筛选条件都是单元的维度，
+不会切开单元），KPI、分类表、月度趋势、热销产品和滞销分析都由单元汇总得到，
+筛选耗时取决于单元数而不是明细行数。
+"""
+import numpy as np
+import pandas as pd
+
+from distinct_sketch import DEFAULT_ERROR, approx_nunique, error_table, precision_for_error
+from unsold_index import LastSaleIndex
+
+SUM_MEASURES = ['销售金额', '利润', '销售个数']
+# 每个单元保留首条记录的属性（筛选只会整块保留或去掉单元，首条记录与明细一致）
+FIRST_ATTRIBUTES = ['商品名称', '在库数量', '在库金额']
+# 构建立方体读取的原始字段（仪表板加载上传文件时只读取这些列）
+CUBE_COLUMNS = ['日期', '小分类', 'SKU编码'] + SUM_MEASURES + FIRST_ATTRIBUTES
+# 分析结果项 -> 所需字段（缺少任一字段时该项不适用）
+ANALYSIS_REQUIREMENTS = {
+    'basic_stats': [],
+    'category_analysis': ['小分类'],
+    'monthly_analysis': ['年月'],
+    'product_analysis': ['SKU编码'],
+    'unsold_analysis': [],
+    'distinct_count_error': ['SKU编码'],
+}
+# 分析结果项 -> 接受的选项（仪表板侧边栏的设置，作为 analysis() 的关键字参数传入）
+ANALYSIS_OPTIONS = {
+    'category_analysis': ['approx_distinct', 'approx_error'],
+    'monthly_analysis': ['approx_distinct', 'approx_error'],
+    'distinct_count_error': ['approx_distinct', 'approx_error'],
+    'unsold_analysis': ['as_of'],
+}
+
+
+class SalesCube:
+    """(时间, 小分类, SKU) 粒度的预聚合立方体"""
+
+    def __init__(self, cells, grain='day'):
+        self.cells = cells
+        self.grain = grain
+        self._last_sale_index = None  # 第一次滞销查询时构建，之后切换截止月份直接复用
+
+    @classmethod
+    def from_frame(cls, df, grain='day'):
+        """
+        从预处理后的明细构建立方体
+
+        grain: 'day' 按天聚合（日期筛选精确到天），'month' 按月聚合（单元更少）
+        """
+        df = df.copy(deep=False)
+        keys = []
+        if '日期' in df.columns:
+            df['日期'] = df['日期'].dt.normalize() if grain == 'day' else \
+                df['日期'].dt.to_period('M').dt.to_timestamp()
+            keys.append('日期')
+        keys += [col for col in ['年月', '小分类', 'SKU编码'] if col in df.columns]
+
+        agg_spec = {}
+        for col in SUM_MEASURES:
+            if col in df.columns:
+                agg_spec[col] = (col, 'sum')
+        for col in ['销售金额', '利润']:
+            if col in df.columns:
+                agg_spec[f'{col}_计数'] = (col, 'count')
+        if '销售金额' in df.columns:
+            agg_spec['销售金额_最大'] = ('销售金额', 'max')
+        for col in FIRST_ATTRIBUTES:
+            if col in df.columns:
+                agg_spec[col] = (col, 'first')
+
+        cells = df.groupby(keys, dropna=False, observed=True, sort=False).agg(**agg_spec).reset_index()
+        return cls(cells, grain)
+
+    def __len__(self):
+        return len(self.cells)
+
+    def memory_mb(self):
+        return float(self.cells.memory_usage(deep=True).sum()) / 1024 / 1024
+
+    def date_bounds(self):
+        if '日期' not in self.cells.columns:
+            return pd.NaT, pd.NaT
+        return self.cells['日期'].min(), self.cells['日期'].max()
+
+    def months(self):
+        """单元中出现的月份（排序后）"""
+        if '年月' not in self.cells.columns:
+            return []
+        return sorted(self.cells['年月'].dropna().unique().tolist())
+
+    def last_sale_index(self):
+        """SKU 最后销售月份索引（每个立方体只构建一次）"""
+        if self._last_sale_index is None:
+            self._last_sale_index = LastSaleIndex.from_frame(self.cells)
+        return self._last_sale_index
+
+    def categories(self):
+        if '小分类' not in self.cells.columns:
+            return []
+        return sorted(self.cells['小分类'].dropna().unique().tolist())
+
+    def slice(self, date_filter=None, category='全部'):
+        """按日期范围 (开始, 结束) 和小分类筛选单元，返回新的立方体"""
+        mask = np.ones(len(self.cells), dtype=bool)
+        if date_filter is not None and '日期' in self.cells.columns:
+            dates = self.cells['日期']
+            mask &= ((dates >= date_filter[0]) & (dates <= date_filter[1])).to_numpy()
+        if category != '全部' and '小分类' in self.cells.columns:
+            mask &= (self.cells['小分类'] == category).to_numpy()
+        return SalesCube(self.cells[mask], self.grain)
+
+    def analysis(self, key, **options):
+        """
+        单独计算一项分析结果（键同 run_all_analysis），不适用时返回 None
+
+        options: 分析选项，只把 ANALYSIS_OPTIONS 中该项接受的选项传给对应方法
+        """
+        if any(col not in self.cells.columns for col in ANALYSIS_REQUIREMENTS[key]):
+            return None
+        accepted = {name: options[name] for name in ANALYSIS_OPTIONS.get(key, []) if name in options}
+        return getattr(self, key)(**accepted)
+
+    def run_all_analysis(self, **options):
+        """汇总立方体，返回仪表板各视图使用的分析结果"""
+        results = {key: self.analysis(key, **options) for key in ANALYSIS_REQUIREMENTS}
+        return {key: value for key, value in results.items() if value is not None}
+
+    def basic_stats(self):
+        cells = self.cells
+        basic_stats = {}
+
+        if '销售金额' in cells.columns:
+            basic_stats['总销售额'] = cells['销售金额'].sum()
+            basic_stats['平均销售额'] = basic_stats['总销售额'] / cells['销售金额_计数'].sum()
+            basic_stats['最大销售额'] = cells['销售金额_最大'].max()
+
+        if '利润' in cells.columns:
+            basic_stats['总利润'] = cells['利润'].sum()
+            basic_stats['平均利润'] = basic_stats['总利润'] / cells['利润_计数'].sum()
+            if basic_stats.get('总销售额', 0) > 0:
+                basic_stats['平均利润率'] = (basic_stats['总利润'] / basic_stats['总销售额'] * 100)
+
+        if 'SKU编码' in cells.columns:
+            basic_stats['SKU总数'] = cells['SKU编码'].nunique()
+
+        return basic_stats
+
+    def _rollup(self, key, measures, approx_distinct=False, approx_error=DEFAULT_ERROR):
+        """按维度汇总 measures，SKU编码 列为去重SKU数（approx_distinct 时为 HyperLogLog 近似值）"""
+        grouped = self.cells.groupby(key, observed=True)
+        table = grouped[measures].sum()
+        if approx_distinct:
+            table['SKU编码'] = approx_nunique(self.cells, key, error=approx_error).reindex(table.index).to_numpy()
+        else:
+            table['SKU编码'] = grouped['SKU编码'].nunique()
+        return table.round(2)
+
+    def category_analysis(self, approx_distinct=False, approx_error=DEFAULT_ERROR):
+        category_analysis = self._rollup('小分类', ['销售金额', '利润'], approx_distinct, approx_error)
+        category_analysis['利润率'] = (category_analysis['利润'] / category_analysis['销售金额'] * 100).round(2)
+        return category_analysis.sort_values('销售金额', ascending=False)
+
+    def monthly_analysis(self, approx_distinct=False, approx_error=DEFAULT_ERROR):
+        monthly_analysis = self._rollup('年月', ['销售金额', '利润'], approx_distinct, approx_error).sort_index()
+        for col in ['销售金额', '利润']:
+            monthly_analysis[f'{col}_环比%'] = (monthly_analysis[col].pct_change() * 100).round(2)
+        return monthly_analysis
+
+    def distinct_count_error(self, approx_distinct=False, approx_error=DEFAULT_ERROR):
+        """
+        近似去重SKU数的误差表（小分类 / 年月 两个维度），未使用近似时返回 None
+
+        立方体单元已经预聚合，精确去重数的代价很低，直接给出每个分组的实际误差
+        """
+        if not approx_distinct:
+            return None
+        precision = precision_for_error(approx_error)
+        tables = []
+        for by in ['小分类', '年月']:
+            if by in self.cells.columns:
+                estimate = approx_nunique(self.cells, by, error=approx_error)
+                exact = self.cells.groupby(by, observed=True)['SKU编码'].nunique()
+                tables.append(error_table(by, estimate, precision, exact))
+        return pd.concat(tables, ignore_index=True) if tables else None
+
+    def product_analysis(self, top_n=20):
+        measures = [col for col in SUM_MEASURES if col in self.cells.columns]
+        product_sales = self.cells.groupby('SKU编码', observed=True)[measures].sum().round(2)
+        product_sales = product_sales.nlargest(top_n, '销售金额')
+        if '利润' in product_sales.columns:
+            product_sales['利润率'] = (product_sales['利润'] / product_sales['销售金额'] * 100).round(2)
+        return product_sales
+
+    def unsold_analysis(self, recent_count=3, as_of=None):
+        """
+        截至 as_of 月份（默认最新月份）最近 recent_count 个月无销售的SKU
+        （月份轴取筛选后数据中出现的月份）
+        """
+        cells = self.cells
+        if '年月' not in cells.columns or 'SKU编码' not in cells.columns:
+            return None
+
+        index = self.last_sale_index()
+        if len(index.months) < 2:
+            return None
+
+        unsold_details, query = index.unsold_details(cells, as_of, recent_count)
+        if not len(unsold_details):
+            return None
+
+        sort_columns = ['滞销月数'] + (['在库金额'] if '在库金额' in unsold_details.columns else [])
+        unsold_details = unsold_details.sort_values(sort_columns, ascending=False).reset_index(drop=True)
+
+        return {
+            'unsold_products': unsold_details,
+            'as_of': index.months[index.ordinal(as_of)],
+            'total_skus': query['total_skus'],
+            'sold_skus': query['sold_skus'],
+            'unsold_skus': len(query['codes'])
+        }
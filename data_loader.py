@@ -0,0 +1,313 @@
+"""
+销售数据加载工具
+
+- 已知字段的类型定义（日期 / 数值 / 文本）
+- CSV 编码探测：只读取有限字节样本判断编码，文件只解析一次
+- Parquet / Feather 列式读取（按列投影，读入即为目标类型）
+- 分块读取，供流式聚合模式使用
+- 紧凑类型：维度列转 category、月份整数编码、度量列降精度
+- xlsx 流式读取（只解码所需列，可分块，见 xlsx_reader）
+- 一次性把 CSV / Excel 导出文件转换为 Parquet，后续月度分析直接读取
+
+用法:
+    python data_loader.py convert <CSV或xlsx文件> [输出.parquet|输出.feather] [--sheet 工作表名称或序号]
+"""
+import codecs
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+# 已知字段类型
+DATE_COLUMNS = ['日期', 'sku首次销售时间_分区域', 'sku首次入库时间_分区域']
+NUMERIC_COLUMNS = ['销售金额', '利润', '利润率', '销售个数', '在库数量', '在库金额',
+                   '平台费用', '头程费用', '后程费用', '广告费', '商品成本', '销售计划', '订单数']
+TEXT_COLUMNS = ['SKU编码', '商品名称', '小分类']
+# 整数计数类字段（无缺失且均为整数时可降为 int32）
+COUNT_COLUMNS = ['销售个数', '在库数量', '订单数']
+
+COLUMNAR_EXTENSIONS = ('.parquet', '.feather')
+
+# 编码探测的字节样本上限（文件头、中、尾各取一段）
+SNIFF_SAMPLE_BYTES = 1024 * 1024
+
+
+def apply_schema(df):
+    """
+    按已知字段类型转换（原地修改并返回 df）
+
+    日期 -> datetime64，数值 -> float64，编码/名称/分类 -> string，
+    其余 object 列统一为 string，保证写入 Parquet 时类型确定
+    """
+    for col in df.columns:
+        if col in DATE_COLUMNS:
+            if not pd.api.types.is_datetime64_any_dtype(df[col]):
+                df[col] = pd.to_datetime(df[col], errors='coerce')
+        elif col in NUMERIC_COLUMNS:
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype('float64')
+        elif col in TEXT_COLUMNS or df[col].dtype == object:
+            df[col] = df[col].astype('string')
+    return df
+
+
+def frame_memory_mb(df):
+    """DataFrame 实际占用内存（MB，含字符串对象）"""
+    return float(df.memory_usage(deep=True).sum()) / 1024 / 1024
+
+
+def compact_dtypes(df, float32=False):
+    """
+    转换为紧凑类型（原地修改并返回 (df, 内存报告)）
+
+    - SKU编码 / 商品名称 / 小分类 -> category
+    - 年月 -> 有序 category，并新增 int32 月份编码列 月序（年*12 + 月 - 1）
+    - 计数字段在无缺失且为整数时 -> int32
+    - float32=True 时，金额字段在保留到分的精度内无损时 -> float32
+      （求和会以 float32 累加，大额汇总请保持默认的 float64）
+    """
+    before = frame_memory_mb(df)
+
+    for col in TEXT_COLUMNS:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype('category')
+
+    if '年月' in df.columns:
+        months = df['年月'].astype('category')
+        categories = sorted(months.cat.categories)
+        df['年月'] = months.cat.set_categories(categories, ordered=True)
+        ordinals = pd.PeriodIndex(categories, freq='M').asi8.astype(np.int32) + np.int32(1970 * 12)
+        codes = df['年月'].cat.codes.to_numpy()
+        df['月序'] = np.where(codes >= 0, ordinals[codes] if len(ordinals) else 0, -1).astype(np.int32)
+
+    int32_max = np.iinfo(np.int32).max
+    for col in NUMERIC_COLUMNS:
+        if col not in df.columns or not pd.api.types.is_numeric_dtype(df[col]):
+            continue
+        values = df[col].to_numpy()
+        if col in COUNT_COLUMNS:
+            integral = pd.api.types.is_integer_dtype(values) or (
+                not np.isnan(values).any() and np.array_equal(values, np.round(values)))
+            if integral and np.abs(values).max(initial=0) < int32_max:
+                df[col] = values.astype(np.int32)
+        elif float32 and values.dtype == np.float64:
+            narrowed = values.astype(np.float32)
+            if np.allclose(narrowed, values, rtol=0, atol=0.005, equal_nan=True):
+                df[col] = narrowed
+
+    after = frame_memory_mb(df)
+    report = {'before_mb': round(before, 2), 'after_mb': round(after, 2),
+              'saved_pct': round((1 - after / before) * 100, 1) if before else 0.0}
+    return df, report
+
+
+def _read_samples(source, sample_bytes):
+    """从文件路径或可 seek 的文件对象中读取头/中/尾三段字节样本"""
+    handle = open(source, 'rb') if isinstance(source, (str, os.PathLike)) else source
+    start = handle.tell()
+    try:
+        handle.seek(0, os.SEEK_END)
+        size = handle.tell()
+        block = max(1, sample_bytes // 3)
+
+        offsets = [0] if size <= sample_bytes else [0, (size - block) // 2, size - block]
+        samples = []
+        for offset in offsets:
+            handle.seek(offset)
+            samples.append(handle.read(block if len(offsets) > 1 else sample_bytes))
+        return samples
+    finally:
+        if handle is source:
+            handle.seek(start)
+        else:
+            handle.close()
+
+
+def _decodes(samples, encoding):
+    """各段样本能否按 encoding 解码（允许样本首尾截断半个字符）"""
+    for i, sample in enumerate(samples):
+        if i > 0 and encoding == 'utf-8':
+            # 中间/末尾样本可能从多字节字符中间开始，跳过续字节
+            sample = sample.lstrip(bytes(range(0x80, 0xC0)))
+        elif i > 0:
+            # GBK 双字节字符可能被截断，从第一个换行之后开始检查
+            sample = sample[sample.find(b'\n') + 1:]
+        try:
+            codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+        except UnicodeDecodeError:
+            return False
+    return True
+
+
+def sniff_encoding(source, sample_bytes=SNIFF_SAMPLE_BYTES):
+    """
+    根据有限的字节样本判断 CSV 编码
+
+    返回 (编码, 采样字节数)；无法判断时编码为 None
+    """
+    samples = _read_samples(source, sample_bytes)
+    sampled = sum(len(sample) for sample in samples)
+    head = samples[0]
+
+    if head.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig', sampled
+    if head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return 'utf-16', sampled
+
+    # GB18030 兼容 GBK/GB2312，作为中文导出文件的兜底
+    for encoding in ('utf-8', 'gbk', 'gb18030'):
+        if _decodes(samples, encoding):
+            return encoding, sampled
+    return None, sampled
+
+
+def read_csv_once(source, sample_bytes=SNIFF_SAMPLE_BYTES, **kwargs):
+    """
+    探测编码后只解析一次 CSV
+
+    返回 (DataFrame, 加载信息)，加载信息包含 encoding / sampled_bytes / retried；
+    仅当样本之外出现无法解码的字节时才会用 gb18030 重新解析一次。
+    编码无法识别时抛出 UnicodeError（与解码失败的 UnicodeDecodeError 同属一类）
+    """
+    encoding, sampled = sniff_encoding(source, sample_bytes)
+    if encoding is None:
+        raise UnicodeError("无法识别CSV文件编码")
+
+    info = {'encoding': encoding, 'sampled_bytes': sampled, 'retried': False}
+    try:
+        df = pd.read_csv(source, encoding=encoding, **kwargs)
+    except UnicodeDecodeError:
+        if encoding == 'gb18030':
+            raise
+        if hasattr(source, 'seek'):
+            source.seek(0)
+        info.update(encoding='gb18030', retried=True)
+        df = pd.read_csv(source, encoding='gb18030', **kwargs)
+    return df, info
+
+
+def column_filter(columns):
+    """read_csv 的 usecols：只保留 columns 中的字段（文件中没有的字段自动忽略），None 表示全部字段"""
+    if columns is None:
+        return None
+    wanted = set(columns)
+    return lambda col: col in wanted
+
+
+def progress_printer(label='已读取'):
+    """命令行进度回调：每次回调打印一行 "已读取 N / M 行"（总行数未知时只打印 N）"""
+    def report(done, total=None):
+        print(f"   {label} {done:,}" + (f" / {total:,}" if total else "") + " 行")
+    return report
+
+
+def read_xlsx(source, columns=None, sheet_name=0, progress=None, engine='auto', text_columns=None):
+    """
+    读取 xlsx 工作表（流式解析，见 xlsx_reader）
+
+    columns: 只保留表头在 columns 中的列，None 表示全部字段；sheet_name: 工作表名称或序号；
+    progress: 进度回调 progress(已读取行数, 预计总行数)
+    """
+    from xlsx_reader import read_xlsx_stream
+    return read_xlsx_stream(source, columns=columns, sheet_name=sheet_name, progress=progress,
+                            engine=engine, text_columns=text_columns)
+
+
+def read_columnar(path, columns=None):
+    """
+    读取 Parquet / Feather 文件
+
+    columns: 只读取指定列（不存在的列自动忽略），为 None 时读取全部列
+    """
+    if path.endswith('.parquet'):
+        if columns is not None:
+            import pyarrow.parquet as pq
+            available = pq.read_schema(path).names
+            columns = [col for col in columns if col in available]
+        return pd.read_parquet(path, columns=columns)
+
+    if columns is not None:
+        import pyarrow as pa
+        with pa.memory_map(path) as source:
+            available = pa.ipc.open_file(source).schema.names
+        columns = [col for col in columns if col in available]
+    return pd.read_feather(path, columns=columns)
+
+
+def iter_chunks(path, chunksize=500_000, columns=None, sheet_name=0):
+    """
+    分块读取 CSV / Parquet / Feather / xlsx 文件，每次产出一个 DataFrame
+
+    CSV 先按字节样本探测编码；Parquet 按 row group 内的批次读取；
+    xlsx 流式解析工作表 sheet_name（编码 / 名称 / 分类按文本读取，各块类型一致）
+    """
+    if path.endswith('.xlsx'):
+        from xlsx_reader import iter_xlsx_chunks
+        yield from iter_xlsx_chunks(path, chunksize, columns=columns, sheet_name=sheet_name,
+                                    text_columns=TEXT_COLUMNS)
+    elif path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        parquet_file = pq.ParquetFile(path)
+        if columns is not None:
+            columns = [col for col in columns if col in parquet_file.schema_arrow.names]
+        for batch in parquet_file.iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+    elif path.endswith('.feather'):
+        import pyarrow as pa
+        with pa.memory_map(path) as source:
+            reader = pa.ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                chunk = reader.get_batch(i).to_pandas()
+                yield chunk if columns is None else chunk[[col for col in columns if col in chunk.columns]]
+    else:
+        encoding, _ = sniff_encoding(path)
+        if encoding is None:
+            raise ValueError("无法识别CSV文件编码")
+        yield from pd.read_csv(path, encoding=encoding, chunksize=chunksize, usecols=column_filter(columns),
+                               low_memory=False)
+
+
+def read_export(path, sheet_name=0, progress=None):
+    """读取 CSV / Excel 原始导出文件（SKU编码 按文本读取，避免丢失前导零；progress 只用于 xlsx）"""
+    if path.endswith('.xlsx'):
+        return read_xlsx(path, sheet_name=sheet_name, progress=progress, text_columns=['SKU编码'])
+
+    df, _ = read_csv_once(path, dtype={'SKU编码': str}, low_memory=False)
+    return df
+
+
+def convert_to_columnar(src, dst=None, sheet_name=0):
+    """
+    把 CSV / Excel 导出文件（xlsx 读取工作表 sheet_name）转换为带类型的 Parquet（或 Feather）文件
+
+    返回输出文件路径
+    """
+    if dst is None:
+        dst = os.path.splitext(src)[0] + '.parquet'
+
+    print(f"⏳ 正在读取 {os.path.basename(src)} ...")
+    df = apply_schema(read_export(src, sheet_name, progress=progress_printer()))
+
+    if dst.endswith('.feather'):
+        df.to_feather(dst)
+    else:
+        df.to_parquet(dst, index=False)
+
+    src_size = os.path.getsize(src) / 1024 / 1024
+    dst_size = os.path.getsize(dst) / 1024 / 1024
+    print(f"✅ 已转换: {dst} ({len(df)} 行, {src_size:.1f} MB -> {dst_size:.1f} MB)")
+    return dst
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    sheet = 0
+    if '--sheet' in args and args.index('--sheet') + 1 < len(args):
+        i = args.index('--sheet')
+        sheet = args[i + 1]
+        sheet = int(sheet) if sheet.isdigit() else sheet
+        del args[i:i + 2]
+    if len(args) < 2 or args[0] != 'convert':
+        print(__doc__)
+        sys.exit(1)
+    convert_to_columnar(args[1], args[2] if len(args) > 2 else None, sheet)
@@ -0,0 +1,180 @@
+"""
+预处理结果的磁盘缓存
+
+按 原始文件内容哈希 + 预处理方式 保存预处理后的 DataFrame，格式为不压缩的 Arrow IPC（Feather），
+之后的会话和批量分析直接内存映射打开，数值列不再解析也不复制。
+缓存目录超过容量上限时按最近使用时间淘汰。
+
+默认不开启：分析器配置 disk_cache=True、batch.py --disk-cache 或仪表板侧边栏勾选“磁盘缓存”后才会写入。
+缓存目录默认 ~/.sales_cache，可用环境变量 SALES_CACHE_DIR 指定。
+
+用法:
+    python disk_cache.py list [--dir 目录]
+    python disk_cache.py purge [--dir 目录] [--all | --older-than 天数 | --max-mb 容量]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+import pandas as pd
+
+from dashboard_cache import content_hash
+
+CACHE_VERSION = 1  # 预处理逻辑变化时递增，旧缓存自动失效
+DEFAULT_CACHE_DIR = os.environ.get('SALES_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.sales_cache'))
+DEFAULT_MAX_MB = 2048
+DATA_SUFFIX = '.feather'
+META_SUFFIX = '.json'
+
+
+def file_hash(path):
+    """文件内容的 SHA-1"""
+    with open(path, 'rb') as f:
+        return content_hash(f)
+
+
+class FrameCache:
+    """预处理结果的磁盘缓存（Arrow IPC + JSON 元数据）"""
+
+    def __init__(self, cache_dir=None, max_mb=DEFAULT_MAX_MB):
+        self.cache_dir = cache_dir or DEFAULT_CACHE_DIR
+        self.max_mb = max_mb
+
+    def key(self, digest, variant):
+        """缓存键：内容哈希 + 预处理方式（例如 dashboard / analyzer、是否紧凑类型）"""
+        return f"{digest}_{variant}_v{CACHE_VERSION}"
+
+    def _path(self, key, suffix):
+        return os.path.join(self.cache_dir, key + suffix)
+
+    def get(self, key):
+        """读取缓存，未命中返回 (None, None)，命中返回 (DataFrame, 元数据)"""
+        path = self._path(key, DATA_SUFFIX)
+        if not os.path.exists(path):
+            return None, None
+        try:
+            import pyarrow as pa
+            with pa.memory_map(path) as source:
+                table = pa.ipc.open_file(source).read_all()
+            # split_blocks: 不合并为二维块，无缺失值的数值列直接引用映射的内存
+            df = table.to_pandas(split_blocks=True)
+            with open(self._path(key, META_SUFFIX), encoding='utf-8') as f:
+                meta = json.load(f)
+        except Exception as e:
+            print(f"⚠️ 缓存读取失败，忽略该缓存: {e}")
+            self.remove(key)
+            return None, None
+        # 修改时间作为最近使用时间（淘汰依据）
+        os.utime(path)
+        return df, meta
+
+    def put(self, key, df, **meta):
+        """写入缓存（先写临时文件再替换），返回缓存文件大小（MB）"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key, DATA_SUFFIX)
+        df.reset_index(drop=True).to_feather(path + '.tmp', compression='uncompressed')
+        os.replace(path + '.tmp', path)
+
+        size_mb = round(os.path.getsize(path) / 1024 / 1024, 2)
+        meta.update(rows=len(df), size_mb=size_mb, created=datetime.now().isoformat(timespec='seconds'))
+        meta_path = self._path(key, META_SUFFIX)
+        with open(meta_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2, default=str)
+        os.replace(meta_path + '.tmp', meta_path)
+
+        self.evict()
+        return size_mb
+
+    def remove(self, key):
+        """删除一项缓存（Windows 上正在被映射的文件无法删除，跳过）"""
+        for suffix in (DATA_SUFFIX, META_SUFFIX):
+            try:
+                os.remove(self._path(key, suffix))
+            except OSError:
+                pass
+
+    def entries(self):
+        """所有缓存项（按最近使用时间从新到旧）"""
+        if not os.path.isdir(self.cache_dir):
+            return pd.DataFrame(columns=['key', 'source', 'rows', 'size_mb', 'created', 'last_used'])
+        rows = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(DATA_SUFFIX):
+                continue
+            key = name[:-len(DATA_SUFFIX)]
+            path = self._path(key, DATA_SUFFIX)
+            meta = {}
+            try:
+                with open(self._path(key, META_SUFFIX), encoding='utf-8') as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                pass
+            rows.append({'key': key, 'source': meta.get('source'), 'rows': meta.get('rows'),
+                         'size_mb': round(os.path.getsize(path) / 1024 / 1024, 2),
+                         'created': meta.get('created'),
+                         'last_used': datetime.fromtimestamp(os.path.getmtime(path)).isoformat(timespec='seconds')})
+        table = pd.DataFrame(rows, columns=['key', 'source', 'rows', 'size_mb', 'created', 'last_used'])
+        return table.sort_values('last_used', ascending=False, ignore_index=True)
+
+    def evict(self, max_mb=None):
+        """按最近使用时间淘汰，直到总大小不超过 max_mb（默认 self.max_mb），返回删除的键"""
+        max_mb = self.max_mb if max_mb is None else max_mb
+        entries = self.entries()
+        total = entries['size_mb'].sum()
+        removed = []
+        for _, entry in entries.iloc[::-1].iterrows():
+            if total <= max_mb:
+                break
+            self.remove(entry['key'])
+            total -= entry['size_mb']
+            removed.append(entry['key'])
+        return removed
+
+    def purge(self, older_than_days=None):
+        """删除全部缓存，或最近使用时间早于 older_than_days 天的缓存，返回删除的键"""
+        entries = self.entries()
+        if older_than_days is not None:
+            cutoff = datetime.fromtimestamp(time.time() - older_than_days * 86400).isoformat(timespec='seconds')
+            entries = entries[entries['last_used'] < cutoff]
+        for key in entries['key']:
+            self.remove(key)
+        return list(entries['key'])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="预处理结果磁盘缓存")
+    sub = parser.add_subparsers(dest='command', required=True)
+    list_parser = sub.add_parser('list', help="列出缓存项")
+    list_parser.add_argument('--dir', default=None)
+    purge = sub.add_parser('purge', help="清理缓存")
+    purge.add_argument('--dir', default=None)
+    group = purge.add_mutually_exclusive_group(required=True)
+    group.add_argument('--all', action='store_true', help="删除全部缓存")
+    group.add_argument('--older-than', type=float, help="删除超过指定天数未使用的缓存")
+    group.add_argument('--max-mb', type=float, help="按最近使用时间淘汰到指定容量以内")
+    args = parser.parse_args(argv)
+
+    cache = FrameCache(args.dir)
+    if args.command == 'list':
+        entries = cache.entries()
+        if entries.empty:
+            print(f"📭 缓存为空: {cache.cache_dir}")
+            return 0
+        with pd.option_context('display.max_colwidth', 60, 'display.width', 200):
+            print(entries.to_string(index=False))
+        print(f"📦 {len(entries)} 项, 共 {entries['size_mb'].sum():.1f} MB ({cache.cache_dir})")
+        return 0
+
+    if args.max_mb is not None:
+        removed = cache.evict(args.max_mb)
+    else:
+        removed = cache.purge(None if args.all else args.older_than)
+    print(f"🧹 已删除 {len(removed)} 项缓存")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
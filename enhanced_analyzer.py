@@ -3,17 +3,28 @@ import numpy as np
 from datetime import datetime, timedelta
 import warnings
 
+from anomaly import group_codes, iqr_outliers, mad_outliers, robust_stats, rolling_outliers
+from trend import active_from_first, linear_trends, series_trends
+from rules import CATEGORY_RECOMMENDATION_RULES, rule_records, setting, threshold
+
 warnings.filterwarnings('ignore')
 
+# 深度分析读取的原始字段
+DEEP_ANALYSIS_COLUMNS = ['SKU编码', '商品名称', '小分类', '销售金额', '利润', '销售个数']
+
 
 class EnhancedSalesAnalyzer:
     """增强版销售分析器 - 提供深度业务洞察"""
 
     def __init__(self, base_analyzer):
         self.analyzer = base_analyzer
-        self.df = base_analyzer.df
         self.analysis_results = base_analyzer.analysis_results
 
+    @property
+    def df(self):
+        # 始终使用分析器当前的数据（可以在加载数据之前注册深度分析）
+        return self.analyzer.df
+
     def run_deep_analysis(self):
         """执行深度分析"""
         print("🔍 执行深度业务分析...")
@@ -86,34 +97,17 @@ class EnhancedSalesAnalyzer:
         """生成智能业务建议"""
         recommendations = []
 
-        # 基于分类分析的建议
+        config = self.analyzer.report_config
+
+        # 基于分类分析的建议（规则见 rules.CATEGORY_RECOMMENDATION_RULES）
         if 'category_analysis' in self.analysis_results:
             cat_data = self.analysis_results['category_analysis']
-            for category, row in cat_data.iterrows():
-                if row.get('利润率', 0) < 5:
-                    recommendations.append({
-                        'type': '利润优化',
-                        'priority': '高',
-                        'category': category,
-                        'recommendation': f"{category}利润率过低({row['利润率']:.1f}%)，建议检查成本结构或调整定价",
-                        'impact': '高',
-                        'effort': '中'
-                    })
-
-                if row.get('销售金额', 0) > cat_data['销售金额'].quantile(0.8):
-                    recommendations.append({
-                        'type': '资源分配',
-                        'priority': '中',
-                        'category': category,
-                        'recommendation': f"{category}是畅销品类，可考虑增加营销投入",
-                        'impact': '中',
-                        'effort': '低'
-                    })
+            recommendations += rule_records(cat_data, CATEGORY_RECOMMENDATION_RULES, config)
 
         # 基于滞销产品的建议
         if 'unsold_analysis' in self.analysis_results:
             unsold_data = self.analysis_results['unsold_analysis']['unsold_products']
-            high_value_unsold = unsold_data[unsold_data['在库金额'] > 5000]
+            high_value_unsold = unsold_data[unsold_data['在库金额'] > threshold(config, 'high_value_unsold_amount')]
             if len(high_value_unsold) > 0:
                 recommendations.append({
                     'type': '库存优化',
@@ -130,7 +124,7 @@ class EnhancedSalesAnalyzer:
             if len(monthly_data) > 1:
                 recent_growth = monthly_data['销售金额_环比%'].iloc[
                     -1] if '销售金额_环比%' in monthly_data.columns else 0
-                if recent_growth < -10:
+                if recent_growth < threshold(config, 'sales_decline_alert_pct'):
                     recommendations.append({
                         'type': '销售预警',
                         'priority': '高',
@@ -143,39 +137,58 @@ class EnhancedSalesAnalyzer:
         return pd.DataFrame(recommendations)
 
     def detect_anomalies(self):
-        """异常检测"""
-        anomalies = []
-
-        # 价格异常检测
-        if '销售金额' in self.df.columns and '销售个数' in self.df.columns:
-            self.df['单价'] = self.df['销售金额'] / self.df['销售个数']
-            price_stats = self.df['单价'].describe()
-            price_outliers = self.df[
-                (self.df['单价'] > price_stats['75%'] + 1.5 * (price_stats['75%'] - price_stats['25%'])) |
-                (self.df['单价'] < price_stats['25%'] - 1.5 * (price_stats['75%'] - price_stats['25%']))
-                ]
-
-            if len(price_outliers) > 0:
-                anomalies.append({
-                    'type': '价格异常',
-                    'count': len(price_outliers),
-                    'description': f'发现{len(price_outliers)}个价格异常交易',
-                    'details': price_outliers[['SKU编码', '商品名称', '单价']].to_dict('records')
-                })
+        """
+        异常检测（分组稳健统计，见 anomaly.py）
 
-        # 销售数量异常
-        if '销售个数' in self.df.columns:
-            quantity_stats = self.df['销售个数'].describe()
-            quantity_outliers = self.df[
-                self.df['销售个数'] > quantity_stats['75%'] + 1.5 * (quantity_stats['75%'] - quantity_stats['25%'])]
-
-            if len(quantity_outliers) > 0:
-                anomalies.append({
-                    'type': '销量异常',
-                    'count': len(quantity_outliers),
-                    'description': f'发现{len(quantity_outliers)}个销量异常交易',
-                    'details': quantity_outliers[['SKU编码', '商品名称', '销售个数']].to_dict('records')
-                })
+        单价、销量按 anomaly_group_by（默认小分类）分组做 IQR / MAD 检测，SKU 月度销售额做滚动 z 分数检测。
+        每项结果只保存命中位置（rows）和命中值（values），不修改 self.df；明细用 anomaly.anomaly_details() 展开
+        """
+        anomalies = []
+        config = self.analyzer.report_config
+        df = self.df
+        group_by = setting(config, 'anomaly_group_by')
+        k = setting(config, 'anomaly_iqr_k')
+        min_size = setting(config, 'anomaly_min_group_size')
+        codes, labels = group_codes(df, group_by)
+        scope = group_by if group_by in labels.names else '全部'
+
+        def add(kind, method, rows, description, values, **extra):
+            if len(rows) > 0:
+                anomalies.append({'type': kind, 'method': method, 'group_by': scope, 'count': len(rows),
+                                  'description': description, 'rows': rows, 'values': values, **extra})
+
+        # 价格异常（单价只作为临时数组计算）
+        if '销售金额' in df.columns and '销售个数' in df.columns:
+            units = df['销售个数'].to_numpy(dtype=np.float64, na_value=np.nan)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                price = df['销售金额'].to_numpy(dtype=np.float64, na_value=np.nan) / units
+            price[~np.isfinite(price)] = np.nan
+            stats = robust_stats(codes, labels, price)
+
+            rows, bounds = iqr_outliers(codes, stats, price, k, 'both', min_size)
+            add('价格异常', 'IQR', rows, f'按{scope}分组发现{len(rows)}个价格异常交易',
+                {'单价': price[rows]}, bounds=bounds)
+            rows, z = mad_outliers(codes, stats, price, setting(config, 'anomaly_mad_threshold'), min_size)
+            add('价格异常', 'MAD', rows, f'按{scope}分组发现{len(rows)}个单价偏离中位数的交易',
+                {'单价': price[rows], '稳健z分数': z})
+
+        # 销售数量异常（只检测偏高）
+        if '销售个数' in df.columns:
+            units = df['销售个数'].to_numpy(dtype=np.float64, na_value=np.nan)
+            stats = robust_stats(codes, labels, units)
+            rows, bounds = iqr_outliers(codes, stats, units, k, 'upper', min_size)
+            add('销量异常', 'IQR', rows, f'按{scope}分组发现{len(rows)}个销量异常交易',
+                {'销售个数': units[rows]}, bounds=bounds)
+
+        # 月度销售突变（SKU × 月份 面板上的滚动 z 分数）
+        if '年月' in df.columns and '销售金额' in df.columns:
+            panel = self.analyzer.get_sku_panel()
+            window = setting(config, 'anomaly_rolling_window')
+            rows, columns, z = rolling_outliers(panel.sales, window, setting(config, 'anomaly_z_threshold'))
+            add('月度销售突变', 'rolling_z', rows,
+                f'发现{len(rows)}个SKU月度销售额相对前{window}个月显著变化',
+                {'销售金额': panel.sales[rows, columns], 'z分数': z},
+                columns=columns, labels=(panel.skus, panel.months))
 
         return anomalies
 
@@ -204,17 +217,32 @@ class EnhancedSalesAnalyzer:
                     'description': f'利润呈现{"上升" if profit_trend > 0 else "下降"}趋势'
                 }
 
+        # 每个 SKU / 小分类 的趋势与预测（SKU × 月份 面板上一次矩阵运算，见 trend.py）
+        if '年月' in self.df.columns and '销售金额' in self.df.columns:
+            config = self.analyzer.report_config
+            panel = self.analyzer.get_sku_panel()
+            if len(panel.months) >= 2:
+                sku_trends = series_trends(panel.sales, panel.skus.rename('SKU编码'), panel.months,
+                                           weights=active_from_first(panel.present), config=config)
+                sku_trends.insert(0, '商品名称', panel.names)
+                trends['sku_trends'] = sku_trends
+
+                if '小分类' in self.df.columns:
+                    category_sales = self.df.groupby(['小分类', '年月'], observed=True)['销售金额'].sum().unstack(
+                        fill_value=0).reindex(columns=panel.months, fill_value=0)
+                    trends['category_trends'] = series_trends(category_sales.to_numpy(), category_sales.index,
+                                                              panel.months, config=config)
+
         return trends
 
     def _calculate_trend(self, series):
-        """计算时间序列趋势"""
+        """计算时间序列趋势（斜率 / 均值）"""
         if len(series) < 2:
             return 0
 
-        x = np.arange(len(series))
-        y = series.values
-        slope = np.polyfit(x, y, 1)[0]
-        return slope / np.mean(y) if np.mean(y) != 0 else 0
+        fit = linear_trends(series.to_numpy(dtype=np.float64, na_value=np.nan)[None, :])
+        mean = fit['mean'][0]
+        return fit['slope'][0] / mean if mean != 0 else 0
 
     def competitive_analysis(self):
         """竞争分析（基于内部数据）"""
@@ -264,14 +292,7 @@ def enhance_analyzer(analyzer):
     """为分析器添加深度分析功能"""
     enhanced = EnhancedSalesAnalyzer(analyzer)
 
-    # 重写run_all_analysis方法
-    original_run_all = analyzer.run_all_analysis
-
-    def enhanced_run_all_analysis():
-        results = original_run_all()
-        if results:
-            enhanced.run_deep_analysis()
-        return analyzer.analysis_results
-
-    analyzer.run_all_analysis = enhanced_run_all_analysis
-    return analyzer
\ No newline at end of file
+    # 注册为最后执行的分析任务（依赖所有已有模块，包括可视化）
+    columns = DEEP_ANALYSIS_COLUMNS + [setting(analyzer.report_config, 'anomaly_group_by')]
+    analyzer.register_analysis('run_deep_analysis', enhanced.run_deep_analysis, columns=columns)
+    return analyzer
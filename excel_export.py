@@ -0,0 +1,127 @@
+"""
+大结果集的 Excel 流式导出
+
+- xlsxwriter constant_memory 模式逐行写入，内存占用与行数无关
+- 按列类型预先选好写入函数，跳过 write_row 的逐单元格类型判断
+- 超过 Excel 单表 1,048,576 行上限时自动拆分为多个工作表（名称_2, 名称_3 ...）
+- 超大结果表可以多进程并行写入单独的文件，或打包为一个 zip
+"""
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import xlsxwriter
+
+# Excel 单个工作表的最大行数（含表头）
+EXCEL_MAX_ROWS = 1_048_576
+SHEET_NAME_MAX = 31
+
+WORKBOOK_OPTIONS = {'constant_memory': True, 'nan_inf_to_errors': True}
+
+
+def split_sheets(name, df, max_rows=EXCEL_MAX_ROWS - 1):
+    """把超过单表行数上限的结果表拆分为 [(工作表名, 数据块)]"""
+    if len(df) <= max_rows:
+        return [(name[:SHEET_NAME_MAX], df)]
+    parts = []
+    for i, start in enumerate(range(0, len(df), max_rows)):
+        suffix = '' if i == 0 else f'_{i + 1}'
+        parts.append((name[:SHEET_NAME_MAX - len(suffix)] + suffix, df.iloc[start:start + max_rows]))
+    return parts
+
+
+def _column_writer(worksheet, series, date_format):
+    """按列类型返回 (写入函数, 值数组)，缺失值为 None"""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        dates = series.dt.tz_localize(None) if series.dt.tz is not None else series
+        values = np.array(dates.dt.to_pydatetime(), dtype=object)
+        values[series.isna().to_numpy()] = None
+        return (lambda row, col, value: worksheet.write_datetime(row, col, value, date_format)), values
+    if pd.api.types.is_bool_dtype(series) and not series.isna().any():
+        return worksheet.write_boolean, series.to_numpy(dtype=object)
+    if pd.api.types.is_numeric_dtype(series):
+        numbers = series.to_numpy(dtype=np.float64, na_value=np.nan)
+        values = numbers.astype(object)
+        values[np.isnan(numbers)] = None
+        return worksheet.write_number, values
+    values = series.astype('string').to_numpy(dtype=object, na_value=None)
+    return worksheet.write_string, values
+
+
+def write_frame(workbook, worksheet, df, header_format=None, date_format=None):
+    """
+    按行顺序把 DataFrame 写入工作表（constant_memory 模式要求逐行写入）
+
+    与 DataFrame.to_excel 的列布局一致：索引（包括默认的 RangeIndex）的每一层写在最前面，
+    未命名的索引层表头留空
+    """
+    header_format = header_format or workbook.add_format({'bold': True})
+    date_format = date_format or workbook.add_format({'num_format': 'yyyy-mm-dd'})
+
+    header = (['' if name is None else str(name) for name in df.index.names]
+              + [str(col) for col in df.columns])
+    series = ([pd.Series(df.index.get_level_values(i), copy=False) for i in range(df.index.nlevels)]
+              + [df.iloc[:, i] for i in range(df.shape[1])])
+    worksheet.write_row(0, 0, header, header_format)
+    writers, columns = zip(*[_column_writer(worksheet, column, date_format) for column in series])
+    for row, values in enumerate(zip(*columns), start=1):
+        for col, value in enumerate(values):
+            if value is not None:
+                writers[col](row, col, value)
+    return len(df)
+
+
+def write_sheet(workbook, name, df):
+    """写入一个结果表，超过行数上限时拆分，返回实际使用的工作表名列表"""
+    header_format = workbook.add_format({'bold': True})
+    date_format = workbook.add_format({'num_format': 'yyyy-mm-dd'})
+    names = []
+    for sheet_name, part in split_sheets(name, df):
+        write_frame(workbook, workbook.add_worksheet(sheet_name), part, header_format, date_format)
+        names.append(sheet_name)
+    return names
+
+
+def open_workbook(path):
+    """以 constant_memory 模式创建工作簿（每个工作表必须按行顺序写入）"""
+    return xlsxwriter.Workbook(path, WORKBOOK_OPTIONS)
+
+
+def write_sheet_file(path, name, df):
+    """把单个结果表写入独立的 xlsx 文件（供进程池调用）"""
+    with open_workbook(path) as workbook:
+        write_sheet(workbook, name, df)
+    return path
+
+
+def export_sheet_files(sheets, base_path, bundle=False, max_workers=None):
+    """
+    把多个结果表并行写入 <base_path 去扩展名>_<表名>.xlsx
+
+    bundle: 为 True 时打包为 <base_path 去扩展名>_大表.zip 并删除单独的文件
+    返回生成的文件路径列表
+    """
+    stem = os.path.splitext(base_path)[0]
+    jobs = [(f"{stem}_{name}.xlsx", name, df) for name, df in sheets]
+    if not jobs:
+        return []
+
+    if len(jobs) == 1 or max_workers == 1:
+        paths = [write_sheet_file(*job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=min(len(jobs), max_workers or os.cpu_count() or 1)) as pool:
+            paths = list(pool.map(write_sheet_file, *zip(*jobs)))
+
+    if not bundle:
+        return paths
+
+    zip_path = f"{stem}_大表.zip"
+    # xlsx 本身已是压缩格式，直接存储
+    with zipfile.ZipFile(zip_path, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for path in paths:
+            archive.write(path, os.path.basename(path))
+    for path in paths:
+        os.remove(path)
+    return [zip_path]
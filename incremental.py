@@ -0,0 +1,307 @@
+"""
+增量月度刷新
+
+把 SKU×月份 粒度的部分聚合（与流式模式相同的 SalesPartials）、小分类×月份 汇总
+和每个 SKU 的最后销售月份保存在本地状态目录中。新月份的文件到达时只聚合这份增量
+并合并进状态，然后直接从状态重新生成所有报告，不再重新读取全部历史明细。
+
+状态目录:
+    partials.parquet        SKU×月份 部分聚合（含每组第一条明细的行号）
+    category_month.parquet  小分类×月份 汇总
+    last_sale.parquet       每个SKU的最后销售月份
+    manifest.json           已合并的文件、月份和行数
+
+用法:
+    python incremental.py add <状态目录> <新文件 ...> [--replace]
+    python incremental.py report <状态目录> [-o 报告.xlsx]
+    python incremental.py verify <状态目录> [原始文件 ...]
+
+verify 把原始文件全部读入内存，按普通内存模式（load_data → 清洗 → 分组聚合）重新计算，
+与状态逐表对比，并对比两边的滞销清单（明细字段和顺序），不复用 SalesPartials 的聚合代码。
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from data_loader import iter_chunks
+from streaming import FIRST_COLUMNS, GRAIN_COLUMNS, SUM_COLUMNS, SalesPartials
+from unsold_index import LastSaleIndex
+
+STATE_VERSION = 1
+PARTIALS_FILE = 'partials.parquet'
+CATEGORY_MONTH_FILE = 'category_month.parquet'
+LAST_SALE_FILE = 'last_sale.parquet'
+MANIFEST_FILE = 'manifest.json'
+
+
+class SalesState:
+    """持久化的增量聚合状态"""
+
+    def __init__(self, state_dir):
+        self.state_dir = state_dir
+        self.partials = SalesPartials()
+        self.manifest = {'version': STATE_VERSION, 'files': []}
+
+    @classmethod
+    def load(cls, state_dir):
+        """读取状态目录，目录不存在或为空时返回空状态"""
+        state = cls(state_dir)
+        manifest_path = os.path.join(state_dir, MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            return state
+
+        with open(manifest_path, encoding='utf-8') as f:
+            state.manifest = json.load(f)
+        if state.manifest.get('version') != STATE_VERSION:
+            raise ValueError(f"状态版本不兼容: {state.manifest.get('version')}，请重新构建状态目录")
+        state.partials = SalesPartials.from_result(pd.read_parquet(os.path.join(state_dir, PARTIALS_FILE)),
+                                                   next_row=state.manifest.get('next_row'))
+        return state
+
+    def save(self):
+        """写入状态目录（先写临时文件再替换，避免中断时留下不完整的状态）"""
+        os.makedirs(self.state_dir, exist_ok=True)
+        self.manifest['next_row'] = self.partials.next_row
+        tables = {
+            PARTIALS_FILE: self.partials.result().reset_index(),
+            CATEGORY_MONTH_FILE: self.category_month().reset_index(),
+            LAST_SALE_FILE: self.last_sale_month().reset_index(),
+        }
+        for name, table in tables.items():
+            path = os.path.join(self.state_dir, name)
+            table.to_parquet(path + '.tmp', index=False)
+            os.replace(path + '.tmp', path)
+
+        path = os.path.join(self.state_dir, MANIFEST_FILE)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=2)
+        os.replace(path + '.tmp', path)
+
+    @property
+    def empty(self):
+        return self.partials.result() is None
+
+    def months(self):
+        if self.empty:
+            return []
+        return sorted(self.partials.result().index.get_level_values('年月').dropna().unique())
+
+    def to_frame(self):
+        """SKU×月份 粒度的聚合表（与流式模式的 self.df 结构相同）"""
+        return self.partials.to_frame()
+
+    def category_month(self):
+        """小分类×月份 汇总（含去重SKU数）"""
+        return self.partials.category_month_totals()
+
+    def last_sale_month(self):
+        """每个SKU的最后销售月份"""
+        return self.partials.last_sale_month().rename('最后销售月份')
+
+    def drop_months(self, months):
+        """从状态中去掉指定月份（重新导入更正后的月份数据时使用）"""
+        if self.empty:
+            return
+        frame = self.partials.result()
+        removed = frame.index.get_level_values('年月').isin(months)
+        rows = self.partials.rows - int(frame.loc[removed, '记录数'].sum())
+        self.partials = SalesPartials.from_result(frame[~removed], rows=rows, chunks=self.partials.chunks,
+                                                  next_row=self.partials.next_row)
+        for entry in self.manifest['files']:
+            entry['months'] = [month for month in entry['months'] if month not in months]
+        self.manifest['files'] = [entry for entry in self.manifest['files'] if entry['months']]
+
+    def fold(self, chunks, preprocess, sources=(), replace=False):
+        """
+        把一份增量数据合并进状态
+
+        chunks: 原始数据块的可迭代对象（同一批增量的多个文件可以一起传入，例如同月的各区域文件）
+        preprocess: 单个数据块的清洗函数（MonthlySalesAnalyzer._preprocess_frame）
+        replace: 增量中的月份已在状态中时，先去掉这些月份再合并；否则抛出 ValueError
+        返回增量信息 dict
+        """
+        delta = SalesPartials()
+        for chunk in chunks:
+            delta.add_chunk(preprocess(chunk, verbose=False))
+        if delta.result() is None:
+            raise ValueError(f"增量数据为空: {list(sources)}")
+
+        months = sorted(delta.result().index.get_level_values('年月').dropna().unique())
+        overlap = [month for month in months if month in self.months()]
+        if overlap:
+            if not replace:
+                raise ValueError(f"月份 {overlap} 已在状态中，确认要用新数据覆盖请使用 replace=True")
+            self.drop_months(overlap)
+
+        if self.empty:
+            self.partials = delta
+        else:
+            self.partials.merge(delta)
+
+        info = {'sources': list(sources), 'months': months, 'rows': delta.rows,
+                'added_at': datetime.now().isoformat(timespec='seconds'), 'replaced': overlap}
+        self.manifest['files'].append(info)
+        return info
+
+    def fold_files(self, paths, preprocess, replace=False, chunksize=500_000):
+        """分块读取一批新文件，作为一份增量合并进状态"""
+        chunks = itertools.chain.from_iterable(iter_chunks(path, chunksize=chunksize) for path in paths)
+        return self.fold(chunks, preprocess, sources=[os.path.abspath(path) for path in paths], replace=replace)
+
+
+def _normalize_keys(table):
+    """缺失的维度值统一为占位符后排序（含 NaN 的多级索引无法直接对齐比较）"""
+    names = list(table.index.names)
+    table = table.reset_index()
+    for col in names:
+        table[col] = table[col].astype(object).where(table[col].notna(), '<NA>')
+    return table.set_index(names).sort_index()
+
+
+def _compare_tables(left, right, name):
+    """按索引对齐后比较两张聚合表，返回差异描述列表"""
+    problems = []
+    left, right = _normalize_keys(left), _normalize_keys(right)
+    if not left.index.equals(right.index):
+        missing = len(right.index.difference(left.index))
+        extra = len(left.index.difference(right.index))
+        problems.append(f"{name}: 索引不一致（缺少 {missing} 项，多出 {extra} 项）")
+        return problems
+
+    for col in right.columns:
+        if col not in left.columns:
+            problems.append(f"{name}: 缺少列 {col}")
+        elif pd.api.types.is_numeric_dtype(right[col]):
+            values, expected = left[col].to_numpy(dtype=float), right[col].to_numpy(dtype=float)
+            mismatched = ~np.isclose(values, expected, rtol=1e-9, atol=1e-6, equal_nan=True)
+            if mismatched.any():
+                diff = np.abs(values - expected)[mismatched]
+                diff = diff[~np.isnan(diff)]
+                detail = f"最大差异 {diff.max()}" if len(diff) else "缺失值不同"
+                problems.append(f"{name}.{col}: {int(mismatched.sum())} 行不一致（{detail}）")
+        elif not left[col].astype(object).equals(right[col].astype(object)):
+            problems.append(f"{name}.{col}: 取值不一致")
+    return problems
+
+
+def load_details(analyzer, batches):
+    """
+    按普通内存模式读取并清洗每一批原始文件（load_data → _preprocess_frame），按批次顺序拼接；
+    后一批包含的月份覆盖之前批次中的同月明细（同 fold 的 replace）
+    """
+    frames = []
+    for paths in batches:
+        batch = []
+        for path in paths:
+            analyzer.file_path = path
+            if not analyzer.load_data():
+                raise ValueError(f"无法读取原始文件: {path}")
+            batch.append(analyzer._preprocess_frame(analyzer.df, verbose=False))
+        batch = pd.concat(batch, ignore_index=True)
+        months = batch['年月'].dropna().unique()
+        frames = [frame[~frame['年月'].isin(months)] for frame in frames] + [batch]
+    return pd.concat(frames, ignore_index=True)
+
+
+def detail_tables(details):
+    """在全量明细上直接分组得到与状态对应的各张表"""
+    keys = [col for col in GRAIN_COLUMNS if col in details.columns]
+    grouped = details.groupby(keys, dropna=False, observed=True)
+    grain = grouped[[col for col in SUM_COLUMNS if col in details.columns]].sum()
+    for col in FIRST_COLUMNS:
+        if col in details.columns:
+            grain[col] = grouped[col].first(skipna=False)
+    grain['记录数'] = grouped.size()
+
+    grouped = details.groupby(['小分类', '年月'], observed=True)
+    category_month = grouped[[col for col in SUM_COLUMNS if col in details.columns]].sum()
+    category_month['记录数'] = grouped.size()
+    category_month['SKU数'] = grouped['SKU编码'].nunique()
+
+    last_sale = details.groupby('SKU编码', observed=True)['年月'].max().rename('最后销售月份')
+    return {'SKU×月份': grain, '小分类×月份': category_month, '最后销售月份': last_sale.to_frame(),
+            '滞销清单': _unsold_details(details)}
+
+
+def _unsold_details(frame):
+    """默认截止月份的滞销清单（位置索引，比较时行顺序也必须一致）"""
+    index = LastSaleIndex.from_frame(frame)
+    details = index.unsold_details(frame)[0] if len(index.months) >= 2 else pd.DataFrame()
+    return details.rename_axis('位置')
+
+
+def verify_state(state, analyzer, paths=None):
+    """
+    一致性检查：把原始文件全部读入内存，用普通内存模式重新计算，与增量状态逐表对比
+    （包括滞销清单的明细字段和顺序）
+
+    analyzer: MonthlySalesAnalyzer，用于读取和清洗原始文件
+    paths: 全部原始文件；为 None 时按 manifest 记录的顺序重放每一批增量
+    返回差异描述列表，为空表示一致
+    """
+    batches = [entry['sources'] for entry in state.manifest['files']] if paths is None else [paths]
+    if state.empty or not batches:
+        return [] if state.empty and not batches else ["状态或原始文件为空"]
+
+    details = load_details(analyzer, batches)
+    expected = detail_tables(details)
+    actual = {'SKU×月份': state.partials.result(), '小分类×月份': state.category_month(),
+              '最后销售月份': state.last_sale_month().to_frame(), '滞销清单': _unsold_details(state.to_frame())}
+
+    problems = []
+    for name, table in expected.items():
+        problems += _compare_tables(actual[name], table, name)
+    if state.partials.rows != len(details):
+        problems.append(f"明细行数不一致: {state.partials.rows} != {len(details)}")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="增量月度刷新")
+    sub = parser.add_subparsers(dest='command', required=True)
+    add = sub.add_parser('add', help="合并新文件进状态")
+    add.add_argument('state_dir')
+    add.add_argument('files', nargs='+')
+    add.add_argument('--replace', action='store_true', help="覆盖状态中已有的月份")
+    report = sub.add_parser('report', help="从状态生成报告")
+    report.add_argument('state_dir')
+    report.add_argument('-o', '--output', default=None)
+    verify = sub.add_parser('verify', help="与全量内存计算结果对比")
+    verify.add_argument('state_dir')
+    verify.add_argument('files', nargs='*', help="默认按状态中记录的顺序重放每一批文件")
+    args = parser.parse_args(argv)
+
+    from analyzer import MonthlySalesAnalyzer
+    analyzer = MonthlySalesAnalyzer()
+
+    if args.command == 'add':
+        state = analyzer.run_incremental_analysis(args.state_dir, args.files, replace=args.replace,
+                                                  run_analysis=False)
+        return 0 if state is not None else 1
+
+    if args.command == 'report':
+        if analyzer.run_incremental_analysis(args.state_dir) is None:
+            return 1
+        output = args.output or os.path.join('reports', f"销售分析报告_{analyzer.analysis_date}.xlsx")
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        return 0 if analyzer.export_to_excel(output_path=output) else 1
+
+    state = SalesState.load(args.state_dir)
+    problems = verify_state(state, analyzer, args.files or None)
+    if problems:
+        print("❌ 增量状态与全量内存计算不一致:")
+        for problem in problems:
+            print(f"   {problem}")
+        return 1
+    print(f"✅ 增量状态与全量内存计算一致（{state.partials.rows} 行明细）")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
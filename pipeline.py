@@ -0,0 +1,81 @@
+"""
+分析模块调度
+
+按声明的依赖关系执行分析模块：没有依赖关系的模块在线程池中并行执行
+（各模块只读取 self.df，pandas/NumPy 的聚合运算大部分会释放 GIL），
+并记录每个模块的耗时。
+"""
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+def topological_order(dependencies):
+    """按依赖关系排序（同一层保持声明顺序），存在循环依赖时抛出 ValueError"""
+    order, done = [], set()
+    pending = list(dependencies)
+    while pending:
+        ready = [name for name in pending if all(dep in done or dep not in dependencies
+                                                 for dep in dependencies[name])]
+        if not ready:
+            raise ValueError(f"分析模块存在循环依赖: {pending}")
+        for name in ready:
+            order.append(name)
+            done.add(name)
+            pending.remove(name)
+    return order
+
+
+def _timed_call(func):
+    start = time.perf_counter()
+    try:
+        func()
+        return {'seconds': time.perf_counter() - start, 'ok': True, 'error': None}
+    except Exception as e:
+        return {'seconds': time.perf_counter() - start, 'ok': False, 'error': str(e)}
+
+
+def run_task_graph(tasks, dependencies, max_workers=None, on_done=None):
+    """
+    执行任务图
+
+    tasks: {名称: 无参可调用对象}
+    dependencies: {名称: [依赖的任务名]}，依赖完成（无论成功与否）后才会启动
+    max_workers: 1 时按拓扑顺序串行执行
+    on_done: 每个任务结束时回调 on_done(名称, 耗时信息)
+
+    返回 (各任务耗时信息, 总耗时秒数)
+    """
+    order = topological_order({name: dependencies.get(name, []) for name in tasks})
+    timings = {}
+    start = time.perf_counter()
+
+    if max_workers == 1:
+        for name in order:
+            timings[name] = _timed_call(tasks[name])
+            if on_done:
+                on_done(name, timings[name])
+        return timings, time.perf_counter() - start
+
+    remaining = list(order)
+    running = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while remaining or running:
+            for name in [n for n in remaining if all(dep in timings or dep not in tasks
+                                                     for dep in dependencies.get(n, []))]:
+                running[pool.submit(_timed_call, tasks[name])] = name
+                remaining.remove(name)
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                timings[name] = future.result()
+                if on_done:
+                    on_done(name, timings[name])
+
+    return timings, time.perf_counter() - start
+
+
+def speedup(timings, wall_seconds):
+    """并行加速比：各模块耗时之和 / 实际总耗时"""
+    serial = sum(info['seconds'] for info in timings.values())
+    return serial / wall_seconds if wall_seconds > 0 else 1.0
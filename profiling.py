@@ -0,0 +1,194 @@
+"""
+阶段性能记录
+
+按阶段（加载、预处理、各分析模块、图表、导出……）记录：
+- 墙钟时间、CPU 时间（当前线程，并行执行的模块也能单独计时）
+- 进程峰值 RSS，以及开启 trace_memory 时阶段内的 Python 内存峰值增量（tracemalloc）
+- 输入 / 输出行数
+
+记录可导出为 JSON，用 compare_profiles 与之前的运行逐阶段对比。
+并行执行时各模块的内存峰值互相重叠，只适合做串行运行之间的对比。
+"""
+import json
+import platform
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+MB = 1024 * 1024
+
+
+def peak_rss_mb():
+    """进程峰值 RSS（MB）；无法获取时返回 None"""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux 单位为 KB，macOS 为字节
+        return round(peak / (MB if platform.system() == 'Darwin' else 1024), 1)
+    if psutil is not None:
+        info = psutil.Process().memory_info()
+        return round(getattr(info, 'peak_wset', info.rss) / MB, 1)
+    return None
+
+
+def count_rows(value):
+    """统计结果中 DataFrame / Series 的总行数（递归 dict / list），没有表格时返回 None"""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return len(value)
+    if isinstance(value, dict):
+        value = list(value.values())
+    if isinstance(value, (list, tuple)):
+        counts = [count_rows(v) for v in value]
+        counts = [c for c in counts if c is not None]
+        return sum(counts) if counts else None
+    return None
+
+
+class StageProfiler:
+    """按阶段记录耗时、内存和行数"""
+
+    def __init__(self, label=None, trace_memory=False):
+        self.label = label
+        self.trace_memory = trace_memory
+        self.started_at = datetime.now().isoformat(timespec='seconds')
+        self.records = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._owns_tracing = False
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._owns_tracing = True
+
+    def close(self):
+        """停止由本记录器启动的 tracemalloc"""
+        if self._owns_tracing:
+            tracemalloc.stop()
+            self._owns_tracing = False
+
+    @contextmanager
+    def stage(self, name, rows_in=None):
+        """
+        记录一个阶段，产出的 dict 可在阶段内补充 rows_out 等字段
+
+            with profiler.stage('preprocess', rows_in=len(df)) as stage:
+                df = clean(df)
+                stage['rows_out'] = len(df)
+        """
+        record = {'stage': name, 'rows_in': rows_in, 'rows_out': None, 'ok': True}
+        stack = self._local.__dict__.setdefault('stack', [])
+        tracing = self.trace_memory and tracemalloc.is_tracing()
+        if tracing:
+            current, peak = tracemalloc.get_traced_memory()
+            # 子阶段会重置峰值，先把已观测到的峰值记到外层阶段
+            if stack:
+                stack[-1]['peak'] = max(stack[-1]['peak'], peak)
+            tracemalloc.reset_peak()
+            frame = {'start': current, 'peak': current}
+            stack.append(frame)
+
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            yield record
+        except Exception:
+            record['ok'] = False
+            raise
+        finally:
+            record['wall_seconds'] = round(time.perf_counter() - wall_start, 4)
+            record['cpu_seconds'] = round(time.thread_time() - cpu_start, 4)
+            if tracing:
+                stack.pop()
+                peak = max(tracemalloc.get_traced_memory()[1], frame['peak'])
+                record['traced_peak_mb'] = round((peak - frame['start']) / MB, 2)
+                if stack:
+                    stack[-1]['peak'] = max(stack[-1]['peak'], peak)
+            record['peak_rss_mb'] = peak_rss_mb()
+            with self._lock:
+                self.records.append(record)
+
+    def wrap(self, name, func, rows_in=None, rows_out=None):
+        """
+        把无参可调用对象包装为带记录的版本（供 pipeline.run_task_graph 使用）
+
+        rows_out: 无参可调用对象，阶段结束后计算输出行数
+        """
+        def profiled():
+            with self.stage(name, rows_in=rows_in) as record:
+                result = func()
+                if rows_out is not None:
+                    record['rows_out'] = rows_out()
+                return result
+        return profiled
+
+    def to_dict(self):
+        return {
+            'label': self.label,
+            'started_at': self.started_at,
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+            'stages': list(self.records),
+        }
+
+    def to_json(self, path=None):
+        """导出为 JSON 字符串，指定 path 时同时写入文件"""
+        text = json.dumps(self.to_dict(), ensure_ascii=False, indent=2)
+        if path:
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(text)
+        return text
+
+    def to_frame(self):
+        return pd.DataFrame(self.records)
+
+    def print_summary(self):
+        print("⏱️ 阶段耗时:")
+        for record in self.records:
+            rows = '' if record['rows_in'] is None and record['rows_out'] is None else \
+                f", 行数 {record['rows_in']} -> {record['rows_out']}"
+            memory = f", 内存峰值 +{record['traced_peak_mb']} MB" if 'traced_peak_mb' in record else ''
+            print(f"   {'✅' if record['ok'] else '⚠️'} {record['stage']}: "
+                  f"{record['wall_seconds']:.2f}s (CPU {record['cpu_seconds']:.2f}s{memory}{rows})")
+        if self.records and self.records[-1]['peak_rss_mb'] is not None:
+            print(f"   进程峰值 RSS: {self.records[-1]['peak_rss_mb']} MB")
+
+
+def load_profile(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compare_profiles(current, baseline):
+    """
+    逐阶段对比两次运行（参数为 StageProfiler、to_dict() 结果或 JSON 文件路径）
+
+    返回 DataFrame：两次的墙钟时间、差值和比值；同名阶段取耗时之和
+    """
+    def wall_by_stage(profile):
+        if isinstance(profile, str):
+            profile = load_profile(profile)
+        elif isinstance(profile, StageProfiler):
+            profile = profile.to_dict()
+        stages = pd.DataFrame(profile['stages'])
+        if stages.empty:
+            return pd.Series(dtype=float)
+        return stages.groupby('stage', sort=False)['wall_seconds'].sum()
+
+    table = pd.concat({'baseline_seconds': wall_by_stage(baseline),
+                       'current_seconds': wall_by_stage(current)}, axis=1)
+    table['delta_seconds'] = table['current_seconds'] - table['baseline_seconds']
+    table['ratio'] = (table['current_seconds'] / table['baseline_seconds']).round(2)
+    return table
@@ -0,0 +1,228 @@
+"""
+可插拔的查询后端
+
+默认的 pandas 路径先把整个文件读入内存再聚合。查询后端把预处理的清洗规则翻译成 SQL，
+由嵌入式的多线程列式引擎（DuckDB）直接在 CSV / Parquet / Feather 文件上聚合，
+只把聚合结果交给 pandas；内存超过上限时引擎把中间结果溢出到临时目录。
+MonthlySalesAnalyzer 的各分析模块方法名和结果结构不变，只是聚合步骤改由后端执行。
+
+后端提供的聚合:
+    grain()             SKU×月份 粒度的部分聚合（同流式模式的 SalesPartials.to_frame()）
+    group_totals()      按维度汇总求和字段，可附加去重SKU数
+    sku_month_totals()  SKU×月份 汇总 + 该月最后一条记录的商品名称（构建 SkuMonthPanel）
+    first_sale_rows()   SKU×月份 组合 + 每个SKU第一次出现的明细字段（构建 LastSaleIndex）
+
+"第一次出现"、"最后一条"按文件中的行顺序计算，与 pandas 路径一致。
+DuckDB 为可选依赖（pip install duckdb）。
+"""
+import os
+from datetime import datetime
+
+from data_loader import NUMERIC_COLUMNS, sniff_encoding
+from streaming import FIRST_COLUMNS, GRAIN_COLUMNS, SUM_COLUMNS
+from unsold_index import DETAIL_COLUMNS
+
+try:
+    import duckdb
+    HAS_DUCKDB = True
+except ImportError:
+    duckdb = None
+    HAS_DUCKDB = False
+
+# 查询中用到的原始字段（其余字段不读取）
+SOURCE_COLUMNS = [col for col in dict.fromkeys(GRAIN_COLUMNS + SUM_COLUMNS + FIRST_COLUMNS + DETAIL_COLUMNS
+                                                + ['日期', 'Year of 日期', 'Month of 日期']) if col != '年月']
+# 日期文本除 ISO 格式外还接受的格式
+DATE_FORMATS = ['%Y/%m/%d', '%Y/%m/%d %H:%M:%S']
+
+
+def _ident(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _literal(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _path_list(paths):
+    return '[' + ', '.join(_literal(os.path.abspath(path)) for path in paths) + ']'
+
+
+class DuckDBBackend:
+    """DuckDB 查询后端"""
+
+    name = 'duckdb'
+
+    def __init__(self, paths, threads=None, memory_limit=None, temp_dir=None):
+        """
+        paths: 一个或多个 CSV / Parquet / Feather 文件（多个文件按顺序拼接，字段按名称对齐）
+        threads: 线程数，None 表示按 CPU 核数
+        memory_limit: 内存上限，例如 '4GB'，超过时溢出到 temp_dir
+        """
+        if not HAS_DUCKDB:
+            raise ImportError("DuckDB 后端需要安装 duckdb: pip install duckdb")
+        self.paths = [paths] if isinstance(paths, str) else list(paths)
+        self.con = duckdb.connect()
+        if threads:
+            self.con.execute(f"SET threads = {int(threads)}")
+        if memory_limit:
+            self.con.execute(f"SET memory_limit = {_literal(memory_limit)}")
+        if temp_dir:
+            self.con.execute(f"SET temp_directory = {_literal(temp_dir)}")
+        self.frame = None  # grain() 的结果，分析器据此判断 self.df 是否来自该后端
+        self._create_sales_relation()
+
+    def _source(self):
+        """原始文件的查询来源（CSV 全部按文本读取，数值和日期在清洗时转换，中途出现的异常值不会报错）"""
+        extensions = {os.path.splitext(path)[1].lower() for path in self.paths}
+        if len(extensions) > 1:
+            raise ValueError(f"多个文件的格式不一致: {sorted(extensions)}")
+        extension = extensions.pop()
+
+        if extension == '.parquet':
+            return f"read_parquet({_path_list(self.paths)}, union_by_name = true)"
+        if extension == '.feather':
+            # Arrow IPC 内存映射后注册为表，引擎直接扫描 Arrow 内存
+            import pyarrow as pa
+            tables = []
+            for path in self.paths:
+                with pa.memory_map(path) as source:
+                    tables.append(pa.ipc.open_file(source).read_all())
+            self.con.register('feather_source', pa.concat_tables(tables, promote_options='default'))
+            return 'feather_source'
+        if extension == '.xlsx':
+            raise ValueError("DuckDB 后端不支持 xlsx 文件，请先转换为 Parquet: python data_loader.py convert <文件>")
+
+        encoding, _ = sniff_encoding(self.paths[0])
+        if encoding is None:
+            raise ValueError("无法识别CSV文件编码")
+        options = "header = true, all_varchar = true, union_by_name = true"
+        if encoding != 'utf-8':
+            try:
+                self.con.execute("LOAD encodings")
+            except Exception:
+                raise ValueError(f"DuckDB 未加载 encodings 扩展，无法直接读取 {encoding} 编码的CSV，"
+                                 f"请先转换为 Parquet: python data_loader.py convert <文件>") from None
+            options += f", encoding = {_literal(encoding)}"
+        return f"read_csv({_path_list(self.paths)}, {options})"
+
+    def _create_sales_relation(self):
+        """
+        清洗后的明细 sales：数值 / 日期字段转换、过滤 销售金额 / SKU编码 缺失的行、计算年月，
+        _row 为文件中的行号（窗口函数按读取顺序编号）
+        """
+        source = self._source()
+        available = [row[0] for row in self.con.execute(f"DESCRIBE SELECT * FROM {source}").fetchall()]
+        self.columns = [col for col in SOURCE_COLUMNS if col in available]
+
+        selects = []
+        for col in self.columns:
+            if col in NUMERIC_COLUMNS:
+                selects.append(f"TRY_CAST({_ident(col)} AS DOUBLE) AS {_ident(col)}")
+            elif col == '日期':
+                text = f"CAST({_ident(col)} AS VARCHAR)"
+                selects.append(f"coalesce(TRY_CAST({_ident(col)} AS TIMESTAMP), "
+                               f"try_strptime({text}, [{', '.join(map(_literal, DATE_FORMATS))}])) AS {_ident(col)}")
+            else:
+                selects.append(_ident(col))
+        selects.append("row_number() OVER () AS _row")
+
+        if '日期' in self.columns:
+            month = "strftime(\"日期\", '%Y-%m')"
+        elif 'Year of 日期' in self.columns and 'Month of 日期' in self.columns:
+            month = ("CAST(\"Year of 日期\" AS VARCHAR) || '-' || "
+                     "lpad(CAST(\"Month of 日期\" AS VARCHAR), 2, '0')")
+        else:
+            month = _literal(datetime.now().strftime("%Y-%m"))
+        filters = [f"{_ident(col)} IS NOT NULL" for col in ('销售金额', 'SKU编码') if col in self.columns]
+
+        # 所有格式都只建视图，每次查询直接扫描文件，明细不复制进引擎内存
+        # （CSV 每次查询都重新解析，换来的是内存与文件大小无关；需要反复查询时可先转换为 Parquet）
+        where = ' AND '.join(filters)
+        self.con.execute(f"CREATE VIEW source_rows AS SELECT {', '.join(selects)} FROM {source}")
+        self.con.execute(f"CREATE VIEW sales AS SELECT * EXCLUDE (_row), {month} AS \"年月\", _row "
+                         f"FROM source_rows" + (f" WHERE {where}" if filters else ""))
+        self.columns.append('年月')
+        # 明细行数和有效行数一次扫描得到
+        self.raw_rows, self.rows = self.con.execute(
+            f"SELECT count(*), count(*) FILTER (WHERE {where or 'true'}) FROM source_rows").fetchone()
+
+    def query(self, sql):
+        """执行查询，返回 DataFrame"""
+        return self.con.execute(sql).df()
+
+    def _present(self, columns):
+        return [col for col in columns if col in self.columns]
+
+    def grain(self):
+        """
+        SKU×月份 粒度的部分聚合，字段和行顺序同 SalesPartials.to_frame()
+        （库存字段取每组第一条明细的值，各组按第一条明细的行号排列，原始数据没有订单数时用记录数代替）
+        """
+        keys = self._present(GRAIN_COLUMNS)
+        selects = [_ident(col) for col in keys]
+        selects += [f"coalesce(sum({_ident(col)}), 0) AS {_ident(col)}" for col in self._present(SUM_COLUMNS)]
+        selects += [f"first({_ident(col)} ORDER BY _row) AS {_ident(col)}" for col in self._present(FIRST_COLUMNS)]
+        selects.append('count(*) AS "记录数"')
+        key_list = ', '.join(_ident(col) for col in keys)
+        frame = self.query(f"SELECT {', '.join(selects)} FROM sales GROUP BY {key_list} "
+                           f"ORDER BY min(_row)")
+        if '订单数' not in frame.columns:
+            frame['订单数'] = frame['记录数']
+        self.frame = frame
+        return frame
+
+    def group_totals(self, by, columns, count_skus=False):
+        """
+        按维度汇总（同 df.groupby(by).agg({列: 'sum'})：维度缺失的行不计入，按维度排序）
+
+        count_skus: 附加精确的去重SKU数列（SKU编码）
+        """
+        keys = [by] if isinstance(by, str) else list(by)
+        key_list = ', '.join(_ident(col) for col in keys)
+        selects = [f"coalesce(sum({_ident(col)}), 0) AS {_ident(col)}" for col in self._present(columns)]
+        if count_skus:
+            selects.append('count(DISTINCT "SKU编码") AS "SKU编码"')
+        where = ' AND '.join(f"{_ident(col)} IS NOT NULL" for col in keys)
+        frame = self.query(f"SELECT {key_list}, {', '.join(selects)} FROM sales WHERE {where} "
+                           f"GROUP BY {key_list} ORDER BY {key_list}")
+        return frame.set_index(by if isinstance(by, str) else keys)
+
+    def sku_month_totals(self):
+        """SKU×月份 汇总（构建 SkuMonthPanel），商品名称取该月最后一条非空记录"""
+        selects = ['"SKU编码"', '"年月"']
+        selects += [f"coalesce(sum({_ident(col)}), 0) AS {_ident(col)}"
+                    for col in self._present(['销售金额', '利润', '销售个数', '订单数'])]
+        if '订单数' not in self.columns:
+            selects.append('count(*) AS "订单数"')
+        if '商品名称' in self.columns:
+            selects.append('arg_max("商品名称", _row) AS "商品名称"')
+        return self.query(f"SELECT {', '.join(selects)} FROM sales WHERE \"年月\" IS NOT NULL "
+                          f"GROUP BY \"SKU编码\", \"年月\"")
+
+    def first_sale_rows(self):
+        """
+        每个 SKU×月份 组合一行，附带该SKU在明细中第一次出现的行的明细字段，
+        按SKU第一次出现的顺序排列（构建 LastSaleIndex 并直接取滞销清单）
+        """
+        details = self._present(DETAIL_COLUMNS[1:])
+        firsts = ''.join(f", first({_ident(col)} ORDER BY _row) AS {_ident(col)}" for col in details)
+        columns = ''.join(f", s.{_ident(col)}" for col in details)
+        return self.query(
+            f"WITH skus AS (SELECT \"SKU编码\", min(_row) AS _first{firsts} FROM sales GROUP BY \"SKU编码\"), "
+            f"pairs AS (SELECT DISTINCT \"SKU编码\", \"年月\" FROM sales) "
+            f"SELECT p.\"SKU编码\", p.\"年月\"{columns} FROM pairs p JOIN skus s USING (\"SKU编码\") "
+            f"ORDER BY s._first, p.\"年月\" NULLS LAST")
+
+    def close(self):
+        self.con.close()
+
+
+BACKENDS = {'duckdb': DuckDBBackend}
+
+
+def open_backend(name, paths, **options):
+    """按名称创建查询后端"""
+    if name not in BACKENDS:
+        raise ValueError(f"未知的查询后端: {name}，可选: {list(BACKENDS)}")
+    return BACKENDS[name](paths, **options)
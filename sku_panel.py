@@ -0,0 +1,188 @@
+"""
+SKU × 月份 面板
+
+把明细数据一次性聚合成稠密的 SKU × 月份 NumPy 矩阵（月份轴排序后按整数编码），
+利润分析和月度对比共用同一个面板，环比、下降检测都变成整体数组运算，
+不再按 SKU 逐个过滤 DataFrame。
+"""
+import numpy as np
+import pandas as pd
+
+# 面板字段 -> 原始数据列名
+PANEL_MEASURES = {
+    'sales': '销售金额',
+    'profit': '利润',
+    'units': '销售个数',
+    'orders': '订单数',
+}
+
+
+class SkuMonthPanel:
+    """SKU × 月份 稠密面板"""
+
+    def __init__(self, skus, names, months, present, measures):
+        self.skus = skus            # pd.Index, 行轴
+        self.names = names          # np.ndarray, 每个SKU最近月份的商品名称
+        self.months = months        # list[str], 排序后的月份轴，位置即月份编码
+        self.present = present      # bool 矩阵, 该 SKU 当月是否有记录
+        self.measures = measures    # {字段: float64 矩阵}
+
+    @property
+    def sales(self):
+        return self.measures.get('sales')
+
+    @property
+    def profit(self):
+        return self.measures.get('profit')
+
+    @property
+    def units(self):
+        return self.measures.get('units')
+
+    @property
+    def orders(self):
+        return self.measures.get('orders')
+
+    @property
+    def shape(self):
+        return self.present.shape
+
+    @classmethod
+    def from_frame(cls, df, sku_col='SKU编码', month_col='年月', name_col='商品名称'):
+        """
+        从明细（或已按 SKU×月份 聚合的）数据构建面板
+
+        订单数列不存在时，orders 记为记录行数
+        """
+        agg_spec = {field: (col, 'sum') for field, col in PANEL_MEASURES.items() if col in df.columns}
+        if 'orders' not in agg_spec:
+            agg_spec['orders'] = (sku_col, 'size')
+        if name_col in df.columns:
+            agg_spec['name'] = (name_col, 'last')
+
+        grouped = df.groupby([sku_col, month_col], observed=True, sort=False).agg(**agg_spec)
+
+        sku_codes, skus = pd.factorize(grouped.index.get_level_values(0), sort=True)
+        month_values = grouped.index.get_level_values(1)
+        months = sorted(pd.unique(month_values))
+        month_codes = pd.Index(months).get_indexer(month_values)
+
+        shape = (len(skus), len(months))
+        present = np.zeros(shape, dtype=bool)
+        present[sku_codes, month_codes] = True
+
+        measures = {}
+        for field in PANEL_MEASURES:
+            if field in grouped.columns:
+                matrix = np.zeros(shape, dtype=np.float64)
+                matrix[sku_codes, month_codes] = grouped[field].to_numpy(dtype=np.float64, na_value=0.0)
+                measures[field] = matrix
+
+        # 商品名称取每个SKU最近一个月份的记录
+        names = np.full(len(skus), None, dtype=object)
+        if 'name' in grouped.columns:
+            order = np.lexsort((month_codes, sku_codes))
+            names[sku_codes[order]] = grouped['name'].to_numpy()[order]
+
+        return cls(skus, names, months, present, measures)
+
+    def last_two(self):
+        """
+        每个SKU最近两个有记录的月份
+
+        返回 (rows, current, previous)：至少有两个月记录的SKU行号，
+        以及对应的当前月份、上一个有记录月份的列号
+        """
+        n_months = self.present.shape[1]
+        if n_months < 2:
+            empty = np.array([], dtype=np.intp)
+            return empty, empty, empty
+
+        rows = np.arange(self.present.shape[0])
+        current = n_months - 1 - self.present[:, ::-1].argmax(axis=1)
+
+        earlier = self.present.copy()
+        earlier[rows, current] = False
+        has_previous = earlier.any(axis=1)
+        previous = n_months - 1 - earlier[:, ::-1].argmax(axis=1)
+
+        return rows[has_previous], current[has_previous], previous[has_previous]
+
+    def monthly_totals(self):
+        """按月汇总（列名与原始字段一致），SKU编码 为当月有记录的SKU数"""
+        totals = {PANEL_MEASURES[field]: matrix.sum(axis=0) for field, matrix in self.measures.items()
+                  if field != 'orders'}
+        totals['SKU编码'] = self.present.sum(axis=0)
+        totals['订单数'] = self.measures['orders'].sum(axis=0)
+        return pd.DataFrame(totals, index=pd.Index(self.months, name='年月'))
+
+
+def pct_change(current, previous, fill=0.0):
+    """变化率（%），上月为 0 时取 fill"""
+    current = np.asarray(current, dtype=np.float64)
+    previous = np.asarray(previous, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        change = (current - previous) / previous * 100
+    return np.where(previous != 0, change, fill).round(2)
+
+
+def column_pct_change(values):
+    """按月份轴的环比（%），与 Series.pct_change 一致：首月为 NaN"""
+    values = np.asarray(values, dtype=np.float64)
+    result = np.full(values.shape, np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result[1:] = (values[1:] - values[:-1]) / values[:-1] * 100
+    return result.round(2)
+
+
+def build_profit_comparison(panel):
+    """SKU 利润/销售额 最近两个月对比表"""
+    rows, cur, prev = panel.last_two()
+    months = np.asarray(panel.months, dtype=object)
+    profit, sales = panel.profit, panel.sales
+
+    cur_profit, prev_profit = profit[rows, cur].round(2), profit[rows, prev].round(2)
+    cur_sales, prev_sales = sales[rows, cur].round(2), sales[rows, prev].round(2)
+
+    return pd.DataFrame({
+        'SKU编码': panel.skus[rows],
+        '商品名称': panel.names[rows],
+        '当前月份': months[cur],
+        '上月月份': months[prev],
+        '当前利润': cur_profit,
+        '上月利润': prev_profit,
+        '利润变化': cur_profit - prev_profit,
+        '利润变化率%': pct_change(cur_profit, prev_profit),
+        '当前销售额': cur_sales,
+        '上月销售额': prev_sales,
+        '销售额变化': cur_sales - prev_sales,
+        '销售额变化率%': pct_change(cur_sales, prev_sales),
+    })
+
+
+def detect_sales_drops(panel, drop_threshold):
+    """
+    最近月份销售额环比下降超过阈值（%）的SKU
+
+    上月销售额为 0 或负数时按 -100% 处理（与原逻辑一致）
+    """
+    rows, cur, prev = panel.last_two()
+    months = np.asarray(panel.months, dtype=object)
+    cur_sales = panel.sales[rows, cur]
+    prev_sales = panel.sales[rows, prev]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        change = np.where(prev_sales > 0, (cur_sales - prev_sales) / prev_sales * 100, -100.0)
+    dropped = change <= -drop_threshold
+
+    drops = pd.DataFrame({
+        'SKU编码': panel.skus[rows][dropped],
+        '商品名称': panel.names[rows][dropped],
+        '当前月份': months[cur][dropped],
+        '当前销售额': cur_sales[dropped],
+        '上月销售额': prev_sales[dropped],
+        '销售额下降%': change[dropped].round(2),
+        '下降程度': np.where(change[dropped] <= -50, '严重', '明显'),
+    })
+    # 行按SKU编码排列，索引为该顺序下的位置，排序方式与原逻辑相同（保留索引）
+    return drops.sort_values('销售额下降%')
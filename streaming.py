@@ -0,0 +1,159 @@
+"""
+流式聚合
+
+分块读取明细数据时，只保留 (SKU编码, 商品名称, 小分类, 年月) 粒度的可合并部分聚合，
+峰值内存取决于 SKU×月份 的组合数，而不是明细行数。
+小分类 / 年月 维度的汇总、SKU 去重计数、最后销售月份都可以从该粒度精确得到，
+各分析模块直接在合并后的聚合表上运行。
+每组记录第一条明细的行号（跨块、跨文件连续编号），库存字段取该行的值，
+聚合表按该行号排列，"第一次出现"的语义与全量明细一致（滞销清单的明细字段、SKU 顺序）。
+开启近似去重时，同时按 小分类 / 年月 逐块累积可合并的 HyperLogLog 草图。
+"""
+import numpy as np
+import pandas as pd
+
+from distinct_sketch import GroupedSketch, register_codes
+
+GRAIN_COLUMNS = ['SKU编码', '商品名称', '小分类', '年月']
+SUM_COLUMNS = ['销售金额', '利润', '销售个数', '销售计划', '订单数']
+FIRST_COLUMNS = ['在库数量', '在库金额']
+SKETCH_DIMENSIONS = ['小分类', '年月']
+ROW_COLUMN = '_row'  # 每组第一条明细的行号
+
+
+def _take_first(grouped, result, columns):
+    """每组第一行的值（缺失也照取，不跳到后面的非空值）"""
+    for col in columns:
+        result[col] = grouped[col].first(skipna=False).to_numpy()
+
+
+def aggregate_chunk(chunk, start=0):
+    """
+    把一个已清洗的数据块聚合到 SKU×月份 粒度
+
+    start: 该块第一行的行号；结果按每组第一行的行号排列
+    """
+    keys = [col for col in GRAIN_COLUMNS if col in chunk.columns]
+    chunk = chunk.assign(**{ROW_COLUMN: np.arange(start, start + len(chunk), dtype=np.int64)})
+    grouped = chunk.groupby(keys, dropna=False, observed=True, sort=False)
+    result = grouped[[col for col in SUM_COLUMNS if col in chunk.columns]].sum()
+    _take_first(grouped, result, [col for col in FIRST_COLUMNS if col in chunk.columns])
+    result['记录数'] = grouped.size().to_numpy()
+    _take_first(grouped, result, [ROW_COLUMN])
+    return result
+
+
+def merge_partials(partials):
+    """合并多个部分聚合结果（求和列相加，库存列和行号取明细中最早出现的一份，结果按行号排列）"""
+    combined = pd.concat(partials)
+    combined = combined.iloc[np.argsort(combined[ROW_COLUMN].to_numpy(), kind='stable')]
+    levels = list(range(combined.index.nlevels))
+    grouped = combined.groupby(level=levels, dropna=False, observed=True, sort=False)
+    firsts = [col for col in combined.columns if col in FIRST_COLUMNS or col == ROW_COLUMN]
+    result = grouped[[col for col in combined.columns if col not in firsts]].sum()
+    _take_first(grouped, result, firsts)
+    return result[list(combined.columns)]
+
+
+class SalesPartials:
+    """可合并的流式部分聚合"""
+
+    def __init__(self, compact_every=8, sketch_precision=None):
+        self.compact_every = compact_every
+        self.sketch_precision = sketch_precision  # 为 None 时不累积去重草图
+        self.sketches = {}  # 维度 -> GroupedSketch（去重SKU数）
+        self.rows = 0
+        self.chunks = 0
+        self.next_row = 0  # 下一条明细的行号（去掉部分月份后也不回退，之后合并的明细始终排在后面）
+        self._merged = None
+        self._pending = []
+
+    @classmethod
+    def from_result(cls, result, rows=None, chunks=0, next_row=None):
+        """从已保存的部分聚合（result() 或其 reset_index() 结果）恢复"""
+        partials = cls()
+        keys = [col for col in GRAIN_COLUMNS if col in result.columns]
+        if keys:
+            result = result.set_index(keys)
+        partials._merged = result
+        partials.rows = int(result['记录数'].sum()) if rows is None else rows
+        partials.chunks = chunks
+        partials.next_row = partials.rows if next_row is None else next_row
+        return partials
+
+    def add_chunk(self, chunk):
+        """加入一个已清洗的数据块"""
+        self._pending.append(aggregate_chunk(chunk, start=self.next_row))
+        self.rows += len(chunk)
+        self.next_row += len(chunk)
+        self.chunks += 1
+        if self.sketch_precision:
+            self._update_sketches(chunk)
+        if len(self._pending) >= self.compact_every:
+            self._compact()
+
+    def _update_sketches(self, chunk):
+        codes = register_codes(chunk['SKU编码'], self.sketch_precision)
+        for dimension in SKETCH_DIMENSIONS:
+            if dimension in chunk.columns:
+                sketch = GroupedSketch.from_values(chunk[dimension], chunk['SKU编码'], self.sketch_precision,
+                                                   codes=codes)
+                self._merge_sketch(dimension, sketch)
+
+    def _merge_sketch(self, dimension, sketch):
+        if dimension in self.sketches:
+            self.sketches[dimension].merge(sketch)
+        else:
+            self.sketches[dimension] = GroupedSketch.empty(sketch.precision).merge(sketch)
+
+    def merge(self, other):
+        """合并另一个 SalesPartials（例如多进程分别处理的文件），other 的明细排在已有明细之后"""
+        result = other.result()
+        if result is not None:
+            result = result.assign(**{ROW_COLUMN: result[ROW_COLUMN] + self.next_row})
+            self._pending.append(result)
+        self.rows += other.rows
+        self.next_row += other.next_row
+        self.chunks += other.chunks
+        self._compact()
+        for dimension, sketch in other.sketches.items():
+            self._merge_sketch(dimension, sketch)
+        return self
+
+    def _compact(self):
+        frames = ([self._merged] if self._merged is not None else []) + self._pending
+        if frames:
+            self._merged = merge_partials(frames) if len(frames) > 1 else frames[0]
+        self._pending = []
+
+    def result(self):
+        """合并后的部分聚合（以 GRAIN_COLUMNS 为索引）"""
+        self._compact()
+        return self._merged
+
+    def to_frame(self):
+        """
+        展开为 SKU×月份 粒度的 DataFrame，可直接交给各分析模块
+
+        原始数据没有订单数时，用记录数代替；各组按第一条明细的行号排列，
+        行顺序与分块方式、合并顺序无关，SKU 第一次出现的顺序和明细字段与全量明细一致
+        """
+        result = self.result()
+        frame = result.iloc[np.argsort(result[ROW_COLUMN].to_numpy(), kind='stable')].reset_index()
+        frame = frame.drop(columns=ROW_COLUMN)
+        if '订单数' not in frame.columns:
+            frame['订单数'] = frame['记录数']
+        return frame
+
+    def category_month_totals(self):
+        """小分类×月份 汇总（含记录数和去重SKU数）"""
+        frame = self.to_frame()
+        sums = [col for col in SUM_COLUMNS + ['记录数'] if col in frame.columns]
+        grouped = frame.groupby(['小分类', '年月'], observed=True)
+        totals = grouped[sums].sum()
+        totals['SKU数'] = grouped['SKU编码'].nunique()
+        return totals.sort_index()
+
+    def last_sale_month(self):
+        """每个SKU的最后销售月份"""
+        return self.to_frame().groupby('SKU编码', observed=True)['年月'].max()
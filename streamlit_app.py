@@ -1,5 +1,6 @@
 import os
 os.environ['MPLBACKEND']='Agg'
+import json
 import streamlit as st
 import pandas as pd
 import numpy as np
@@ -50,6 +51,16 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 # 将当前目录添加到sys.path的最前面
 sys.path.insert(0, current_dir)
 
+from dashboard_cache import LRUCache, LazyResults, content_hash
+from chart_data import (TABLE_PAGE_SIZE, downsample_line, histogram_bins, page_count, payload_kb, table_page,
+                        top_categories)
+from data_cube import ANALYSIS_OPTIONS, ANALYSIS_REQUIREMENTS, CUBE_COLUMNS, SalesCube
+from data_loader import TEXT_COLUMNS, column_filter, compact_dtypes, read_csv_once, read_xlsx
+from disk_cache import FrameCache
+from distinct_sketch import DEFAULT_ERROR
+from profiling import StageProfiler, compare_profiles, count_rows
+from xlsx_reader import sheet_names
+
 # 显示调试信息
 st.write("## 调试信息")
 st.write(f"当前目录: {current_dir}")
@@ -73,14 +84,13 @@ except ImportError as e:
 
 # 完全独立的销售分析仪表板 - 不依赖任何外部模块
 class BuiltInAnalyzer:
-    """内置分析器 - 替代所有外部模块"""
+    """内置分析器 - 上传数据的预处理（各项分析由 SalesCube 在预聚合单元上完成）"""
 
     def __init__(self):
-        self.df = None
-        self.analysis_results = {}
+        self.memory_report = None
 
-    def preprocess_data(self, df):
-        """数据预处理"""
+    def preprocess_data(self, df, compact=False):
+        """数据预处理（compact=True 时维度列转 category、计数列转 int32）"""
         df_clean = df.copy()
 
         # 处理日期字段
@@ -96,9 +106,9 @@ class BuiltInAnalyzer:
             if col in df_clean.columns:
                 df_clean[col] = pd.to_numeric(df_clean[col], errors='coerce')
 
-        # 修复 Arrow 兼容性问题
+        # 修复 Arrow 兼容性问题（紧凑模式下维度列转为 category，同样兼容 Arrow）
         for col in df_clean.columns:
-            if df_clean[col].dtype == 'object':
+            if df_clean[col].dtype == 'object' and not (compact and col in TEXT_COLUMNS):
                 df_clean[col] = df_clean[col].astype(str)
 
         # 提取年月信息
@@ -108,150 +118,10 @@ class BuiltInAnalyzer:
             current_month = datetime.now().strftime("%Y-%m")
             df_clean['年月'] = current_month
 
-        return df_clean
-
-    def run_all_analysis(self, df):
-        """执行所有分析"""
-        self.df = df
-        self.analysis_results = {}
-
-        # 基础统计分析
-        self.run_basic_analysis()
-
-        # 分类分析
-        if '小分类' in self.df.columns:
-            self.run_category_analysis()
-
-        # 月度分析
-        if '年月' in self.df.columns:
-            self.run_monthly_analysis()
-
-        # 产品分析
-        self.run_product_analysis()
-
-        # 滞销分析
-        self.run_unsold_analysis()
-
-        return self.analysis_results
-
-    def run_basic_analysis(self):
-        """基础统计分析"""
-        basic_stats = {}
-
-        if '销售金额' in self.df.columns:
-            basic_stats['总销售额'] = self.df['销售金额'].sum()
-            basic_stats['平均销售额'] = self.df['销售金额'].mean()
-            basic_stats['最大销售额'] = self.df['销售金额'].max()
-
-        if '利润' in self.df.columns:
-            basic_stats['总利润'] = self.df['利润'].sum()
-            basic_stats['平均利润'] = self.df['利润'].mean()
-            if basic_stats.get('总销售额', 0) > 0:
-                basic_stats['平均利润率'] = (basic_stats['总利润'] / basic_stats['总销售额'] * 100)
-
-        if 'SKU编码' in self.df.columns:
-            basic_stats['SKU总数'] = self.df['SKU编码'].nunique()
-
-        self.analysis_results['basic_stats'] = basic_stats
-
-    def run_category_analysis(self):
-        """分类分析"""
-        category_analysis = self.df.groupby('小分类').agg({
-            '销售金额': 'sum',
-            '利润': 'sum',
-            'SKU编码': 'nunique'
-        }).round(2)
-
-        # 计算利润率
-        if '销售金额' in category_analysis.columns and '利润' in category_analysis.columns:
-            category_analysis['利润率'] = (category_analysis['利润'] / category_analysis['销售金额'] * 100).round(2)
-
-        category_analysis = category_analysis.sort_values('销售金额', ascending=False)
-        self.analysis_results['category_analysis'] = category_analysis
-
-    def run_monthly_analysis(self):
-        """月度分析"""
-        monthly_analysis = self.df.groupby('年月').agg({
-            '销售金额': 'sum',
-            '利润': 'sum',
-            'SKU编码': 'nunique'
-        }).round(2)
-
-        # 计算环比
-        monthly_analysis = monthly_analysis.sort_index()
-        for col in ['销售金额', '利润']:
-            if col in monthly_analysis.columns:
-                monthly_analysis[f'{col}_环比%'] = monthly_analysis[col].pct_change() * 100
-                monthly_analysis[f'{col}_环比%'] = monthly_analysis[f'{col}_环比%'].round(2)
-
-        self.analysis_results['monthly_analysis'] = monthly_analysis
-
-    def run_product_analysis(self):
-        """产品分析"""
-        if 'SKU编码' not in self.df.columns:
-            return
-
-        # 热销产品
-        product_sales = self.df.groupby('SKU编码').agg({
-            '销售金额': 'sum',
-            '利润': 'sum',
-            '销售个数': 'sum'
-        }).round(2).sort_values('销售金额', ascending=False)
-
-        # 计算产品利润率
-        if '销售金额' in product_sales.columns and '利润' in product_sales.columns:
-            product_sales['利润率'] = (product_sales['利润'] / product_sales['销售金额'] * 100).round(2)
-
-        self.analysis_results['product_analysis'] = product_sales.head(20)
-
-    def run_unsold_analysis(self):
-        """滞销产品分析"""
-        if '年月' not in self.df.columns or 'SKU编码' not in self.df.columns:
-            return
-
-        # 获取月份范围
-        months = sorted(self.df['年月'].unique())
-        if len(months) < 2:
-            return
-
-        # 检查最近3个月的销售情况
-        recent_months = months[-3:] if len(months) >= 3 else months
-        all_skus = self.df['SKU编码'].unique()
-
-        # 找出在最近几个月有销售的SKU
-        recent_sales = self.df[self.df['年月'].isin(recent_months)]
-        sold_skus = recent_sales['SKU编码'].unique()
-
-        # 找出滞销SKU
-        unsold_skus = list(set(all_skus) - set(sold_skus))
-
-        # 获取滞销SKU的详细信息
-        if unsold_skus:
-            unsold_details = self.df[self.df['SKU编码'].isin(unsold_skus)][
-                ['SKU编码', '商品名称', '小分类', '在库数量', '在库金额']
-            ].drop_duplicates('SKU编码')
+        if compact:
+            df_clean, self.memory_report = compact_dtypes(df_clean)
 
-            # 计算最后一次销售时间
-            last_sales = self.df.groupby('SKU编码')['年月'].max().reset_index()
-            last_sales.columns = ['SKU编码', '最后销售月份']
-
-            unsold_details = unsold_details.merge(last_sales, on='SKU编码', how='left')
-
-            # 计算滞销月数
-            current_month = months[-1]
-            unsold_details['滞销月数'] = unsold_details['最后销售月份'].apply(
-                lambda x: len(months) - months.index(x) - 1 if x in months else len(months)
-            )
-
-            # 按滞销月数排序
-            unsold_details = unsold_details.sort_values(['滞销月数', '在库金额'], ascending=[False, False])
-
-            self.analysis_results['unsold_analysis'] = {
-                'unsold_products': unsold_details,
-                'total_skus': len(all_skus),
-                'sold_skus': len(sold_skus),
-                'unsold_skus': len(unsold_skus)
-            }
+        return df_clean
 
 
 class SalesDashboard:
@@ -259,9 +129,23 @@ class SalesDashboard:
 
     def __init__(self):
         self.df = None
-        self.filtered_df = None
+        self.cube = None
+        self.filtered_cube = None
+        self.filter_key = None
+        self.data_key = None
+        self.analysis_options = {}
         self.analyzer = BuiltInAnalyzer()
         self.analysis_results = {}
+        # 本次 rerun 的阶段性能记录
+        self.profiler = StageProfiler(label='dashboard')
+        # 本次 rerun 发送到浏览器的图表 / 表格数据量
+        self.payloads = []
+
+    def get_cache(self):
+        """会话级 LRU 缓存（保存在 session_state 中，跨 rerun 复用）"""
+        if 'dashboard_cache' not in st.session_state:
+            st.session_state['dashboard_cache'] = LRUCache()
+        return st.session_state['dashboard_cache']
 
     def run(self):
         """运行仪表板"""
@@ -326,28 +210,102 @@ class SalesDashboard:
             with st.expander("📁 文件信息", expanded=False):
                 st.json(file_details)
 
-            # 读取数据
-            with st.spinner("📥 读取数据文件中..."):
-                if uploaded_file.name.endswith('.csv'):
-                    # 尝试多种编码
-                    encodings = ['utf-8', 'utf-8-sig', 'gbk', 'gb2312']
-                    for encoding in encodings:
-                        try:
-                            uploaded_file.seek(0)  # 重置文件指针
-                            self.df = pd.read_csv(uploaded_file, encoding=encoding)
-                            st.success(f"使用编码: {encoding}")
-                            break
-                        except UnicodeDecodeError:
-                            continue
-                    else:
-                        st.error("无法解码CSV文件，请检查文件编码")
-                        return
+            # 读取并预处理数据（按文件内容哈希缓存，同一会话内只解析一次）
+            compact = st.sidebar.checkbox("紧凑内存模式", value=False,
+                                          help="维度列转为分类类型、计数列转为 int32，大文件可显著降低内存")
+            prune = st.sidebar.checkbox("只读取分析字段", value=True,
+                                        help="只读取仪表板用到的列，导出文件列很多时读取更快、内存更低")
+            use_disk_cache = st.sidebar.checkbox("磁盘缓存", value=False,
+                                                 help="把预处理结果写入 SALES_CACHE_DIR 或 ~/.sales_cache，"
+                                                      "下次打开同一文件时直接读取（会在磁盘上保存一份完整数据）")
+            # 多个工作表的 xlsx 可选择读取哪一个（按序号区分缓存）
+            sheet = 0
+            if uploaded_file.name.endswith('.xlsx'):
+                names = sheet_names(uploaded_file)
+                if len(names) > 1:
+                    sheet = names.index(st.sidebar.selectbox("选择工作表", names))
+            self.data_key = (content_hash(uploaded_file), compact, prune, sheet)
+            cache = self.get_cache()
+            upload_key = ('upload',) + self.data_key
+
+            upload = cache.get(upload_key)
+            if upload is None:
+                # 跨会话的磁盘缓存（需开启）：同一文件之前预处理过时直接内存映射打开
+                df, disk_cache = None, None
+                if use_disk_cache:
+                    disk_cache = FrameCache()
+                    variant = ('dashboard_compact' if compact else 'dashboard') + ('_pruned' if prune else '')
+                    variant += f'_sheet{sheet}' if sheet else ''
+                    disk_key = disk_cache.key(self.data_key[0], variant)
+                    with self.profiler.stage('disk_cache_lookup') as stage:
+                        df, meta = disk_cache.get(disk_key)
+                        stage['rows_out'] = None if df is None else len(df)
+
+                if df is not None:
+                    load_info, memory_report = meta.get('load_info'), meta.get('memory_report')
                 else:
-                    self.df = pd.read_excel(uploaded_file)
+                    with st.spinner("📥 读取数据文件中..."):
+                        # xlsx 流式读取时显示已读取的行数
+                        progress_bar = st.progress(0.0) if uploaded_file.name.endswith('.xlsx') else None
 
-            # 数据预处理
-            with st.spinner("🔄 预处理数据..."):
-                self.df = self.analyzer.preprocess_data(self.df)
+                        def report(done, total=None):
+                            progress_bar.progress(min(done / total, 1.0) if total else 0.0,
+                                                  text=f"已读取 {done:,}" + (f" / {total:,}" if total else "") + " 行")
+
+                        try:
+                            with self.profiler.stage('read_upload') as stage:
+                                raw_df, load_info = self.read_upload(uploaded_file,
+                                                                     CUBE_COLUMNS if prune else None, sheet,
+                                                                     report if progress_bar is not None else None)
+                                stage['rows_out'] = len(raw_df)
+                        except UnicodeError:
+                            st.error("无法解码CSV文件，请检查文件编码")
+                            return
+                        except ValueError as e:
+                            # xlsx 的工作表 / 格式问题显示原因；CSV 的其他错误交给外层处理
+                            if progress_bar is None:
+                                raise
+                            st.error(f"Excel文件读取失败: {e}")
+                            return
+                        finally:
+                            if progress_bar is not None:
+                                progress_bar.empty()
+
+                    with st.spinner("🔄 预处理数据..."), \
+                            self.profiler.stage('preprocess', rows_in=len(raw_df)) as stage:
+                        df = self.analyzer.preprocess_data(raw_df, compact=compact)
+                        stage['rows_out'] = len(df)
+                    memory_report = self.analyzer.memory_report if compact else None
+
+                    if disk_cache is not None:
+                        try:
+                            disk_cache.put(disk_key, df, source=uploaded_file.name, load_info=load_info,
+                                           memory_report=memory_report)
+                        except Exception as e:
+                            st.sidebar.caption(f"⚠️ 预处理结果未写入磁盘缓存: {e}")
+
+                # 预聚合立方体：之后的筛选和分析都只汇总立方体单元
+                with st.spinner("🧊 构建数据立方体..."), \
+                        self.profiler.stage('build_cube', rows_in=len(df)) as stage:
+                    cube = SalesCube.from_frame(df)
+                    stage['rows_out'] = len(cube)
+                    upload = cache.put(upload_key, {
+                        'df': df,
+                        'cube': cube,
+                        'load_info': load_info,
+                        'memory_report': memory_report
+                    })
+
+            self.df = upload['df']
+            self.cube = upload['cube']
+            if upload['load_info']:
+                load_info = upload['load_info']
+                st.success(f"使用编码: {load_info['encoding']} "
+                           f"(采样 {load_info['sampled_bytes'] / 1024:.0f} KB)")
+            if upload['memory_report']:
+                memory = upload['memory_report']
+                st.sidebar.caption(f"内存: {memory['before_mb']} MB → {memory['after_mb']} MB "
+                                   f"(节省 {memory['saved_pct']}%)")
 
             # 显示数据预览
             with st.expander("🔍 数据预览", expanded=False):
@@ -369,17 +327,26 @@ class SalesDashboard:
                 st.info("请确保数据包含以下字段: 销售金额, SKU编码")
                 return
 
-            # 执行分析
-            with st.spinner("🔍 执行数据分析..."):
-                self.analysis_results = self.analyzer.run_all_analysis(self.df)
-
-            # 显示分析结果
+            # 显示分析结果（分析在筛选后执行，结果按筛选条件缓存）
             self.display_analysis_results()
 
         except Exception as e:
             st.error(f"处理文件时发生错误: {str(e)}")
             st.info("请检查文件格式是否正确")
 
+    def read_upload(self, uploaded_file, columns=None, sheet_name=0, progress=None):
+        """
+        读取上传文件，返回 (DataFrame, CSV加载信息)；columns 不为 None 时只读取这些字段
+
+        xlsx 流式读取工作表 sheet_name，progress(已读取行数, 预计总行数) 报告进度
+        """
+        uploaded_file.seek(0)
+        if uploaded_file.name.endswith('.csv'):
+            # 按字节样本探测编码，只解析一次
+            return read_csv_once(uploaded_file, usecols=column_filter(columns))
+        return read_xlsx(uploaded_file, columns=columns, sheet_name=sheet_name, progress=progress,
+                         text_columns=TEXT_COLUMNS), None
+
     def display_analysis_results(self):
         """显示分析结果"""
         # 侧边栏控制
@@ -388,11 +355,12 @@ class SalesDashboard:
         # 数据筛选
         st.sidebar.subheader("数据筛选")
 
+        cache = self.get_cache()
+
         # 日期筛选（如果存在日期字段）
+        date_filter = None
         if '日期' in self.df.columns:
-            date_col = pd.to_datetime(self.df['日期'], errors='coerce')
-            min_date = date_col.min()
-            max_date = date_col.max()
+            min_date, max_date = self.cube.date_bounds()
 
             if not pd.isna(min_date) and not pd.isna(max_date):
                 date_range = st.sidebar.date_input(
@@ -402,28 +370,38 @@ class SalesDashboard:
                     max_value=max_date
                 )
                 if len(date_range) == 2:
-                    mask = (date_col >= pd.to_datetime(date_range[0])) & (date_col <= pd.to_datetime(date_range[1]))
-                    filtered_df = self.df[mask]
-                else:
-                    filtered_df = self.df
-            else:
-                filtered_df = self.df
-        else:
-            filtered_df = self.df
+                    date_filter = (pd.to_datetime(date_range[0]), pd.to_datetime(date_range[1]))
 
-        # 小分类筛选
-        if '小分类' in filtered_df.columns:
-            categories = ['全部'] + sorted(filtered_df['小分类'].dropna().unique().tolist())
+        # 小分类筛选（候选项取日期筛选后的数据）
+        selected_category = '全部'
+        if '小分类' in self.df.columns:
+            categories = ['全部'] + self.cube.slice(date_filter).categories()
             selected_category = st.sidebar.selectbox("选择小分类", categories)
-            if selected_category != '全部':
-                filtered_df = filtered_df[filtered_df['小分类'] == selected_category]
 
-        # 保存筛选后的数据
-        self.filtered_df = filtered_df
+        # 分析选项（作为关键字参数传给立方体的分析方法）
+        approx = st.sidebar.checkbox("近似去重SKU数", value=False,
+                                     help="分类和月度的去重SKU数使用 HyperLogLog 近似，并给出与精确值的误差")
+        self.analysis_options = {'approx_distinct': approx, 'approx_error': DEFAULT_ERROR}
 
-        # 重要：使用筛选后的数据重新执行分析
-        with st.spinner("🔄 根据筛选条件更新分析..."):
-            self.analysis_results = self.analyzer.run_all_analysis(self.filtered_df)
+        self.filter_key = (date_filter, selected_category)
+        self.filtered_cube = None
+
+        # 滞销分析的截止月份（候选项取筛选后数据中的月份，默认最新一个月）
+        months = self.get_filtered_cube().months()
+        if len(months) >= 2:
+            self.analysis_options['as_of'] = st.sidebar.selectbox(
+                "滞销截止月份", months, index=len(months) - 1,
+                help="截至该月最近 3 个月没有销售的SKU视为滞销")
+
+        # 分析结果按模块惰性计算：选中的视图第一次用到某一项时才汇总，
+        # 每一项按 (文件内容, 筛选条件, 结果项, 该项接受的选项) 缓存，条件不变时跨 rerun 复用
+        self.analysis_results = LazyResults(ANALYSIS_REQUIREMENTS, self.compute_analysis, cache,
+                                            prefix=('analysis',) + self.data_key + self.filter_key,
+                                            key_suffix=self.option_key)
+
+        stats = cache.stats()
+        st.sidebar.caption(f"缓存: {stats['entries']} 项 / {stats['size_mb']} MB "
+                           f"(预算 {stats['budget_mb']} MB, 命中 {stats['hits']} 次)")
 
         # 分析模块选择
         analysis_modules = st.sidebar.multiselect(
@@ -432,24 +410,97 @@ class SalesDashboard:
             default=["概览仪表板", "分类分析", "产品分析"]
         )
 
-        # 显示选中的分析模块
-        if "概览仪表板" in analysis_modules:
-            self.display_overview_dashboard()
-
-        if "分类分析" in analysis_modules:
-            self.display_category_analysis()
+        show_performance = st.sidebar.checkbox("显示性能面板", value=False)
 
-        if "月度趋势" in analysis_modules:
-            self.display_monthly_trends()
-
-        if "产品分析" in analysis_modules:
-            self.display_product_analysis()
-
-        if "滞销分析" in analysis_modules:
-            self.display_unsold_analysis()
+        # 显示选中的分析模块（每个模块的渲染记录为一个阶段）
+        module_views = {
+            "概览仪表板": self.display_overview_dashboard,
+            "分类分析": self.display_category_analysis,
+            "月度趋势": self.display_monthly_trends,
+            "产品分析": self.display_product_analysis,
+            "滞销分析": self.display_unsold_analysis,
+            "数据洞察": self.display_data_insights,
+        }
+        for module, view in module_views.items():
+            if module in analysis_modules:
+                with self.profiler.stage(f'render:{module}'):
+                    view()
+
+        self.record_profile()
+        if show_performance:
+            self.display_performance_panel()
+
+    def get_filtered_cube(self):
+        """
+        筛选后的立方体：按 (文件内容, 筛选条件) 缓存并跨 rerun 复用，
+        立方体上的最后销售索引随之复用，只切换滞销截止月份时不重新构建
+        """
+        if self.filtered_cube is None:
+            def slice_cube():
+                with st.spinner("🔄 根据筛选条件更新分析..."), \
+                        self.profiler.stage('filter', rows_in=len(self.cube)) as stage:
+                    cube = self.cube.slice(*self.filter_key)
+                    stage['rows_out'] = len(cube)
+                return cube
+            self.filtered_cube = self.get_cache().get_or_compute(
+                ('cube',) + self.data_key + self.filter_key, slice_cube)
+        return self.filtered_cube
+
+    def option_key(self, key):
+        """某一项结果用到的分析选项（只有接受该选项的项才会因为它变化而重新计算）"""
+        return tuple((name, self.analysis_options[name])
+                     for name in ANALYSIS_OPTIONS.get(key, []) if name in self.analysis_options)
+
+    def compute_analysis(self, key):
+        """计算一项分析结果"""
+        self.get_filtered_cube()
+        with self.profiler.stage(f'analysis:{key}', rows_in=len(self.filtered_cube)) as stage:
+            result = self.filtered_cube.analysis(key, **self.analysis_options)
+            stage['rows_out'] = count_rows(result)
+        return result
+
+    def show_chart(self, fig, name=None):
+        """显示 Plotly 图表并记录数据量"""
+        name = name or fig.layout.title.text or f"图表{len(self.payloads) + 1}"
+        self.payloads.append({'名称': name, '类型': '图表', '数据量KB': payload_kb(fig)})
+        st.plotly_chart(fig, use_container_width=True)
 
-        if "数据洞察" in analysis_modules:
-            self.display_data_insights()
+    def show_table(self, frame, name, page_size=TABLE_PAGE_SIZE):
+        """分页显示表格（只发送当前页）并记录数据量"""
+        pages = page_count(len(frame), page_size)
+        if pages > 1:
+            page = st.number_input(f"{name} 页码", min_value=1, max_value=pages, value=1, key=f"page:{name}")
+            st.caption(f"共 {len(frame):,} 行，第 {page}/{pages} 页（每页 {page_size} 行）")
+            frame = table_page(frame, page, page_size)
+        self.payloads.append({'名称': name, '类型': '表格', '数据量KB': payload_kb(frame)})
+        st.dataframe(frame, use_container_width=True)
+
+    def record_profile(self):
+        """把本次 rerun 的性能记录追加到会话历史（保留最近 20 次）"""
+        history = st.session_state.setdefault('profile_history', [])
+        history.append(self.profiler.to_dict())
+        del history[:-20]
+
+    def display_performance_panel(self):
+        """显示性能面板：本次各阶段耗时、与上一次的对比，并可下载历史记录 JSON"""
+        st.header("⏱️ 性能记录")
+        st.dataframe(self.profiler.to_frame(), use_container_width=True)
+
+        if self.payloads:
+            st.subheader("图表与表格数据量")
+            st.dataframe(pd.DataFrame(self.payloads), use_container_width=True)
+
+        history = st.session_state.get('profile_history', [])
+        if len(history) > 1:
+            st.subheader("与上一次运行对比")
+            st.dataframe(compare_profiles(history[-1], history[-2]), use_container_width=True)
+
+        st.download_button(
+            "下载性能记录 (JSON)",
+            data=json.dumps(history, ensure_ascii=False, indent=2),
+            file_name=f"性能记录_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+            mime="application/json"
+        )
 
     def display_overview_dashboard(self):
         """显示概览仪表板"""
@@ -509,7 +560,7 @@ class SalesDashboard:
                             names=top_categories.index,
                             title="销售额分类分布 (Top 10)"
                         )
-                        st.plotly_chart(fig, use_container_width=True)
+                        self.show_chart(fig)
                     else:
                         st.warning("分类数据格式不正确，无法绘制饼图")
 
@@ -526,10 +577,23 @@ class SalesDashboard:
                             y='销售金额',
                             title="Top 10 热销产品"
                         )
-                        st.plotly_chart(fig, use_container_width=True)
+                        self.show_chart(fig)
                     else:
                         st.warning("产品数据格式不正确，无法绘制条形图")
 
+    def display_distinct_error(self, dimension):
+        """近似去重模式下，显示该维度去重SKU数的理论误差和与精确值的实际误差"""
+        if 'distinct_count_error' not in self.analysis_results:
+            return
+        errors = self.analysis_results['distinct_count_error']
+        errors = errors[errors['维度'] == dimension]
+        if errors.empty:
+            return
+        with st.expander(f"🎯 去重SKU数为近似值（理论误差 ±{errors['理论误差%'].iloc[0]}%）", expanded=False):
+            st.caption(f"实际误差: 平均 {errors['实际误差%'].abs().mean():.3f}%，"
+                       f"最大 {errors['实际误差%'].abs().max():.3f}%")
+            self.show_table(errors.drop(columns='维度'), f"去重误差:{dimension}")
+
     def display_category_analysis(self):
         """显示分类分析"""
         st.header("📈 分类分析")
@@ -545,7 +609,8 @@ class SalesDashboard:
             return
 
         # 分类分析表格
-        st.dataframe(category_data, use_container_width=True)
+        self.show_table(category_data, "分类分析")
+        self.display_distinct_error('小分类')
 
         # 分类可视化
         col1, col2 = st.columns(2)
@@ -562,7 +627,7 @@ class SalesDashboard:
                     color='销售金额'
                 )
                 fig.update_layout(xaxis_tickangle=-45)
-                st.plotly_chart(fig, use_container_width=True)
+                self.show_chart(fig)
             else:
                 st.warning("无法绘制分类销售额图表 - 数据格式问题")
 
@@ -579,7 +644,7 @@ class SalesDashboard:
                         color='利润率'
                     )
                     fig.update_layout(xaxis_tickangle=-45)
-                    st.plotly_chart(fig, use_container_width=True)
+                    self.show_chart(fig)
                 else:
                     st.warning("无法绘制分类利润率图表 - 数据格式问题")
 
@@ -598,7 +663,7 @@ class SalesDashboard:
             return
 
         # 产品分析表格
-        st.dataframe(product_data, use_container_width=True)
+        self.show_table(product_data, "产品分析")
 
         # 产品分析可视化
         col1, col2 = st.columns(2)
@@ -617,7 +682,7 @@ class SalesDashboard:
                     title="产品销售额 vs 利润率 (Top 20)",
                     color='销售金额'
                 )
-                st.plotly_chart(fig, use_container_width=True)
+                self.show_chart(fig)
             else:
                 st.warning("无法绘制产品散点图 - 数据格式问题")
 
@@ -631,7 +696,7 @@ class SalesDashboard:
                     values='销售金额',
                     title="产品销售额分布 (Top 20)"
                 )
-                st.plotly_chart(fig, use_container_width=True)
+                self.show_chart(fig)
             else:
                 st.warning("无法绘制产品树状图 - 数据格式问题")
 
@@ -650,23 +715,25 @@ class SalesDashboard:
             return
 
         # 月度趋势表格
-        st.dataframe(monthly_data, use_container_width=True)
+        self.show_table(monthly_data, "月度趋势")
+        self.display_distinct_error('年月')
 
-        # 月度趋势图表
+        # 月度趋势图表（序列过长时 LTTB 降采样）
         fig = go.Figure()
+        series = downsample_line(monthly_data, [col for col in ['销售金额', '利润'] if col in monthly_data.columns])
 
         fig.add_trace(go.Scatter(
-            x=monthly_data.index,
-            y=monthly_data['销售金额'],
+            x=series['销售金额'].index,
+            y=series['销售金额'],
             mode='lines+markers',
             name='销售额',
             line=dict(color='blue', width=3)
         ))
 
-        if '利润' in monthly_data.columns:
+        if '利润' in series:
             fig.add_trace(go.Scatter(
-                x=monthly_data.index,
-                y=monthly_data['利润'],
+                x=series['利润'].index,
+                y=series['利润'],
                 mode='lines+markers',
                 name='利润',
                 line=dict(color='green', width=3)
@@ -679,7 +746,7 @@ class SalesDashboard:
             hovermode='x unified'
         )
 
-        st.plotly_chart(fig, use_container_width=True)
+        self.show_chart(fig)
 
     def display_product_analysis(self):
         """显示产品分析"""
@@ -696,7 +763,7 @@ class SalesDashboard:
             return
 
         # 产品分析表格
-        st.dataframe(product_data, use_container_width=True)
+        self.show_table(product_data, "产品分析")
 
         # 产品分析可视化
         col1, col2 = st.columns(2)
@@ -711,7 +778,7 @@ class SalesDashboard:
                 title="产品销售额 vs 利润率",
                 color='销售金额'
             )
-            st.plotly_chart(fig, use_container_width=True)
+            self.show_chart(fig)
 
         with col2:
             fig = px.treemap(
@@ -720,7 +787,7 @@ class SalesDashboard:
                 values='销售金额',
                 title="产品销售额分布"
             )
-            st.plotly_chart(fig, use_container_width=True)
+            self.show_chart(fig)
 
     def display_unsold_analysis(self):
         """显示滞销分析"""
@@ -731,6 +798,7 @@ class SalesDashboard:
             return
 
         unsold_data = self.analysis_results['unsold_analysis']
+        st.caption(f"截至 {unsold_data['as_of']}，最近 3 个月没有销售的SKU")
 
         # 滞销概况
         col1, col2, col3 = st.columns(3)
@@ -757,14 +825,16 @@ class SalesDashboard:
         if 'unsold_products' in unsold_data and not unsold_data['unsold_products'].empty:
             st.subheader("滞销产品清单")
             unsold_products = unsold_data['unsold_products']
-            st.dataframe(unsold_products, use_container_width=True)
+            self.show_table(unsold_products, "滞销产品清单")
 
             # 滞销分析可视化
             col1, col2 = st.columns(2)
 
             with col1:
                 if '小分类' in unsold_products.columns:
-                    category_unsold = unsold_products.groupby('小分类').size().reset_index(name='滞销数量')
+                    # 分类过多时只显示滞销数量最多的分类，其余合并为"其他"
+                    category_unsold = top_categories(unsold_products.groupby('小分类', observed=True).size())
+                    category_unsold = category_unsold.rename_axis('小分类').reset_index(name='滞销数量')
                     fig = px.bar(
                         category_unsold,
                         x='小分类',
@@ -772,17 +842,20 @@ class SalesDashboard:
                         title="各分类滞销产品数量"
                     )
                     fig.update_layout(xaxis_tickangle=-45)
-                    st.plotly_chart(fig, use_container_width=True)
+                    self.show_chart(fig)
 
             with col2:
                 if '在库金额' in unsold_products.columns:
-                    fig = px.histogram(
-                        unsold_products,
-                        x='滞销月数',
-                        y='在库金额',
+                    # 服务端预先分箱，只发送每个箱的在库金额合计
+                    bins = histogram_bins(unsold_products['滞销月数'], unsold_products['在库金额'])
+                    fig = px.bar(
+                        bins,
+                        x='区间',
+                        y='值',
+                        labels={'区间': '滞销月数', '值': '在库金额'},
                         title="滞销月数与在库金额分布"
                     )
-                    st.plotly_chart(fig, use_container_width=True)
+                    self.show_chart(fig)
         else:
             st.success("🎉 没有发现滞销产品！")
 
@@ -0,0 +1,173 @@
+"""
+合成销售数据生成器
+
+按 MonthlySalesAnalyzer / BuiltInAnalyzer 使用的销售明细字段生成可复现的测试数据：
+SKU编码, 商品名称, 小分类, 日期, 销售金额, 利润, 销售个数, 在库数量, 在库金额, 销售计划, 订单数
+
+- SKU 销量按 Zipf 分布倾斜（skew=0 为均匀分布）
+- 每个 SKU 固定所属小分类、单价、利润率和月度增长趋势
+- 一部分 SKU 在最后几个月停止销售，用于滞销分析
+- 可按比例注入缺失值
+- 大数据量按块生成并逐块写入，内存占用与总行数无关
+
+用法:
+    python synthetic_data.py <输出文件.csv|.parquet|.feather|.xlsx> <行数> [--skus N] [--months N]
+        [--categories N] [--skew S] [--missing-rate R] [--seed N]
+"""
+import argparse
+import sys
+
+import numpy as np
+import pandas as pd
+
+from excel_export import EXCEL_MAX_ROWS
+
+# 会被注入缺失值的字段（SKU编码 / 销售金额 缺失的行会在预处理时被过滤）
+MISSING_COLUMNS = ['SKU编码', '小分类', '销售金额', '利润', '销售个数', '在库金额']
+
+
+def make_catalog(n_skus, n_months, n_categories=20, skew=1.1, unsold_ratio=0.05, seed=0):
+    """
+    生成 SKU 目录（每个 SKU 的属性和销量权重）
+
+    unsold_ratio: 在最后 3 个月之前停止销售的 SKU 比例
+    """
+    rng = np.random.default_rng([seed, 0])
+    ranks = rng.permutation(n_skus) + 1
+    weights = ranks.astype(np.float64) ** -skew
+    weights /= weights.sum()
+
+    last_month = np.full(n_skus, n_months - 1)
+    if n_months > 3:
+        stopped = rng.random(n_skus) < unsold_ratio
+        last_month[stopped] = rng.integers(0, n_months - 3, stopped.sum())
+
+    category_ids = rng.integers(0, n_categories, n_skus)
+    sku_ids = np.arange(n_skus)
+    return {
+        'sku': np.char.add('SKU', np.char.zfill(sku_ids.astype(str), 7)),
+        'name': np.char.add('商品', np.char.zfill(sku_ids.astype(str), 7)),
+        'category': np.char.add('品类', np.char.zfill(category_ids.astype(str), 2)),
+        'weight': weights,
+        'last_month': last_month,
+        'price': rng.gamma(2.0, 40.0, n_skus).round(2) + 1,
+        'margin': rng.normal(0.18, 0.12, n_skus),
+        'trend': rng.normal(0.0, 0.05, n_skus),
+        'stock': rng.integers(0, 500, n_skus),
+    }
+
+
+def _chunk(catalog, n_rows, months, missing_rate, rng):
+    n_months = len(months)
+    sku_idx = rng.choice(len(catalog['weight']), size=n_rows, p=catalog['weight'])
+    # 只在 SKU 停售月份之前（含）产生销售
+    month_idx = (rng.random(n_rows) * (catalog['last_month'][sku_idx] + 1)).astype(np.int64)
+    month_idx = np.minimum(month_idx, n_months - 1)
+    dates = months.to_timestamp().to_numpy()[month_idx] + rng.integers(0, 28, n_rows).astype('timedelta64[D]')
+
+    units = rng.integers(1, 10, n_rows)
+    growth = (1 + catalog['trend'][sku_idx]) ** month_idx
+    sales = (catalog['price'][sku_idx] * units * growth).round(2)
+    profit = (sales * (catalog['margin'][sku_idx] + rng.normal(0, 0.05, n_rows))).round(2)
+    stock = catalog['stock'][sku_idx]
+
+    df = pd.DataFrame({
+        'SKU编码': catalog['sku'][sku_idx],
+        '商品名称': catalog['name'][sku_idx],
+        '小分类': catalog['category'][sku_idx],
+        '日期': dates,
+        '销售金额': sales,
+        '利润': profit,
+        '销售个数': units.astype(np.float64),
+        '在库数量': stock.astype(np.float64),
+        '在库金额': (stock * catalog['price'][sku_idx] * 0.6).round(2),
+        '销售计划': (sales * rng.normal(1.1, 0.2, n_rows)).round(2),
+        '订单数': rng.integers(1, 4, n_rows).astype(np.float64),
+    })
+
+    if missing_rate > 0:
+        for col in MISSING_COLUMNS:
+            df.loc[rng.random(n_rows) < missing_rate, col] = None
+    return df
+
+
+def iter_sales_chunks(n_rows, n_skus=None, n_months=12, n_categories=20, skew=1.1,
+                      missing_rate=0.0, unsold_ratio=0.05, start='2024-01', seed=0, chunksize=1_000_000):
+    """
+    按块生成销售明细，同样的参数（含 chunksize）总是生成同样的数据
+
+    n_skus: 默认按 行数/50 估算（至少 100）
+    """
+    n_skus = n_skus or max(100, n_rows // 50)
+    months = pd.period_range(start, periods=n_months, freq='M')
+    catalog = make_catalog(n_skus, n_months, n_categories, skew, unsold_ratio, seed)
+
+    for i, offset in enumerate(range(0, n_rows, chunksize)):
+        rng = np.random.default_rng([seed, i + 1])
+        yield _chunk(catalog, min(chunksize, n_rows - offset), months, missing_rate, rng)
+
+
+def generate_sales(n_rows, **params):
+    """生成完整的销售明细 DataFrame（参数同 iter_sales_chunks）"""
+    chunks = list(iter_sales_chunks(n_rows, **params))
+    return chunks[0] if len(chunks) == 1 else pd.concat(chunks, ignore_index=True)
+
+
+def write_sales(path, n_rows, **params):
+    """
+    生成销售明细并写入文件（CSV / Parquet / Feather 逐块写入，xlsx 一次写入）
+
+    返回输出文件路径
+    """
+    if path.endswith('.xlsx'):
+        if n_rows > EXCEL_MAX_ROWS - 1:
+            raise ValueError(f"xlsx 单个工作表最多 {EXCEL_MAX_ROWS - 1} 行数据")
+        generate_sales(n_rows, **params).to_excel(path, index=False)
+        return path
+
+    writer = None
+    try:
+        for i, chunk in enumerate(iter_sales_chunks(n_rows, **params)):
+            if path.endswith('.parquet'):
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(path, table.schema)
+                writer.write_table(table)
+            elif path.endswith('.feather'):
+                import pyarrow as pa
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    writer = pa.ipc.new_file(path, table.schema)
+                writer.write_table(table)
+            else:
+                chunk.to_csv(path, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+    finally:
+        if writer is not None:
+            writer.close()
+    return path
+
+
+def parse_rows(text):
+    """解析行数，支持 10k / 1m 这样的写法"""
+    text = str(text).strip().lower()
+    multiplier = {'k': 1_000, 'm': 1_000_000}.get(text[-1:], 1)
+    return int(float(text.rstrip('km')) * multiplier)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="生成合成销售明细数据")
+    parser.add_argument('output')
+    parser.add_argument('rows', type=parse_rows)
+    parser.add_argument('--skus', type=int, default=None)
+    parser.add_argument('--months', type=int, default=12)
+    parser.add_argument('--categories', type=int, default=20)
+    parser.add_argument('--skew', type=float, default=1.1)
+    parser.add_argument('--missing-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(sys.argv[1:])
+
+    write_sales(args.output, args.rows, n_skus=args.skus, n_months=args.months, n_categories=args.categories,
+                skew=args.skew, missing_rate=args.missing_rate, seed=args.seed)
+    print(f"✅ 已生成: {args.output} ({args.rows} 行)")
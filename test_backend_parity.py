@@ -0,0 +1,49 @@
+"""
+各分析路径与 pandas 路径的一致性测试（pytest）
+
+与 backend_parity.py 相同的检查，数据量较小；缺失率取 0.1，
+保证滞销清单中有第一条明细缺失在库数量 / 金额的 SKU。
+"""
+import contextlib
+import io
+
+import pytest
+
+import backend_parity
+
+N_ROWS = 20_000
+MISSING_RATE = 0.1
+CHUNKSIZE = 3_000
+
+
+def _mismatches(expected, actual):
+    return [(name, detail) for name, ok, detail in backend_parity.compare(expected, actual) if not ok]
+
+
+@pytest.fixture(scope='module', params=['csv', 'parquet', 'feather'])
+def results(request):
+    paths = ['streaming', 'incremental', 'incremental_replace']
+    try:
+        import duckdb  # noqa: F401
+        paths.insert(0, 'backend')
+    except ImportError:
+        pass
+    with contextlib.redirect_stdout(io.StringIO()):
+        expected, actual, _ = backend_parity.run_paths(N_ROWS, fmt=request.param, missing_rate=MISSING_RATE,
+                                                       paths=paths, chunksize=CHUNKSIZE)
+    return expected, actual
+
+
+@pytest.mark.parametrize('path', backend_parity.PATHS)
+def test_matches_pandas(results, path):
+    expected, actual = results
+    if path not in actual:
+        pytest.skip("未安装 duckdb")
+    assert _mismatches(expected, actual[path]) == []
+
+
+def test_unsold_details_compared(results):
+    expected, _ = results
+    unsold = expected['unsold_analysis']['unsold_products']
+    assert len(unsold) > 0
+    assert unsold[['在库数量', '在库金额']].isna().any().any()
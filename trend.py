@@ -0,0 +1,139 @@
+"""
+批量趋势与预测
+
+对 [序列, 月份] 矩阵的每一行同时计算：
+- 最小二乘直线（闭式解，矩阵运算一次完成）：斜率、截距、R²、趋势强度（斜率 / 均值）
+- 可选的指数平滑（Holt 线性趋势，β 为 None 时为简单指数平滑），按月份循环、所有序列一起更新
+- 未来 N 个月的预测
+
+SKU 的序列从第一次有销售的月份开始拟合，之前的月份不参与（新品上市前的 0 不算下降）。
+"""
+import numpy as np
+import pandas as pd
+
+from rules import setting
+
+
+def active_from_first(present):
+    """每行从第一个有记录的月份开始为 True"""
+    return np.logical_or.accumulate(np.asarray(present, dtype=bool), axis=1)
+
+
+def linear_trends(matrix, weights=None):
+    """
+    每行的加权最小二乘直线 y = 截距 + 斜率·x（x 为月份序号 0..M-1）
+
+    weights: 与 matrix 同形状的 0/1（或非负）权重，None 表示所有月份都参与
+    返回 dict: slope, intercept, r2, mean, n（有效月份数），都是长度为行数的数组
+    """
+    y = np.asarray(matrix, dtype=np.float64)
+    w = np.ones_like(y) if weights is None else np.asarray(weights, dtype=np.float64)
+    x = np.arange(y.shape[1], dtype=np.float64)
+
+    n = w.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_mean = (w @ x) / n
+        y_mean = (w * y).sum(axis=1) / n
+        xc = x[None, :] - x_mean[:, None]
+        yc = y - y_mean[:, None]
+        sxx = (w * xc * xc).sum(axis=1)
+        sxy = (w * xc * yc).sum(axis=1)
+        syy = (w * yc * yc).sum(axis=1)
+        slope = np.where(sxx > 0, sxy / sxx, np.nan)
+        r2 = np.where(syy > 0, slope * sxy / syy, np.where(sxx > 0, 1.0, np.nan))
+    return {'slope': slope, 'intercept': y_mean - slope * x_mean, 'r2': r2, 'mean': y_mean, 'n': n}
+
+
+def linear_forecast(fit, n_months, horizon):
+    """直线外推未来 horizon 个月，返回 [序列, horizon] 矩阵"""
+    future = np.arange(n_months, n_months + horizon, dtype=np.float64)
+    return fit['intercept'][:, None] + fit['slope'][:, None] * future[None, :]
+
+
+def exponential_smoothing(matrix, alpha=0.5, beta=0.3, weights=None):
+    """
+    所有行同时做指数平滑（Holt 线性趋势；beta 为 None 时为简单指数平滑）
+
+    weights 为 0 的月份（例如首次销售之前）跳过，不更新水平和趋势
+    返回 (水平, 趋势) 两个长度为行数的数组；趋势在简单指数平滑时为 0
+    """
+    y = np.asarray(matrix, dtype=np.float64)
+    active = np.ones(y.shape, dtype=bool) if weights is None else np.asarray(weights) > 0
+    n_rows, n_cols = y.shape
+    level = np.full(n_rows, np.nan)
+    trend = np.zeros(n_rows)
+    seen = np.zeros(n_rows, dtype=np.int64)
+
+    for t in range(n_cols):
+        obs, on = y[:, t], active[:, t]
+        first = on & (seen == 0)
+        level[first] = obs[first]
+        update = on & (seen > 0)
+        if beta is not None:
+            # 第二个有效月份用两点之差初始化趋势
+            second = update & (seen == 1)
+            trend[second] = obs[second] - level[second]
+        previous = level[update]
+        level[update] = alpha * obs[update] + (1 - alpha) * (previous + trend[update])
+        if beta is not None:
+            trend[update] = beta * (level[update] - previous) + (1 - beta) * trend[update]
+        seen += on
+    return level, trend
+
+
+def smoothing_forecast(level, trend, horizon):
+    """指数平滑外推未来 horizon 个月，返回 [序列, horizon] 矩阵"""
+    steps = np.arange(1, horizon + 1, dtype=np.float64)
+    return level[:, None] + trend[:, None] * steps[None, :]
+
+
+def future_months(months, horizon):
+    """最后一个月份之后的 horizon 个月份标签（YYYY-MM）"""
+    if not months:
+        return [f'+{h}' for h in range(1, horizon + 1)]
+    try:
+        last = pd.Period(months[-1], freq='M')
+    except (ValueError, TypeError):
+        return [f'+{h}' for h in range(1, horizon + 1)]
+    return [str(last + h) for h in range(1, horizon + 1)]
+
+
+def series_trends(matrix, index, months, weights=None, config=None, non_negative=True):
+    """
+    每条序列的趋势与预测表
+
+    matrix: [序列, 月份] 矩阵；index: 序列标签（pd.Index）；months: 月份标签
+    non_negative: 预测值下限为 0（销售额、销量）
+    返回 DataFrame: 斜率, 趋势强度, R2, 方向, 有效月份数, 预测_<月份>...
+    （有效月份数少于 trend_min_months 的序列趋势为 NaN）
+    """
+    method = setting(config, 'trend_method')
+    horizon = setting(config, 'trend_forecast_months')
+    fit = linear_trends(matrix, weights)
+    if method == 'holt':
+        level, slope = exponential_smoothing(matrix, setting(config, 'trend_smoothing_alpha'),
+                                             setting(config, 'trend_smoothing_beta'), weights)
+        forecast = smoothing_forecast(level, slope, horizon)
+    elif method == 'linear':
+        slope = fit['slope']
+        forecast = linear_forecast(fit, len(months), horizon)
+    else:
+        raise ValueError(f"未知的趋势方法: {method}，可选: linear / holt")
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        strength = np.where(fit['mean'] != 0, slope / np.abs(fit['mean']), 0.0)
+    enough = fit['n'] >= setting(config, 'trend_min_months')
+    slope = np.where(enough, slope, np.nan)
+    strength = np.where(enough, strength, np.nan)
+
+    table = pd.DataFrame({'斜率': np.round(slope, 2), '趋势强度': np.round(strength, 4),
+                          'R2': np.round(np.where(enough, fit['r2'], np.nan), 4),
+                          '有效月份数': fit['n'].astype(np.int64)}, index=index)
+    table['方向'] = np.select([strength > 0, strength < 0], ['上升', '下降'], default='平稳')
+    table.loc[~enough, '方向'] = '数据不足'
+    if non_negative:
+        forecast = np.maximum(forecast, 0)
+    forecast = np.where(enough[:, None], forecast, np.nan)
+    for h, label in enumerate(future_months(list(months), horizon)):
+        table[f'预测_{label}'] = np.round(forecast[:, h], 2)
+    return table
@@ -0,0 +1,111 @@
+"""
+SKU 最后销售月份索引
+
+月份排序后一次性编码为整数序号，每个 SKU 在每个月份的"截至该月的最后销售序号"
+预先累积为矩阵，滞销判断和滞销月数都是整体数组运算；
+任意截止月份的滞销查询只取矩阵的一列，不再重新扫描明细。
+"""
+import numpy as np
+import pandas as pd
+
+# 滞销清单的明细字段（取每个SKU在明细中第一次出现的行）
+DETAIL_COLUMNS = ['SKU编码', '商品名称', '小分类', '在库数量', '在库金额']
+
+
+def month_ordinals(values):
+    """
+    把月份列编码为排序后的整数序号
+
+    返回 (序号数组, 排序后的月份列表)，缺失的月份序号为 -1
+    """
+    codes, uniques = pd.factorize(values)
+    labels = np.asarray(uniques, dtype=object)
+    order = np.array(sorted(range(len(labels)), key=labels.__getitem__), dtype=np.intp)
+    rank = np.empty(len(labels), dtype=np.intp)
+    rank[order] = np.arange(len(labels))
+    ordinals = np.where(codes >= 0, rank[np.maximum(codes, 0)], -1) if len(labels) else codes
+    return ordinals, list(labels[order])
+
+
+class LastSaleIndex:
+    """SKU × 月份 的最后销售序号索引"""
+
+    def __init__(self, skus, months, first_rows, last_upto):
+        self.skus = skus                # pd.Index, 按在明细中第一次出现的顺序
+        self.months = months            # list, 排序后的月份，位置即月份序号
+        self.first_rows = first_rows    # 每个SKU第一次出现的行位置
+        self.last_upto = last_upto      # 矩阵 [SKU, 月份序号] -> 截至该月的最后销售序号，-1 表示尚未销售
+
+    @classmethod
+    def from_frame(cls, df, sku_col='SKU编码', month_col='年月'):
+        """从明细（或 SKU×月份 聚合）数据构建索引"""
+        sku_codes, skus = pd.factorize(df[sku_col])
+        ordinals, months = month_ordinals(df[month_col])
+
+        # factorize 按第一次出现的顺序编号：编号首次超过之前最大编号的行即该SKU的第一行
+        seen = np.maximum.accumulate(np.concatenate([[-1], sku_codes]))[:-1]
+        first_rows = np.flatnonzero(sku_codes > seen)
+
+        valid = (sku_codes >= 0) & (ordinals >= 0)
+        dtype = np.int16 if len(months) < np.iinfo(np.int16).max else np.int32
+        last_upto = np.full((len(skus), len(months)), -1, dtype=dtype)
+        last_upto[sku_codes[valid], ordinals[valid]] = ordinals[valid]
+        if len(months):
+            np.maximum.accumulate(last_upto, axis=1, out=last_upto)
+        return cls(skus, months, first_rows, last_upto)
+
+    def ordinal(self, month=None):
+        """月份 -> 序号（None 表示最新月份）"""
+        if month is None:
+            return len(self.months) - 1
+        try:
+            return self.months.index(month)
+        except ValueError:
+            raise ValueError(f"数据中没有月份 {month}，可选: {self.months}") from None
+
+    def recent_months(self, as_of=None, window=3):
+        """截止月份（含）之前的最近 window 个月"""
+        end = self.ordinal(as_of) + 1
+        return self.months[max(0, end - window):end]
+
+    def last_sale(self, as_of=None):
+        """每个SKU截至某月的最后销售序号（-1 表示尚未销售）"""
+        if not self.months:
+            return np.full(len(self.skus), -1, dtype=np.intp)
+        return self.last_upto[:, self.ordinal(as_of)].astype(np.intp)
+
+    def unsold(self, as_of=None, window=3):
+        """
+        截至某月的滞销查询：最近 window 个月（含截止月）没有销售的SKU
+
+        返回 dict: codes（滞销SKU编号，按第一次出现的顺序）, months_since（滞销月数）,
+        last（最后销售序号）, total_skus, sold_skus
+        没有任何有效月份的SKU始终计入总数并视为滞销
+        """
+        end = self.ordinal(as_of)
+        last = self.last_sale(as_of)
+        no_month = self.last_upto[:, -1] < 0 if self.months else np.ones(len(self.skus), dtype=bool)
+        existing = (last >= 0) | no_month
+        sold = (last >= 0) & (last > end - window)
+        codes = np.flatnonzero(existing & ~sold)
+        return {
+            'codes': codes,
+            'months_since': (end - last[codes]).astype(np.int64),
+            'last': last[codes],
+            'total_skus': int(existing.sum()),
+            'sold_skus': int(sold.sum()),
+        }
+
+    def unsold_details(self, df, as_of=None, window=3, columns=DETAIL_COLUMNS):
+        """
+        滞销SKU清单：明细字段取该SKU第一次出现的行，加上 最后销售月份 和 滞销月数
+
+        df 必须是构建索引时使用的同一份数据。返回 (清单, unsold() 的结果)
+        """
+        query = self.unsold(as_of, window)
+        columns = [col for col in columns if col in df.columns]
+        details = df[columns].iloc[self.first_rows[query['codes']]].reset_index(drop=True)
+        details['最后销售月份'] = pd.Index(self.months, dtype=object).take(
+            query['last'], allow_fill=True, fill_value=np.nan)
+        details['滞销月数'] = query['months_since']
+        return details, query
@@ -0,0 +1,500 @@
+"""
+xlsx 流式读取
+
+不经过 openpyxl 的单元格对象：直接从 xlsx（zip）中按流解析工作表 XML，每处理完一行立即释放，
+共享字符串表只读入一次；单元格按表头位置直接写入每列的类型化缓冲区：
+全部为数值的列保存在 array('d') 中（缺失为 NaN），出现文本后该列改为对象列表，
+日期格式的数值按 Excel 序列日期转换为 datetime64。未选中的列只看单元格位置，不解码。
+
+- sheet_names()       工作表名称
+- read_xlsx_stream()  读取整个工作表（可选工作表 / 字段 / 进度回调）
+- iter_xlsx_chunks()  按行数分块读取（流式聚合模式）
+
+安装了 python-calamine 时可用 engine='calamine'（Rust 实现，pandas 的 calamine 引擎）整表读取。
+"""
+import math
+import posixpath
+import re
+import zipfile
+from array import array
+from datetime import datetime
+from xml.etree import ElementTree
+
+import numpy as np
+import pandas as pd
+
+try:
+    import python_calamine  # noqa: F401
+    HAS_CALAMINE = True
+except ImportError:
+    HAS_CALAMINE = False
+
+MAIN_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+PKG_REL_NS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+VALUE, TEXT, RUN = (MAIN_NS + tag for tag in ('v', 't', 'r'))
+INLINE = MAIN_NS + 'is'
+ROOT_TAG_RE = re.compile(rb'<((?:[A-Za-z_][\w.-]*:)?worksheet)\b[^>]*>')
+SHEET_DATA_RE = re.compile(rb'<((?:[A-Za-z_][\w.-]*:)?sheetData)\b[^>]*?(/?)>')
+DIMENSION_RE = re.compile(rb'<(?:[A-Za-z_][\w.-]*:)?dimension\b[^>]*\bref="[A-Z]*\d*:?[A-Z]*(\d+)"')
+READ_BLOCK_BYTES = 1024 * 1024  # 工作表 XML 每次解压、解析的字节数
+
+# 内置的日期 / 时间数字格式编号（含中文区域的 27-36、50-58）
+BUILTIN_DATE_FORMATS = set(range(14, 23)) | set(range(27, 37)) | {45, 46, 47} | set(range(50, 59))
+# 自定义格式中去掉方括号（[h] [m] [s] 除外）、转义字符和引号内的文本后，再判断是否含日期占位符
+FORMAT_STRIP_RE = re.compile(r'\[(?!(?:hh?|mm?|ss?)\])[^\]]*\]|\\.|"[^"]*"')
+DATE_TOKEN_RE = re.compile(r'(?<![_\\])[dmhysDMHYS]')
+# 同 pandas read_excel 默认的缺失值文本
+NA_STRINGS = {'', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+              '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'}
+
+XLSX_ENGINES = ('auto', 'stream', 'calamine')
+DIGITS = '0123456789'
+PROGRESS_EVERY = 50_000  # 每读取多少行回调一次进度
+
+
+def is_date_format(code):
+    """自定义数字格式是否为日期 / 时间格式"""
+    if not code:
+        return False
+    return DATE_TOKEN_RE.search(FORMAT_STRIP_RE.sub('', code.split(';')[0])) is not None
+
+
+def _column_index(ref):
+    """单元格引用（如 'AB12'）的列号，从 0 开始"""
+    index = 0
+    for char in ref:
+        if char.isdigit():
+            break
+        index = index * 26 + ord(char) - 64
+    return index - 1
+
+
+def _resolve(base, target):
+    """关系文件中的 Target 转换为包内路径"""
+    if target.startswith('/'):
+        return target[1:]
+    return posixpath.normpath(posixpath.join(posixpath.dirname(base), target))
+
+
+def _relationships(archive, part):
+    """part 的关系表 {Id: (类型, 包内路径)}"""
+    rels_path = posixpath.join(posixpath.dirname(part), '_rels', posixpath.basename(part) + '.rels')
+    if rels_path not in archive.namelist():
+        return {}
+    root = ElementTree.fromstring(archive.read(rels_path))
+    return {rel.get('Id'): (rel.get('Type', '').rsplit('/', 1)[-1], _resolve(part, rel.get('Target', '')))
+            for rel in root.iter(PKG_REL_NS + 'Relationship')}
+
+
+class XlsxWorkbook:
+    """xlsx 文件的工作簿结构（工作表列表、共享字符串、日期样式），按需解析"""
+
+    def __init__(self, source):
+        """source: 文件路径或可 seek 的二进制文件对象（例如上传的文件）"""
+        if hasattr(source, 'seek'):
+            source.seek(0)
+        self.archive = zipfile.ZipFile(source)
+        self.workbook_part = 'xl/workbook.xml'
+        for rel_type, target in _relationships(self.archive, '').values():
+            if rel_type == 'officeDocument':
+                self.workbook_part = target
+        root = ElementTree.fromstring(self.archive.read(self.workbook_part))
+        rels = _relationships(self.archive, self.workbook_part)
+
+        self.sheets = [(sheet.get('name'), rels[sheet.get(REL_NS + 'id')][1])
+                       for sheet in root.iter(MAIN_NS + 'sheet') if sheet.get(REL_NS + 'id') in rels]
+        properties = root.find(MAIN_NS + 'workbookPr')
+        self.date1904 = properties is not None and properties.get('date1904') in ('1', 'true')
+        parts = {rel_type: target for rel_type, target in rels.values()}
+        self._strings_part = parts.get('sharedStrings')
+        self._styles_part = parts.get('styles')
+        self._strings = None
+        self._date_styles = None
+
+    def close(self):
+        self.archive.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def sheet_names(self):
+        return [name for name, _ in self.sheets]
+
+    def sheet_part(self, sheet_name=0):
+        """工作表的包内路径（sheet_name 为名称或从 0 开始的序号）"""
+        names = self.sheet_names
+        if isinstance(sheet_name, int) and not isinstance(sheet_name, bool):
+            if not 0 <= sheet_name < len(names):
+                raise ValueError(f"工作表序号超出范围: {sheet_name}，共 {len(names)} 个工作表")
+            return self.sheets[sheet_name][1]
+        if sheet_name not in names:
+            raise ValueError(f"工作表不存在: {sheet_name}，可选: {names}")
+        return self.sheets[names.index(sheet_name)][1]
+
+    @property
+    def strings(self):
+        """共享字符串表（缺失值文本替换为 None）"""
+        if self._strings is None:
+            self._strings = []
+            if self._strings_part and self._strings_part in self.archive.namelist():
+                with self.archive.open(self._strings_part) as f:
+                    for _, item in ElementTree.iterparse(f):
+                        if item.tag != MAIN_NS + 'si':
+                            continue
+                        # 富文本由多个 <r><t> 组成；注音 <rPh> 不属于单元格文本
+                        parts = [node.text or '' for node in item if node.tag == TEXT]
+                        parts += [run.findtext(TEXT) or '' for run in item if run.tag == RUN]
+                        text = ''.join(parts)
+                        self._strings.append(None if text in NA_STRINGS else text)
+                        item.clear()
+        return self._strings
+
+    @property
+    def date_styles(self):
+        """数字格式为日期 / 时间的样式编号集合"""
+        if self._date_styles is None:
+            self._date_styles = set()
+            if self._styles_part and self._styles_part in self.archive.namelist():
+                root = ElementTree.fromstring(self.archive.read(self._styles_part))
+                custom = {int(fmt.get('numFmtId')) for fmt in root.iter(MAIN_NS + 'numFmt')
+                          if is_date_format(fmt.get('formatCode'))}
+                cell_formats = root.find(MAIN_NS + 'cellXfs')
+                for i, xf in enumerate([] if cell_formats is None else cell_formats):
+                    fmt_id = int(xf.get('numFmtId', 0))
+                    if fmt_id in BUILTIN_DATE_FORMATS or fmt_id in custom:
+                        self._date_styles.add(str(i))
+        return self._date_styles
+
+    def dimension_rows(self, part):
+        """工作表 <dimension> 声明的行数（用于进度显示，没有声明时返回 None）"""
+        with self.archive.open(part) as f:
+            head = f.read(READ_BLOCK_BYTES)
+        data_tag = SHEET_DATA_RE.search(head)
+        match = DIMENSION_RE.search(head if data_tag is None else head[:data_tag.start()])
+        return int(match.group(1)) if match else None
+
+    def iter_rows(self, part):
+        """
+        逐行产出工作表的 <row> 元素
+
+        解压后的 XML 按块读取，每块截到最后一个 </row>，补上根元素的命名空间声明后整体交给 C 解析器，
+        不为每个单元格产生 Python 层的解析事件；内存只与块大小有关，与行数无关
+        """
+        with self.archive.open(part) as f:
+            buffer = b''
+            data_tag = SHEET_DATA_RE.search(buffer)
+            while data_tag is None:
+                block = f.read(READ_BLOCK_BYTES)
+                if not block:
+                    return
+                buffer += block
+                data_tag = SHEET_DATA_RE.search(buffer)
+            root_tag = ROOT_TAG_RE.search(buffer)
+            if root_tag is None:
+                raise ValueError("无法识别的工作表 XML")
+            if data_tag.group(2):
+                return  # <sheetData/>：空工作表
+            # sheetData 和 row 可能带命名空间前缀（例如 <x:row>）
+            prefix = data_tag.group(1)[:-len(b'sheetData')]
+            opening = root_tag.group(0) + b'<' + data_tag.group(1) + b'>'
+            data_end, row_end = b'</' + data_tag.group(1) + b'>', b'</' + prefix + b'row>'
+            closing = data_end + b'</' + root_tag.group(1) + b'>'
+            buffer = buffer[data_tag.end():]
+
+            finished = False
+            while not finished:
+                block = f.read(READ_BLOCK_BYTES)
+                buffer += block
+                end = buffer.find(data_end)
+                if end >= 0:
+                    segment, buffer, finished = buffer[:end], b'', True
+                elif not block:
+                    raise ValueError("工作表 XML 不完整")
+                else:
+                    cut = buffer.rfind(row_end)
+                    if cut < 0:
+                        continue
+                    cut += len(row_end)
+                    segment, buffer = buffer[:cut], buffer[cut:]
+                if segment.strip():
+                    yield from ElementTree.fromstring(opening + segment + closing)[0]
+
+
+class _ColumnBuffer:
+    """一列的类型化缓冲区：全部为数值时保存在 array('d')（缺失为 NaN），出现文本后改为对象列表"""
+
+    __slots__ = ('numbers', 'objects', 'filled', 'dates', 'as_text')
+
+    def __init__(self, as_text=False):
+        self.numbers = array('d')
+        self.objects = [] if as_text else None
+        self.filled = 0  # 非缺失的数值个数
+        self.dates = 0  # 其中日期格式的个数
+        self.as_text = as_text  # 数值也按文本保存（例如 SKU编码）
+
+    def __len__(self):
+        return len(self.numbers) if self.objects is None else len(self.objects)
+
+    def append_missing(self, n):
+        if self.objects is None:
+            self.numbers.extend(array('d', [math.nan]) * n)
+        else:
+            self.objects.extend([math.nan] * n)
+
+    def to_objects(self, date1904):
+        """切换为对象列表（缺失为 NaN）：已有的数值若全部为日期格式则转为 datetime，整数值转为 int"""
+        values = self.finish(date1904)
+        self.objects = [math.nan if value is pd.NaT else _plain_number(value) for value in values.tolist()]
+        self.numbers = array('d')
+
+    def finish(self, date1904):
+        """缓冲区转换为 numpy 数组 / 对象列表"""
+        if self.objects is not None:
+            return self.objects
+        values = np.frombuffer(self.numbers, dtype=np.float64) if len(self.numbers) else np.empty(0)
+        if self.filled and self.dates == self.filled:
+            return serial_to_datetime(values, date1904)
+        if self.filled == len(values) and self.filled and np.array_equal(values, np.floor(values)) \
+                and np.abs(values).max() < 2 ** 53:
+            # 没有缺失且都是整数时同 pandas read_excel，结果为 int64
+            return values.astype(np.int64)
+        return values.copy()
+
+
+def _plain_number(value):
+    """对象列中的整数值转为 int（同 pandas read_excel）"""
+    if value.__class__ is float and value.is_integer():
+        return int(value)
+    return value
+
+
+def serial_to_datetime(values, date1904=False):
+    """Excel 序列日期（天数，可带小数）转换为 datetime64（取整到毫秒），1900 日期系统的 1900-03-01 之前按闰年错误修正"""
+    values = np.asarray(values, dtype=np.float64)
+    if date1904:
+        epoch = np.datetime64('1904-01-01', 'us')
+    else:
+        epoch = np.datetime64('1899-12-30', 'us')
+        values = np.where((values > 0) & (values < 60), values + 1, values)
+    with np.errstate(invalid='ignore'):
+        millis = np.round(values * 86_400_000)
+    result = epoch + np.where(np.isnan(millis), 0, millis).astype(np.int64).astype('timedelta64[ms]')
+    return pd.to_datetime(np.where(np.isnan(millis), np.datetime64('NaT'), result))
+
+
+def _header_names(values):
+    """表头文本，空表头为 'Unnamed: i'，重复表头加 '.1' '.2' 后缀（同 pandas）"""
+    names, seen = [], {}
+    for i, value in enumerate(values):
+        name = f'Unnamed: {i}' if value is None else value
+        if isinstance(name, float) and name.is_integer():
+            name = int(name)
+        count = seen.get(name, 0)
+        seen[name] = count + 1
+        names.append(name if count == 0 else f'{name}.{count}')
+    return names
+
+
+def _cell_value(cell, strings, date_styles):
+    """
+    解码一个单元格，返回 (取值, 是否日期格式的数值)
+
+    数值为 float，共享 / 内联字符串为 str（缺失值文本为 None），布尔为 bool，错误值为 None
+    """
+    kind = cell.get('t')
+    if kind == 's':
+        text = cell.findtext(VALUE)
+        return (strings[int(text)] if text is not None else None), False
+    if kind is None or kind == 'n':
+        text = cell.findtext(VALUE)
+        if text is None:
+            return None, False
+        return float(text), cell.get('s') in date_styles
+    if kind == 'inlineStr':
+        node = cell.find(INLINE)
+        text = '' if node is None else ''.join(t.text or '' for t in node.iter(TEXT))
+        return (None if text in NA_STRINGS else text), False
+    if kind == 'str':
+        text = cell.findtext(VALUE)
+        return (None if text is None or text in NA_STRINGS else text), False
+    if kind == 'b':
+        text = cell.findtext(VALUE)
+        return (None if text is None else text == '1'), False
+    if kind == 'd':
+        text = cell.findtext(VALUE)
+        return (None if not text else datetime.fromisoformat(text)), False
+    # 't="e"'（#N/A、#DIV/0! 等错误值）按缺失处理
+    return None, False
+
+
+def _read_calamine(source, sheet_name, columns, progress, text_columns):
+    """用 pandas 的 calamine 引擎整表读取（无法分块，读取完成后回调一次进度）"""
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    usecols = None if columns is None else (lambda col, wanted=set(columns): col in wanted)
+    df = pd.read_excel(source, sheet_name=sheet_name, usecols=usecols, engine='calamine',
+                       dtype={col: str for col in text_columns or ()})
+    if progress is not None:
+        progress(len(df), len(df))
+    return df
+
+
+def iter_xlsx_chunks(source, chunksize=500_000, columns=None, sheet_name=0, progress=None,
+                     text_columns=None, progress_every=PROGRESS_EVERY):
+    """
+    流式读取 xlsx 工作表，每 chunksize 行产出一个 DataFrame（chunksize 为 None 时整表一个）
+
+    columns: 只读取表头在 columns 中的字段（不存在的字段自动忽略），None 表示全部字段
+    sheet_name: 工作表名称或从 0 开始的序号
+    progress: 进度回调 progress(已读取行数, 预计总行数或 None)
+    text_columns: 按文本读取的字段（数值单元格转为文本，例如 SKU编码 123 -> '123'）
+    每列在各自的块内推断类型；中间的空行输出为缺失值，末尾的空行不输出（同 pandas read_excel）
+    """
+    text_columns = set(text_columns or ())
+    with XlsxWorkbook(source) as workbook:
+        part = workbook.sheet_part(sheet_name)
+        total = workbook.dimension_rows(part) if progress is not None else None
+        if total is not None:
+            total = max(total - 1, 0)
+        strings, date_styles, date1904 = workbook.strings, workbook.date_styles, workbook.date1904
+
+        rows = workbook.iter_rows(part)
+        header_row = next(rows, None)
+        header = {}
+        if header_row is not None:
+            position = -1
+            for cell in header_row:
+                ref = cell.get('r')
+                position = _column_index(ref) if ref else position + 1
+                header[position] = _cell_value(cell, strings, date_styles)[0]
+        width = max(header, default=-1) + 1
+        names = _header_names([header.get(i) for i in range(width)])
+        wanted = None if columns is None else set(columns)
+        # 列号 -> 输出中的位置
+        positions = [i for i, name in enumerate(names) if wanted is None or name in wanted]
+        slots = {position: slot for slot, position in enumerate(positions)}
+        selected = [names[i] for i in positions]
+
+        def new_buffers():
+            return [_ColumnBuffer(name in text_columns) for name in selected]
+
+        def frame(buffers):
+            return pd.DataFrame({name: buffer.finish(date1904) for name, buffer in zip(selected, buffers)},
+                                columns=selected)
+
+        buffers = new_buffers()
+        emitted = False
+        header_number = last_number = int(header_row.get('r') or 1) if header_row is not None else 0
+        pending = 0  # 尚未写入的空行（工作表末尾的空行不输出）
+        next_report = progress_every
+        missing = [None] * len(selected)
+        nan = math.nan
+        column_cache = {}
+        for row in rows:
+            number = row.get('r')
+            number = int(number) if number else last_number + 1
+            # XML 中省略的行是空行
+            pending += number - last_number - 1
+            last_number = number
+            values, dates = list(missing), 0
+            position, present = -1, False
+            for cell in row:
+                ref = cell.get('r')
+                if ref is None:
+                    position += 1
+                else:
+                    letters = ref.rstrip(DIGITS)
+                    position = column_cache.get(letters)
+                    if position is None:
+                        position = column_cache[letters] = _column_index(letters)
+                slot = slots.get(position)
+                if slot is None:
+                    continue
+                # 共享字符串和数值是绝大多数单元格，直接解码；其余类型交给 _cell_value
+                kind = cell.get('t')
+                if kind == 's':
+                    text = cell.findtext(VALUE)
+                    value = None if text is None else strings[int(text)]
+                elif kind is None:
+                    text = cell.findtext(VALUE)
+                    if text is None:
+                        continue
+                    value = float(text)
+                    if cell.get('s') in date_styles:
+                        dates |= 1 << slot
+                else:
+                    value, is_date = _cell_value(cell, strings, date_styles)
+                    if is_date:
+                        dates |= 1 << slot
+                if value is None:
+                    continue
+                present = True
+                values[slot] = value
+            if progress is not None and number - header_number >= next_report:
+                progress(number - header_number, total)
+                next_report += progress_every
+            if not present:
+                pending += 1
+                continue
+            if pending:
+                for buffer in buffers:
+                    buffer.append_missing(pending)
+                pending = 0
+
+            for slot, (buffer, value) in enumerate(zip(buffers, values)):
+                if value is None:
+                    if buffer.objects is None:
+                        buffer.numbers.append(nan)
+                    else:
+                        buffer.objects.append(nan)
+                    continue
+                if buffer.objects is None:
+                    if value.__class__ is float:
+                        buffer.numbers.append(value)
+                        buffer.filled += 1
+                        if dates >> slot & 1:
+                            buffer.dates += 1
+                        continue
+                    buffer.to_objects(date1904)
+                elif buffer.as_text and value.__class__ is float:
+                    value = str(int(value)) if value.is_integer() else str(value)
+                elif value.__class__ is float:
+                    value = (serial_to_datetime([value], date1904)[0].to_pydatetime() if dates >> slot & 1
+                             else _plain_number(value))
+                buffer.objects.append(value)
+
+            if chunksize and len(buffers[0] if buffers else ()) >= chunksize:
+                yield frame(buffers)
+                buffers, emitted = new_buffers(), True
+
+        if progress is not None:
+            done = last_number - header_number
+            progress(done, total if total is not None and total >= done else done)
+        if not emitted or (buffers and len(buffers[0])):
+            yield frame(buffers)
+
+
+def read_xlsx_stream(source, columns=None, sheet_name=0, progress=None, engine='auto', text_columns=None):
+    """
+    读取整个 xlsx 工作表，返回 DataFrame（参数同 iter_xlsx_chunks）
+
+    engine: stream（流式 XML 解析）/ calamine（需要 python-calamine）/ auto（有 calamine 时使用）
+    """
+    if engine not in XLSX_ENGINES:
+        raise ValueError(f"未知的 xlsx 读取引擎: {engine}，可选: {list(XLSX_ENGINES)}")
+    if engine == 'calamine' or (engine == 'auto' and HAS_CALAMINE):
+        if not HAS_CALAMINE:
+            raise ImportError("calamine 引擎需要安装 python-calamine: pip install python-calamine")
+        return _read_calamine(source, sheet_name, columns, progress, text_columns)
+    return next(iter_xlsx_chunks(source, None, columns, sheet_name, progress, text_columns))
+
+
+def sheet_names(source):
+    """xlsx 文件中的工作表名称（按工作簿中的顺序）"""
+    with XlsxWorkbook(source) as workbook:
+        return workbook.sheet_names